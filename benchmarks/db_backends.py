@@ -0,0 +1,201 @@
+""" Базы данных под нагрузкой бота: создание продаж и чтение календаря продаж на SQLite и PostgreSQL.
+
+Запуск: python -m benchmarks.db_backends --sales 2000 --channels 20 --reads 2000
+Продажи создаются одновременно в нескольких каналах через пул БД, как из хэндлеров разных менеджеров.
+Календарь — отчёт канала за месяц и список продаж за день. SQLite замеряется во временном файле.
+PostgreSQL — в отдельной базе DB_NAME_BENCHMARK на сервере из настроек DB_HOST, DB_PORT, DB_USER, DB_PASSWORD:
+она создаётся перед замером и удаляется после. Если psycopg2 не установлен или сервер недоступен,
+PostgreSQL пропускается. Каждая база замеряется в своём процессе, потому что бот выбирает базу при импорте.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+if os.environ['DB_BACKEND'] == 'sqlite':
+    os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='db_backends_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+
+from config import DatabaseConfig  # noqa: E402
+from src.database import sales  # noqa: E402
+from src.database.migrations import run_migrations  # noqa: E402
+from src.database.models import register_models, User, Channel  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+
+
+YEAR, MONTH = 2026, 10
+BACKENDS = ('sqlite', 'postgres')
+POSTGRES_DATABASE = os.getenv('DB_NAME_BENCHMARK', 'sales_bot_benchmark')
+
+
+@dataclass
+class BackendResult:
+    backend: str
+    sales_count: int
+    create_seconds: float
+    reads_count: int
+    read_seconds: float
+
+    @property
+    def sales_per_second(self) -> float:
+        return self.sales_count / self.create_seconds if self.create_seconds else 0.0
+
+    @property
+    def reads_per_second(self) -> float:
+        return self.reads_count / self.read_seconds if self.read_seconds else 0.0
+
+
+def _seed(channels_count: int) -> tuple[User, list[Channel]]:
+    register_models()
+    run_migrations()
+
+    user = User.create(telegram_id=1, name='Benchmark', registration_timestamp=datetime.now())
+    channels = [
+        Channel.create(creator=user, title=f'Benchmark {index}', secret_code=f'benchmark{index}')
+        for index in range(channels_count)
+    ]
+    return user, channels
+
+
+async def _create_sales(user: User, channels: list[Channel], sales_count: int) -> None:
+    await asyncio.gather(*(
+        sales.create_sale(
+            user=user, channel=channels[index % len(channels)], buyer=f'@buyer{index}',
+            timestamp=datetime(YEAR, MONTH, 1) + timedelta(
+                days=random.randrange(28), minutes=random.randrange(24 * 60)
+            ),
+            publication_cost=random.randrange(100, 5000), manager_percent=random.choice((5, 7, 10, 12.5)),
+            publication_format='1/24'
+        )
+        for index in range(sales_count)
+    ))
+
+
+async def _read_calendar(channel: Channel) -> None:
+    await sales.get_channel_month_report(channel=channel, year=YEAR, month=MONTH)
+    await sales.get_sales_by_day(
+        channel_id=channel.id, purchase_date=date(YEAR, MONTH, random.randint(1, 28)), with_relations=True
+    )
+
+
+async def run_backend_benchmark(sales_count: int, channels_count: int, reads_count: int) -> BackendResult:
+    """ Замер базы, выбранной в этом процессе настройкой DB_BACKEND """
+    random.seed(1)
+    user, channels = _seed(channels_count=channels_count)
+
+    started_at = time.perf_counter()
+    await _create_sales(user, channels, sales_count)
+    create_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(_read_calendar(channels[index % len(channels)]) for index in range(reads_count)))
+    read_seconds = time.perf_counter() - started_at
+
+    return BackendResult(
+        backend=DatabaseConfig.BACKEND, sales_count=sales_count, create_seconds=create_seconds,
+        reads_count=reads_count, read_seconds=read_seconds
+    )
+
+
+def _run_postgres_admin_query(sql: str) -> None:
+    """ Запрос к служебной базе postgres: CREATE DATABASE и DROP DATABASE не выполняются в транзакции """
+    import psycopg2
+
+    connection = psycopg2.connect(
+        dbname='postgres', user=DatabaseConfig.USER, password=DatabaseConfig.PASSWORD,
+        host=DatabaseConfig.HOST, port=DatabaseConfig.PORT, connect_timeout=3
+    )
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+    finally:
+        connection.close()
+
+
+def _prepare_postgres() -> str | None:
+    """ Создаёт пустую базу для замера. Возвращает причину, по которой PostgreSQL пропускается """
+    try:
+        import psycopg2
+    except ImportError:
+        return 'psycopg2 не установлен'
+
+    try:
+        _run_postgres_admin_query(f'DROP DATABASE IF EXISTS "{POSTGRES_DATABASE}"')
+        _run_postgres_admin_query(f'CREATE DATABASE "{POSTGRES_DATABASE}"')
+    except psycopg2.Error as e:
+        return f'сервер {DatabaseConfig.HOST}:{DatabaseConfig.PORT} недоступен: {str(e).strip()}'
+    return None
+
+
+def _run_backend_process(backend: str, args: argparse.Namespace) -> BackendResult:
+    env = {**os.environ, 'DB_BACKEND': backend}
+    if backend == 'postgres':
+        env['DB_NAME'] = POSTGRES_DATABASE
+
+    completed = subprocess.run(
+        [
+            sys.executable, '-m', 'benchmarks.db_backends', '--backend', backend, '--sales', str(args.sales),
+            '--channels', str(args.channels), '--reads', str(args.reads),
+        ],
+        env=env, stdout=subprocess.PIPE, text=True, check=True
+    )
+    return BackendResult(**json.loads(completed.stdout.splitlines()[-1]))
+
+
+def _print_results(results: list[BackendResult], skipped: dict[str, str]) -> None:
+    print(f'{"База":<10}{"Продаж":>8}{"Время, с":>10}{"Продаж/с":>10}'
+          f'{"Чтений":>8}{"Время, с":>10}{"Чтений/с":>10}')
+    for result in results:
+        print(
+            f'{result.backend:<10}{result.sales_count:>8}{result.create_seconds:>10.2f}{result.sales_per_second:>10.0f}'
+            f'{result.reads_count:>8}{result.read_seconds:>10.2f}{result.reads_per_second:>10.0f}'
+        )
+    for backend, reason in skipped.items():
+        print(f'{backend:<10}пропущен: {reason}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=2000, help='сколько продаж создать')
+    parser.add_argument('--channels', type=int, default=20, help='в скольких каналах одновременно создаются продажи')
+    parser.add_argument('--reads', type=int, default=2000, help='сколько раз открыть календарь продаж')
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help='замерить только эту базу в текущем процессе и вывести результат в JSON')
+    args = parser.parse_args()
+
+    if args.backend:
+        try:
+            result = asyncio.run(run_backend_benchmark(
+                sales_count=args.sales, channels_count=args.channels, reads_count=args.reads
+            ))
+        finally:
+            IOExecutor.shutdown_all()
+        print(json.dumps(asdict(result)))
+        return
+
+    results = [_run_backend_process('sqlite', args)]
+    skipped = {}
+    skip_reason = _prepare_postgres()
+    if skip_reason:
+        skipped['postgres'] = skip_reason
+    else:
+        try:
+            results.append(_run_backend_process('postgres', args))
+        finally:
+            _run_postgres_admin_query(f'DROP DATABASE IF EXISTS "{POSTGRES_DATABASE}"')
+    _print_results(results, skipped)
+
+
+if __name__ == '__main__':
+    main()
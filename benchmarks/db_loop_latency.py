@@ -0,0 +1,167 @@
+""" Задержка event loop под нагрузкой хэндлеров: запросы к БД в потоке event loop против пула БД.
+
+Запуск: python -m benchmarks.db_loop_latency --handlers 50 --requests 20
+Хэндлеры одновременно строят отчёт канала за месяц и список продаж за день, как календарь продаж.
+Без пула запросы выполняются прямо в event loop (синхронные функции из __wrapped__), и пока идёт запрос,
+бот не обрабатывает другие апдейты. Пробник засыпает на interval и записывает, насколько позже проснулся:
+это задержка, с которой бот ответил бы на любой другой апдейт. База данных создаётся во временном файле.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='db_loop_latency_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+
+from peewee import chunked  # noqa: E402
+
+from src.database import sales  # noqa: E402
+from src.database.migrations import run_migrations  # noqa: E402
+from src.database.models import db, register_models, User, Channel, Sale  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+
+
+YEAR, MONTH = 2026, 10
+
+
+@dataclass
+class LatencyResult:
+    mode: str
+    requests_count: int
+    seconds: float
+    # Задержки пробуждения пробника, с, по возрастанию
+    lags: list[float]
+
+    def get_lag_percentile(self, percentile: float) -> float:
+        if not self.lags:
+            return 0.0
+        return self.lags[min(int(percentile / 100 * len(self.lags)), len(self.lags) - 1)]
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests_count / self.seconds if self.seconds else 0.0
+
+
+def _seed(sales_count: int) -> Channel:
+    """ Канал с sales_count продажами в месяце YEAR.MONTH """
+    register_models()
+    run_migrations()
+
+    user = User.create(telegram_id=1, name='Benchmark', registration_timestamp=datetime.now())
+    channel = Channel.create(creator=user, title='Benchmark', secret_code='benchmark')
+
+    random.seed(1)
+    rows = [
+        {
+            'writer': user.telegram_id, 'channel': channel.id, 'buyer': f'@buyer{row}',
+            'timestamp': datetime(YEAR, MONTH, 1) + timedelta(
+                days=random.randrange(28), minutes=random.randrange(24 * 60)
+            ),
+            'publication_cost': random.randrange(100, 5000), 'manager_percent': random.choice((5, 7, 10, 12.5)),
+            'publication_format': '1/24', 'payment_status': 'Оплачено', 'row_in_table': row,
+        }
+        for row in range(1, sales_count + 1)
+    ]
+    with db.atomic():
+        for batch in chunked(rows, 100):
+            Sale.insert_many(batch).execute()
+    sales.rebuild_month_stats.__wrapped__()
+    return channel
+
+
+async def _handle_inline(channel: Channel, requests_count: int) -> None:
+    for _ in range(requests_count):
+        sales.get_channel_month_report.__wrapped__(channel=channel, year=YEAR, month=MONTH)
+        sales.get_sales_by_day.__wrapped__(
+            channel_id=channel.id, purchase_date=date(YEAR, MONTH, random.randint(1, 28)), with_relations=True
+        )
+        # Ответ пользователю: здесь хэндлер отдаёт управление event loop
+        await asyncio.sleep(0)
+
+
+async def _handle_in_pool(channel: Channel, requests_count: int) -> None:
+    for _ in range(requests_count):
+        await sales.get_channel_month_report(channel=channel, year=YEAR, month=MONTH)
+        await sales.get_sales_by_day(
+            channel_id=channel.id, purchase_date=date(YEAR, MONTH, random.randint(1, 28)), with_relations=True
+        )
+        await asyncio.sleep(0)
+
+
+async def _probe_lag(interval: float, lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(time.perf_counter() - started_at - interval, 0.0))
+
+
+async def _measure(mode: str, handle, channel: Channel, handlers_count: int, requests_count: int,
+                   interval: float) -> LatencyResult:
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_lag(interval, lags, stop))
+    # Пробник успевает заснуть до начала нагрузки
+    await asyncio.sleep(interval)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(handle(channel, requests_count) for _ in range(handlers_count)))
+    seconds = time.perf_counter() - started_at
+
+    stop.set()
+    await probe
+    return LatencyResult(
+        mode=mode, requests_count=handlers_count * requests_count * 2, seconds=seconds, lags=sorted(lags)
+    )
+
+
+async def run_benchmark(sales_count: int, handlers_count: int, requests_count: int,
+                        interval: float) -> list[LatencyResult]:
+    channel = _seed(sales_count=sales_count)
+    # Прогрев: соединения потоков пула и кэш страниц SQLite
+    await _handle_in_pool(channel, 1)
+
+    return [
+        await _measure('В event loop', _handle_inline, channel, handlers_count, requests_count, interval),
+        await _measure('Пул БД', _handle_in_pool, channel, handlers_count, requests_count, interval),
+    ]
+
+
+def _print_results(results: list[LatencyResult], sales_count: int, handlers_count: int) -> None:
+    print(f'Продаж в месяце: {sales_count}, одновременных хэндлеров: {handlers_count}\n')
+    print(f'{"Режим":<16}{"Запросов":>10}{"Время, с":>10}{"Запр./с":>10}'
+          f'{"Задержка p50, мс":>18}{"p95, мс":>10}{"max, мс":>10}')
+    for result in results:
+        print(
+            f'{result.mode:<16}{result.requests_count:>10}{result.seconds:>10.2f}{result.requests_per_second:>10.0f}'
+            f'{result.get_lag_percentile(50) * 1000:>18.1f}{result.get_lag_percentile(95) * 1000:>10.1f}'
+            f'{(result.lags[-1] if result.lags else 0) * 1000:>10.1f}'
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=3000, help='сколько продаж в месяце')
+    parser.add_argument('--handlers', type=int, default=50, help='сколько хэндлеров работают одновременно')
+    parser.add_argument('--requests', type=int, default=20, help='сколько раз каждый хэндлер открывает календарь')
+    parser.add_argument('--interval', type=float, default=0.005, help='период пробника event loop, с')
+    args = parser.parse_args()
+
+    try:
+        results = await run_benchmark(
+            sales_count=args.sales, handlers_count=args.handlers, requests_count=args.requests,
+            interval=args.interval
+        )
+    finally:
+        IOExecutor.shutdown_all()
+    _print_results(results, sales_count=args.sales, handlers_count=args.handlers)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+""" Скорость рассылки: сколько сообщений в секунду отправляет Mailer и сколько ответов RetryAfter получает.
+
+Запуск: python -m benchmarks.mailing_throughput --users 600 --latency 0.1
+Bot API заменён сессией-заглушкой: каждый запрос отвечает через latency секунд, а больше limit сообщений
+за секунду отклоняются ответом RetryAfter, как у Telegram. Для сравнения замеряется и отправка по одному
+сообщению с паузой 0.05 с, как было до Mailer с воркерами.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='mailing_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import CopyMessage, TelegramMethod  # noqa: E402
+from aiogram.types import MessageId  # noqa: E402
+
+from config import MailingConfig  # noqa: E402
+from src.handlers.admin.mailing import Mailer  # noqa: E402
+
+
+ADMIN_ID = 1
+
+
+class FakeBotSession(BaseSession):
+    """ Сессия Bot API без сети: отвечает с задержкой и ограничивает число сообщений в секунду """
+    def __init__(self, latency: float, limit: int, retry_after: int):
+        super().__init__()
+        self.latency = latency
+        self.limit = limit
+        self.retry_after = retry_after
+
+        self.sent_count = 0
+        self.retry_after_count = 0
+        # Время принятых сообщений за последнюю секунду
+        self._accepted_at: deque[float] = deque()
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        await asyncio.sleep(self.latency / 2)
+
+        now = time.monotonic()
+        while self._accepted_at and self._accepted_at[0] <= now - 1:
+            self._accepted_at.popleft()
+        if len(self._accepted_at) >= self.limit:
+            self.retry_after_count += 1
+            raise TelegramRetryAfter(
+                method=method, message=f'Too Many Requests: retry after {self.retry_after}',
+                retry_after=self.retry_after
+            )
+        self._accepted_at.append(now)
+
+        await asyncio.sleep(self.latency / 2)
+        if not isinstance(method, CopyMessage):
+            raise NotImplementedError(f'{type(method).__name__} не поддерживается')
+        self.sent_count += 1
+        return MessageId(message_id=self.sent_count)
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url: str, headers: dict | None = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError
+        yield b''
+
+
+@dataclass
+class MailingResult:
+    mode: str
+    users_count: int
+    sent_count: int
+    retry_after_count: int
+    seconds: float
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.sent_count / self.seconds if self.seconds else 0.0
+
+
+async def _send_sequentially(bot: Bot, user_ids: list[int]) -> None:
+    """ Отправка по одному сообщению с паузой 0.05 с и ожиданием RetryAfter в каждом вызове """
+    for user_id in user_ids:
+        while True:
+            try:
+                await bot.copy_message(user_id, ADMIN_ID, 1)
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            break
+        await asyncio.sleep(0.05)
+
+
+async def _measure(mode: str, users_count: int, session: FakeBotSession, mailing) -> MailingResult:
+    started_at = time.monotonic()
+    await mailing
+    return MailingResult(
+        mode=mode, users_count=users_count, sent_count=session.sent_count,
+        retry_after_count=session.retry_after_count, seconds=time.monotonic() - started_at
+    )
+
+
+async def run_benchmark(
+        users_count: int, legacy_users_count: int, latency: float, limit: int, retry_after: int,
+        messages_per_second: float, workers_count: int
+) -> list[MailingResult]:
+    results = []
+
+    if legacy_users_count:
+        session = FakeBotSession(latency=latency, limit=limit, retry_after=retry_after)
+        bot = Bot(token=os.environ['BOT_TOKEN'], session=session)
+        user_ids = list(range(ADMIN_ID + 1, ADMIN_ID + 1 + legacy_users_count))
+        results.append(await _measure('По одному', legacy_users_count, session, _send_sequentially(bot, user_ids)))
+
+    for mode, rate in (('Mailer', messages_per_second), ('Mailer без лимита', limit * 10)):
+        session = FakeBotSession(latency=latency, limit=limit, retry_after=retry_after)
+        mailer = Mailer(
+            bot=Bot(token=os.environ['BOT_TOKEN'], session=session),
+            to_user_ids=range(ADMIN_ID + 1, ADMIN_ID + 1 + users_count),
+            message_to_copy_id=1, from_chat_id=ADMIN_ID,
+            messages_per_second=rate, workers_count=workers_count
+        )
+        results.append(await _measure(mode, users_count, session, mailer.start_mailing()))
+
+    return results
+
+
+def _print_results(results: list[MailingResult]) -> None:
+    print(f'{"Режим":<20}{"Юзеров":>8}{"Доставлено":>12}{"RetryAfter":>12}{"Время, с":>10}{"Сообщ./с":>10}'
+          f'{"100 тыс., мин":>15}')
+    for result in results:
+        minutes_for_100k = 100_000 / result.messages_per_second / 60 if result.messages_per_second else 0
+        print(
+            f'{result.mode:<20}{result.users_count:>8}{result.sent_count:>12}{result.retry_after_count:>12}'
+            f'{result.seconds:>10.1f}{result.messages_per_second:>10.1f}{minutes_for_100k:>15.0f}'
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=600, help='сколько пользователей в рассылке Mailer')
+    parser.add_argument('--legacy-users', type=int, default=100,
+                        help='сколько пользователей в рассылке по одному (0 — не замерять)')
+    parser.add_argument('--latency', type=float, default=0.1, help='время ответа Bot API, с')
+    parser.add_argument('--limit', type=int, default=30, help='сколько сообщений в секунду принимает Bot API')
+    parser.add_argument('--retry-after', type=int, default=1, help='пауза в ответе RetryAfter, с')
+    parser.add_argument('--rate', type=float, default=MailingConfig.MESSAGES_PER_SECOND,
+                        help='темп рассылки Mailer, сообщений в секунду')
+    parser.add_argument('--workers', type=int, default=MailingConfig.WORKERS, help='воркеров Mailer')
+    args = parser.parse_args()
+
+    results = await run_benchmark(
+        users_count=args.users, legacy_users_count=args.legacy_users, latency=args.latency, limit=args.limit,
+        retry_after=args.retry_after, messages_per_second=args.rate, workers_count=args.workers
+    )
+    _print_results(results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
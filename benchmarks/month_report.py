@@ -0,0 +1,153 @@
+""" Отчёт канала за месяц: get_channel_month_report против трёх отдельных вызовов, как было до ChannelMonthReport.
+
+Запуск: python -m benchmarks.month_report --sales 3000 --repeat 200
+Три вызова — продажи по дням, выручка и доход менеджера за месяц из сводки ChannelMonthStats, каждый в своём
+переходе в поток БД. Отчёт делает те же запросы по дням и по сводке за один переход.
+Каждый путь замеряется в потоке запуска (только запросы) и через пул БД, как из хэндлера: там к запросам
+добавляется передача в поток пула и обратно. База данных создаётся во временном файле.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='month_report_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+
+from peewee import chunked  # noqa: E402
+
+from src.database import sales  # noqa: E402
+from src.database.migrations import run_migrations  # noqa: E402
+from src.database.models import db, register_models, User, Channel, Sale  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+
+
+YEAR, MONTH = 2026, 10
+
+
+@dataclass
+class ReportResult:
+    mode: str
+    db_calls: int
+    seconds: float
+    repeat: int
+
+    @property
+    def milliseconds_per_report(self) -> float:
+        return self.seconds / self.repeat * 1000
+
+
+def _seed(sales_count: int, months: int) -> Channel:
+    """ Канал с sales_count продажами в каждом из months месяцев до YEAR.MONTH включительно """
+    register_models()
+    run_migrations()
+
+    user = User.create(telegram_id=1, name='Benchmark', registration_timestamp=datetime.now())
+    channel = Channel.create(creator=user, title='Benchmark', secret_code='benchmark')
+
+    random.seed(1)
+    rows = []
+    for month_offset in range(months):
+        year, month_index = divmod(YEAR * 12 + MONTH - 1 - month_offset, 12)
+        month_start = datetime(year, month_index + 1, 1)
+        for row in range(1, sales_count + 1):
+            rows.append({
+                'writer': user.telegram_id, 'channel': channel.id, 'buyer': f'@buyer{row}',
+                'timestamp': month_start + timedelta(days=random.randrange(28), minutes=random.randrange(24 * 60)),
+                'publication_cost': random.randrange(100, 5000), 'manager_percent': random.choice((5, 7, 10, 12.5)),
+                'publication_format': '1/24', 'payment_status': 'Оплачено', 'row_in_table': row,
+            })
+    with db.atomic():
+        for batch in chunked(rows, 100):
+            Sale.insert_many(batch).execute()
+    sales.rebuild_month_stats.__wrapped__()
+    return channel
+
+
+def _get_three_calls_report(channel: Channel) -> sales.ChannelMonthReport:
+    return sales.ChannelMonthReport(
+        year=YEAR, month=MONTH,
+        sales_counts_by_days=sales.get_sales_counts_by_days.__wrapped__(channel=channel, year=YEAR, month=MONTH),
+        sales_sum=float(sales.get_purchases_sum_for_month.__wrapped__(channel=channel, year=YEAR, month=MONTH)),
+        manager_sum=float(sales.get_manager_sum_for_month.__wrapped__(channel=channel, year=YEAR, month=MONTH)),
+    )
+
+
+async def _get_three_calls_report_in_pool(channel: Channel) -> sales.ChannelMonthReport:
+    return sales.ChannelMonthReport(
+        year=YEAR, month=MONTH,
+        sales_counts_by_days=await sales.get_sales_counts_by_days(channel=channel, year=YEAR, month=MONTH),
+        sales_sum=float(await sales.get_purchases_sum_for_month(channel=channel, year=YEAR, month=MONTH)),
+        manager_sum=float(await sales.get_manager_sum_for_month(channel=channel, year=YEAR, month=MONTH)),
+    )
+
+
+def _assert_same_reports(report: sales.ChannelMonthReport, three_calls: sales.ChannelMonthReport) -> None:
+    assert report.sales_counts_by_days == three_calls.sales_counts_by_days, 'Продажи по дням не совпадают'
+    assert round(report.sales_sum, 2) == round(three_calls.sales_sum, 2), 'Выручка не совпадает'
+    assert round(report.manager_sum, 2) == round(three_calls.manager_sum, 2), 'Доход менеджера не совпадает'
+
+
+async def run_benchmark(sales_count: int, months: int, repeat: int) -> list[ReportResult]:
+    channel = _seed(sales_count=sales_count, months=months)
+    get_report = sales.get_channel_month_report
+
+    _assert_same_reports(get_report.__wrapped__(channel=channel, year=YEAR, month=MONTH),
+                         _get_three_calls_report(channel))
+
+    results = []
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        get_report.__wrapped__(channel=channel, year=YEAR, month=MONTH)
+    results.append(ReportResult('Отчёт', 1, time.perf_counter() - started_at, repeat))
+
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        _get_three_calls_report(channel)
+    results.append(ReportResult('Три вызова', 3, time.perf_counter() - started_at, repeat))
+
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        await get_report(channel=channel, year=YEAR, month=MONTH)
+    results.append(ReportResult('Отчёт, пул БД', 1, time.perf_counter() - started_at, repeat))
+
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        await _get_three_calls_report_in_pool(channel)
+    results.append(ReportResult('Три вызова, пул БД', 3, time.perf_counter() - started_at, repeat))
+
+    return results
+
+
+def _print_results(results: list[ReportResult], sales_count: int) -> None:
+    print(f'Продаж в месяце: {sales_count}\n')
+    print(f'{"Путь":<24}{"Вызовов БД":>12}{"Отчётов":>10}{"Время, с":>10}{"мс/отчёт":>10}')
+    for result in results:
+        print(
+            f'{result.mode:<24}{result.db_calls:>12}{result.repeat:>10}'
+            f'{result.seconds:>10.3f}{result.milliseconds_per_report:>10.3f}'
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=3000, help='сколько продаж в каждом месяце')
+    parser.add_argument('--months', type=int, default=12, help='сколько месяцев продаж в канале')
+    parser.add_argument('--repeat', type=int, default=200, help='сколько раз построить отчёт каждым путём')
+    args = parser.parse_args()
+
+    try:
+        results = await run_benchmark(sales_count=args.sales, months=args.months, repeat=args.repeat)
+    finally:
+        IOExecutor.shutdown_all()
+    _print_results(results, sales_count=args.sales)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
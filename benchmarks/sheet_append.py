@@ -0,0 +1,172 @@
+""" Запись новой продажи в лист на 10 тыс. строк: прежний путь с чтением всего листа против batchUpdate очереди.
+
+Запуск: python -m benchmarks.sheet_append --rows 10000 --appends 20 --latency 0.15 --bandwidth 2
+До очереди операций insert_row_data открывал таблицу (open_by_key), скачивал весь лист (get_all_values),
+чтобы узнать номер последней строки, и вставлял строку двумя запросами, как Worksheet.insert_row:
+insertDimension и запись значений. Теперь номер строки берётся из базы (sales.row_in_table),
+и очередь записывает строку одним batchUpdate без чтения листа; id листов берутся из кэша.
+Таблица — FakeGspreadClient. Для каждого запроса записываются размеры тела запроса и ответа в JSON.
+Оценка времени: latency на запрос плюс передача тел запроса и ответа со скоростью bandwidth.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='sheet_append_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+# Квоты Google API замеряются в sheets_api_calls, здесь они только растянули бы замер
+os.environ.setdefault('SHEETS_BURST', '1000')
+
+from gspread.utils import absolute_range_name  # noqa: E402
+
+from src.database.sheets_outbox import SALES_TABLE_TITLE  # noqa: E402
+from src.utils import GoogleSheetsAPI  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+from src.utils.fake_gspread import FakeGspreadClient, FakeHTTPClient  # noqa: E402
+from src.utils.google_sheets_api import SheetRowsOperation  # noqa: E402
+
+
+SHEET_TITLE = '10.2026'
+METERED_METHODS = ('fetch_sheet_metadata', 'values_get', 'batch_update', 'values_batch_update')
+
+
+def _get_json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode())
+
+
+@dataclass
+class PathResult:
+    path: str
+    appends_count: int
+    calls: Counter = field(default_factory=Counter)
+    request_bytes: int = 0
+    response_bytes: int = 0
+    seconds: float = 0.0
+
+    def get_estimated_seconds(self, latency: float, bandwidth: float) -> float:
+        """ Оценка времени сети на одну запись: задержка каждого запроса и передача тел со скоростью bandwidth """
+        calls_count = sum(self.calls.values())
+        transfer_seconds = (self.request_bytes + self.response_bytes) / (bandwidth * 1024 * 1024)
+        return (calls_count * latency + transfer_seconds) / self.appends_count
+
+
+class PayloadMeter:
+    """ Считает вызовы методов FakeHTTPClient и размеры их запросов и ответов """
+    def __init__(self, http_client: FakeHTTPClient, result: PathResult):
+        for method in METERED_METHODS:
+            setattr(http_client, method, self._meter(method, getattr(http_client, method), result))
+
+    @staticmethod
+    def _meter(method: str, func, result: PathResult):
+        def wrapper(*args, **kwargs):
+            response = func(*args, **kwargs)
+            result.calls[method] += 1
+            result.request_bytes += _get_json_size([args, kwargs])
+            result.response_bytes += _get_json_size(response)
+            return response
+        return wrapper
+
+
+def _get_sale_row(number: int) -> list[str]:
+    return [
+        f'{number % 28 + 1:02}.10.2026 12:{number % 60:02}', f'@buyer{number}', 'Менеджер', '1/24',
+        str(1000 + number % 4000), '10.0', 'Оплачено'
+    ]
+
+
+async def _create_filled_table(client: FakeGspreadClient, rows_count: int) -> str:
+    table_id = await GoogleSheetsAPI.create_table('Продажи')
+    await GoogleSheetsAPI.ensure_sheets(table_id, titles=[SHEET_TITLE], title_data=SALES_TABLE_TITLE)
+
+    worksheet = client.get_spreadsheet(table_id).get_worksheet_by_title(SHEET_TITLE)
+    worksheet.row_count = rows_count + 1
+    worksheet.set_values(1, [SALES_TABLE_TITLE, *(_get_sale_row(number) for number in range(1, rows_count + 1))])
+    return table_id
+
+
+def _append_reading_sheet(http_client: FakeHTTPClient, table_id: str, values: list[str]) -> None:
+    """ Прежний insert_row_data без позиции: open_by_key, get_all_values и insert_row """
+    sheet_id = http_client.fetch_sheet_metadata(table_id)['sheets'][-1]['properties']['sheetId']
+    rows_count = len(http_client.values_get(table_id, absolute_range_name(SHEET_TITLE, 'A:Z')).get('values', []))
+    http_client.batch_update(table_id, {'requests': [{'insertDimension': {
+        'range': {'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': rows_count, 'endIndex': rows_count + 1},
+        'inheritFromBefore': True
+    }}]})
+    http_client.values_batch_update(table_id, {'valueInputOption': 'RAW', 'data': [
+        {'range': absolute_range_name(SHEET_TITLE, f'A{rows_count + 1}'), 'values': [values]}
+    ]})
+
+
+async def _append_from_outbox(table_id: str, row: int, values: list[str]) -> None:
+    """ Вставка из очереди операций: номер строки уже известен из базы """
+    await GoogleSheetsAPI.apply_rows_operations(
+        table_id, [SheetRowsOperation(action='insert', sheet=SHEET_TITLE, row=row, values=[values])],
+        title_data=SALES_TABLE_TITLE
+    )
+
+
+async def _measure(path: str, rows_count: int, appends_count: int) -> PathResult:
+    client = FakeGspreadClient()
+    GoogleSheetsAPI.use_client(client)
+    table_id = await _create_filled_table(client, rows_count)
+
+    result = PathResult(path=path, appends_count=appends_count)
+    PayloadMeter(client.http_client, result)
+    started_at = time.perf_counter()
+    for number in range(rows_count + 1, rows_count + 1 + appends_count):
+        if path == 'Чтение листа':
+            _append_reading_sheet(client.http_client, table_id, _get_sale_row(number))
+        else:
+            await _append_from_outbox(table_id, row=number, values=_get_sale_row(number))
+    result.seconds = time.perf_counter() - started_at
+
+    rows = client.get_spreadsheet(table_id).get_worksheet_by_title(SHEET_TITLE).get_all_values()
+    assert rows[-appends_count:] == [_get_sale_row(number) for number in range(rows_count + 1, len(rows))], \
+        f'{path}: строки записаны не в конец листа'
+    return result
+
+
+def _print_results(results: list[PathResult], rows_count: int, latency: float, bandwidth: float) -> None:
+    print(f'Строк в листе: {rows_count}, задержка запроса {latency * 1000:.0f} мс, канал {bandwidth} МБ/с\n')
+    print(f'{"Путь":<16}{"Запросов":>10}{"Запрос, КБ":>12}{"Ответ, КБ":>12}{"Локально, мс":>14}{"Оценка, мс":>12}'
+          '   (на одну запись)')
+    for result in results:
+        appends_count = result.appends_count
+        print(
+            f'{result.path:<16}{sum(result.calls.values()) / appends_count:>10.2f}'
+            f'{result.request_bytes / appends_count / 1024:>12.1f}{result.response_bytes / appends_count / 1024:>12.1f}'
+            f'{result.seconds / appends_count * 1000:>14.1f}'
+            f'{result.get_estimated_seconds(latency, bandwidth) * 1000:>12.0f}'
+        )
+    print()
+    for result in results:
+        print(f'{result.path}: ' + ', '.join(f'{method}×{count}' for method, count in sorted(result.calls.items())))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000, help='сколько строк продаж в листе')
+    parser.add_argument('--appends', type=int, default=20, help='сколько продаж дописать каждым путём')
+    parser.add_argument('--latency', type=float, default=0.15, help='задержка одного запроса к API для оценки, с')
+    parser.add_argument('--bandwidth', type=float, default=2.0, help='скорость канала до API для оценки, МБ/с')
+    args = parser.parse_args()
+
+    try:
+        results = [
+            await _measure(path, rows_count=args.rows, appends_count=args.appends)
+            for path in ('Чтение листа', 'Очередь')
+        ]
+    finally:
+        IOExecutor.shutdown_all()
+    _print_results(results, rows_count=args.rows, latency=args.latency, bandwidth=args.bandwidth)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+""" Сколько запросов к Google Sheets API и какой задержки стоит каждое действие пользователя с продажами.
+
+Запуск: python -m benchmarks.sheets_api_calls --latency 0.2 --sales 20
+Хэндлеры создания, изменения и удаления продажи вызываются напрямую, Telegram заменён заглушками,
+а таблицы — FakeGspreadClient. База данных создаётся во временном файле.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from unittest.mock import AsyncMock, MagicMock
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='sheets_bench_'), 'bench.db')
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from src.database import users, channels, sales, sheets_outbox  # noqa: E402
+from src.database.migrations import run_migrations  # noqa: E402
+from src.database.models import register_models  # noqa: E402
+from src.handlers.user.create_sale import handle_payment_status  # noqa: E402
+from src.handlers.user.sales_calendar import handle_sale_new_data_message, handle_delete_sale_callback  # noqa: E402
+from src.misc.callbacks_data import EditSaleCallback  # noqa: E402
+from src.misc.enums import SalePaymentStatusEnum  # noqa: E402
+from src.utils import GoogleSheetsAPI  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+from src.utils.fake_gspread import FakeGspreadClient  # noqa: E402
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker  # noqa: E402
+from src.utils.spare_tables_pool import SpareTablesPool  # noqa: E402
+
+
+USER_ID = 1
+
+
+@dataclass
+class ActionResult:
+    action: str
+    handler_calls: Counter
+    flush_calls: Counter
+    handler_seconds: float
+    flush_seconds: float
+    simulated_latency: float
+
+
+def _make_message(text: str) -> MagicMock:
+    message = MagicMock()
+    message.text = text
+    message.from_user.id = USER_ID
+    message.answer = AsyncMock()
+    message.bot = AsyncMock()
+    return message
+
+
+def _make_callback() -> MagicMock:
+    callback = MagicMock()
+    callback.from_user.id = USER_ID
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    callback.bot = AsyncMock()
+    return callback
+
+
+def _make_state(storage: MemoryStorage) -> FSMContext:
+    return FSMContext(storage=storage, key=StorageKey(bot_id=0, chat_id=USER_ID, user_id=USER_ID))
+
+
+async def _measure(client: FakeGspreadClient, action: str, handler_call) -> ActionResult:
+    """ Выполняет хэндлер, затем отправку очереди, которую он запросил, и считает запросы к API каждого этапа """
+    client.recorder.clear()
+    started = time.perf_counter()
+    await handler_call
+    handler_seconds = time.perf_counter() - started
+    handler_calls = client.recorder.get_counts()
+    handler_latency = client.recorder.get_total_latency()
+
+    client.recorder.clear()
+    started = time.perf_counter()
+    await SheetsOutboxWorker.drain()
+    flush_seconds = time.perf_counter() - started
+
+    return ActionResult(
+        action=action, handler_calls=handler_calls, flush_calls=client.recorder.get_counts(),
+        handler_seconds=handler_seconds, flush_seconds=flush_seconds,
+        simulated_latency=handler_latency + client.recorder.get_total_latency()
+    )
+
+
+async def _create_sale(storage: MemoryStorage, channel_id: int, number: int):
+    state = _make_state(storage)
+    await state.set_data({
+        'channel_id': channel_id, 'date': datetime.date.today(), 'time': datetime.time(hour=12, minute=number % 60),
+        'buyer': f'@buyer{number}', 'publication_format': '1/24', 'publication_cost': 1000 + number,
+        'manager_percent': 10
+    })
+    await handle_payment_status(_make_message(SalePaymentStatusEnum.PAID.value), state)
+
+
+async def _edit_sale(storage: MemoryStorage, sale_id: int, cost: int):
+    state = _make_state(storage)
+    await state.set_data({'sale_id': sale_id, 'option': 'cost'})
+    await handle_sale_new_data_message(_make_message(str(cost)), state)
+
+
+async def _delete_sale(sale_id: int):
+    await handle_delete_sale_callback(_make_callback(), EditSaleCallback(sale_id=sale_id, option='delete'))
+
+
+def _format_calls(calls: Counter) -> str:
+    return ', '.join(f'{method}×{count}' for method, count in sorted(calls.items())) or '—'
+
+
+def _print_results(results: list[ActionResult]) -> None:
+    print(f'{"Действие":<28}{"API в хэндлере":>16}{"API в фоне":>12}{"Хэндлер, с":>12}{"Фон, с":>10}{"Задержка API, с":>17}')
+    for result in results:
+        print(
+            f'{result.action:<28}{result.handler_calls.total():>16}{result.flush_calls.total():>12}'
+            f'{result.handler_seconds:>12.3f}{result.flush_seconds:>10.3f}{result.simulated_latency:>17.3f}'
+        )
+    print()
+    for result in results:
+        print(f'{result.action}: {_format_calls(result.handler_calls + result.flush_calls)}')
+
+
+async def run_benchmark(latency: float, sales_count: int, spare_tables_count: int) -> list[ActionResult]:
+    register_models()
+    run_migrations()
+
+    client = FakeGspreadClient(latency=latency)
+    GoogleSheetsAPI.use_client(client)
+    # Запас таблиц пополняется в фоне и в замер действий не входит
+    await SpareTablesPool.fill(size=spare_tables_count)
+    storage = MemoryStorage()
+
+    user = await users.create_user_if_not_exist(telegram_id=USER_ID, firstname='Benchmark')
+    channel = await channels.create_channel(creator=user, channel_title='Benchmark')
+
+    results = [await _measure(client, 'Первая продажа канала', _create_sale(storage, channel.id, 0))]
+    for number in range(1, sales_count):
+        action = f'Создание продажи №{number + 1}'
+        results.append(await _measure(client, action, _create_sale(storage, channel.id, number)))
+
+    channel_sales = await sales.get_sales_in_channel(channel=channel)
+    middle_sale = channel_sales[len(channel_sales) // 2]
+    results.append(await _measure(client, 'Изменение продажи', _edit_sale(storage, middle_sale.id, cost=5000)))
+    results.append(await _measure(client, 'Удаление продажи', _delete_sale(middle_sale.id)))
+    results.append(await _measure(client, 'Сжатие листа', SheetsOutboxWorker.compact()))
+
+    # Пачка действий до одной отправки очереди: операции объединяются
+    async def burst():
+        for number in range(sales_count, sales_count + 10):
+            await _create_sale(storage, channel.id, number)
+    results.append(await _measure(client, '10 продаж подряд', burst()))
+
+    channel = await channels.get_channel_by_id(channel_id=channel.id)
+    sheets_rows, _ = await sheets_outbox.get_channel_sheet_snapshot(channel_id=channel.id)
+    spreadsheet = client.spreadsheets[channel.table_id]
+    is_synced = [worksheet.title for worksheet in spreadsheet.worksheets] == list(sheets_rows) and all(
+        spreadsheet.get_worksheet_by_title(sheet).get_all_values() == [sheets_outbox.SALES_TABLE_TITLE, *rows]
+        for sheet, rows in sheets_rows.items()
+    )
+    sales_count = sum(len(rows) for rows in sheets_rows.values())
+    print(f'Таблица совпадает с базой: {"да" if is_synced else "нет"} ({sales_count} продаж, листов {len(sheets_rows)})\n')
+
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.2, help='задержка одного запроса к API, с')
+    parser.add_argument('--sales', type=int, default=5, help='сколько продаж создать по одной')
+    parser.add_argument('--spare-tables', type=int, default=0, help='сколько таблиц создать заранее')
+    args = parser.parse_args()
+
+    try:
+        results = await run_benchmark(
+            latency=args.latency, sales_count=args.sales, spare_tables_count=args.spare_tables
+        )
+    finally:
+        IOExecutor.shutdown_all()
+    _print_results(results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -7,3 +7,65 @@ load_dotenv(find_dotenv())
 
 BOT_TOKEN: Final[str] = os.getenv('BOT_TOKEN', 'define me')
 OWNER_IDS: Final[tuple] = tuple(int(i) for i in str(os.getenv('BOT_OWNER_IDS')).split(','))
+
+
+class ExportConfig:
+    # Потоки выгрузки продаж и пользователей в файлы (у каждого потока своё соединение с базой)
+    THREADS: Final[int] = int(os.getenv('EXPORT_THREADS', 2))
+    # Сколько выгрузок может ждать свободного потока, следующие отклоняются
+    MAX_PENDING: Final[int] = int(os.getenv('EXPORT_MAX_PENDING', 4))
+
+
+class DatabaseConfig:
+    # sqlite или postgres
+    BACKEND: Final[str] = os.getenv('DB_BACKEND', 'sqlite')
+    # Для SQLite — путь к файлу базы
+    NAME: Final[str] = os.getenv('DB_NAME', 'data.db')
+
+    USER: Final[str] = os.getenv('DB_USER', 'postgres')
+    PASSWORD: Final[str] = os.getenv('DB_PASSWORD', '')
+    HOST: Final[str] = os.getenv('DB_HOST', 'localhost')
+    PORT: Final[int] = int(os.getenv('DB_PORT', 5432))
+
+    # Количество потоков для запросов к базе данных (у каждого потока своё соединение)
+    THREADS: Final[int] = int(os.getenv('DB_THREADS', 4))
+    # Сколько запросов может ждать свободного потока в пуле, следующие ждут места в event loop
+    MAX_PENDING: Final[int] = int(os.getenv('DB_MAX_PENDING', 1000))
+    # Пул соединений PostgreSQL: потоки БД и выгрузки + поток запуска
+    MAX_CONNECTIONS: Final[int] = int(os.getenv('DB_MAX_CONNECTIONS', THREADS + ExportConfig.THREADS + 2))
+    STALE_TIMEOUT: Final[int] = int(os.getenv('DB_STALE_TIMEOUT', 300))
+    # Сколько секунд ждать снятия блокировки записи
+    BUSY_TIMEOUT: Final[int] = int(os.getenv('DB_BUSY_TIMEOUT', 10))
+
+
+class GoogleSheetsConfig:
+    # Квота Sheets API — около 60 запросов в минуту на пользователя (сервисный аккаунт)
+    REQUESTS_PER_MINUTE: Final[int] = int(os.getenv('SHEETS_REQUESTS_PER_MINUTE', 60))
+    # Доля квоты одной таблицы, чтобы активный канал не задерживал остальные
+    SPREADSHEET_REQUESTS_PER_MINUTE: Final[int] = int(os.getenv('SHEETS_SPREADSHEET_REQUESTS_PER_MINUTE', 30))
+    # Сколько запросов можно отправить подряд без ожидания
+    BURST: Final[int] = int(os.getenv('SHEETS_BURST', 10))
+    # Потоки для запросов к Google API и сколько запросов может ждать свободного потока
+    THREADS: Final[int] = int(os.getenv('SHEETS_THREADS', 8))
+    MAX_PENDING: Final[int] = int(os.getenv('SHEETS_MAX_PENDING', 100))
+    # Повторы запроса после ответа 429
+    MAX_RETRIES: Final[int] = int(os.getenv('SHEETS_MAX_RETRIES', 5))
+    # Удалённые продажи помечаются в таблице, а строки удаляются пачкой при сжатии листа раз в COMPACTION_INTERVAL секунд
+    TOMBSTONE_DELETES: Final[bool] = os.getenv('SHEETS_TOMBSTONE_DELETES', '1') == '1'
+    COMPACTION_INTERVAL: Final[int] = int(os.getenv('SHEETS_COMPACTION_INTERVAL', 60 * 60))
+    # Сколько заранее созданных таблиц держать для новых каналов (0 — не создавать)
+    SPARE_TABLES: Final[int] = int(os.getenv('SHEETS_SPARE_TABLES', 0))
+    # Как часто переносить в базу правки, сделанные в таблицах вручную (секунды, 0 — не переносить)
+    IMPORT_INTERVAL: Final[int] = int(os.getenv('SHEETS_IMPORT_INTERVAL', 5 * 60))
+
+
+class MailingConfig:
+    # Общий темп рассылки: Telegram допускает около 30 сообщений в секунду от одного бота
+    MESSAGES_PER_SECOND: Final[float] = float(os.getenv('MAILING_MESSAGES_PER_SECOND', 28))
+    # Сколько сообщений отправляется одновременно: ответ Telegram идёт дольше интервала между отправками
+    WORKERS: Final[int] = int(os.getenv('MAILING_WORKERS', 16))
+    # Повторы отправки одному пользователю после ответа RetryAfter
+    MAX_RETRIES: Final[int] = int(os.getenv('MAILING_MAX_RETRIES', 3))
+
+# Как часто время активности пользователей записывается в базу данных (секунды)
+ACTIVITY_FLUSH_INTERVAL: Final[int] = int(os.getenv('ACTIVITY_FLUSH_INTERVAL', 30))
@@ -0,0 +1,16 @@
+from typing import Any
+
+from src.utils.ttl_cache import TTLCache
+
+
+# Ключи: telegram_id пользователя, id канала, telegram_id пользователя
+users_cache = TTLCache(name='users', max_size=5000, ttl=300)
+channels_cache = TTLCache(name='channels', max_size=2000, ttl=300)
+user_channels_cache = TTLCache(name='user_channels', max_size=5000, ttl=300)
+
+
+def get_caches_stats() -> list[dict[str, Any]]:
+    return [
+        {'name': cache.name, **cache.get_stats()}
+        for cache in (users_cache, channels_cache, user_channels_cache)
+    ]
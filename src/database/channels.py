@@ -1,7 +1,10 @@
 import secrets
 import string
+from datetime import datetime
 
-from .models import Channel, User, ChannelWriter
+from .cache import channels_cache, user_channels_cache
+from .executor import in_db_thread
+from .models import db, Channel, User, ChannelWriter
 
 
 def __generate_secret_code(length: int = 15) -> str:
@@ -10,57 +13,98 @@ def __generate_secret_code(length: int = 15) -> str:
     return secret_code
 
 
+def __generate_unique_secret_code() -> str:
+    secret_code = __generate_secret_code()
+    while Channel.get_or_none(secret_code=secret_code):
+        secret_code = __generate_secret_code()
+    return secret_code
+
+
+def __get_user_id(user: User | int) -> int:
+    return user.telegram_id if isinstance(user, User) else user
+
+
+@in_db_thread
 def create_channel(creator: User, channel_title: str, table_url: str = None) -> Channel | None:
-    channel = get_channel_by_title(title=channel_title)
+    channel = Channel.get_or_none(title=channel_title)
 
     if channel:
         return None
 
-    secret_code = __generate_secret_code()
-    while get_channel_by_secret_code(secret_code):
-        secret_code = __generate_secret_code()
+    with db.atomic():
+        secret_code = __generate_unique_secret_code()
+        channel = Channel.create(creator=creator, title=channel_title, secret_code=secret_code, table_url=table_url)
+        ChannelWriter.create(user=creator, channel=channel)
 
-    channel = Channel.create(creator=creator, title=channel_title, secret_code=secret_code, table_url=table_url)
-    ChannelWriter.create(user=creator, channel=channel)
+    user_channels_cache.invalidate(__get_user_id(creator))
     return channel
 
 
+@in_db_thread
 def add_writer_to_channel(user: User, channel: Channel):
-    return ChannelWriter.get_or_create(user=user, channel=channel)
+    result = ChannelWriter.get_or_create(user=user, channel=channel)
+    user_channels_cache.invalidate(__get_user_id(user))
+    return result
 
 
+@in_db_thread
 def update_channel_secret_code(channel: Channel):
-    secret_code = __generate_secret_code()
-    while get_channel_by_secret_code(secret_code):
-        secret_code = __generate_secret_code()
+    channel.secret_code = __generate_unique_secret_code()
+    channel.save()
+    channels_cache.invalidate(channel.id)
+    return channel
+
 
-    channel.secret_code = secret_code
+@in_db_thread
+def set_channel_table_id(channel: Channel, table_id: str) -> Channel:
+    channel.table_id = table_id
+    # Правки, сделанные в прежней таблице, в новую не переносятся
+    channel.sheet_synced_at = datetime.utcnow()
     channel.save()
+    channels_cache.invalidate(channel.id)
     return channel
 
 
+@in_db_thread
 def get_channel_by_title(title: str) -> Channel | None:
     return Channel.get_or_none(title=title)
 
 
+@in_db_thread
 def get_channel_by_secret_code(code: str) -> Channel | None:
     return Channel.get_or_none(secret_code=code)
 
 
+@in_db_thread
 def get_channel_by_id(channel_id: int) -> Channel | None:
-    return Channel.get_or_none(id=channel_id)
+    channel = channels_cache.get(channel_id)
+    if channel is None:
+        channel = Channel.get_or_none(id=channel_id)
+        if channel:
+            channels_cache.set(channel_id, channel)
+    return channel
 
 
+@in_db_thread
 def get_user_channels(user: User | int) -> list[Channel]:
+    user_id = __get_user_id(user)
+    user_channels = user_channels_cache.get(user_id)
+    if user_channels is not None:
+        return list(user_channels)
+
     query = (
         Channel
         .select()
         .join(ChannelWriter)
-        .where(ChannelWriter.user == user)
+        .where(ChannelWriter.user == user_id)
     )
 
-    return list(query)
+    user_channels = list(query)
+    user_channels_cache.set(user_id, user_channels)
+    return list(user_channels)
 
 
+@in_db_thread
 def is_user_channel_writer(user: User | int, channel: Channel | int) -> bool:
-    return channel.creator == user or ChannelWriter.get_or_none(user=user, channel=channel)
+    user_id = __get_user_id(user)
+    return channel.creator_id == user_id or ChannelWriter.get_or_none(user=user, channel=channel) is not None
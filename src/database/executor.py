@@ -0,0 +1,61 @@
+import functools
+from typing import Callable, Awaitable, ParamSpec, TypeVar
+
+from playhouse.pool import PooledDatabase
+
+from config import DatabaseConfig, ExportConfig
+from src.utils.executors import IOExecutor
+from .models import db
+
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+
+# Соединения PostgreSQL берутся из пула peewee на время задачи: пул закрывает устаревшие и разорванные
+# соединения, поэтому после перезапуска сервера следующие задачи получают новые
+_connection_per_call = isinstance(db, PooledDatabase)
+
+
+def _connect_thread() -> None:
+    # Состояние соединения в peewee хранится в thread-local, поэтому поток открывает своё соединение
+    if not _connection_per_call:
+        db.connect(reuse_if_open=True)
+
+
+def _run_in_connection(func: Callable[..., R], *args, **kwargs) -> R:
+    if not _connection_per_call:
+        return func(*args, **kwargs)
+    with db.connection_context():
+        return func(*args, **kwargs)
+
+
+class DatabaseExecutor:
+    """ Ограниченные пулы потоков для работы с БД. У каждого потока SQLite своё соединение,
+    потоки PostgreSQL берут соединение из пула на время задачи """
+    _pool = IOExecutor(
+        name='db', max_workers=DatabaseConfig.THREADS, max_pending=DatabaseConfig.MAX_PENDING,
+        initializer=_connect_thread
+    )
+    # Выгрузка в файлы идёт долго: она не должна занимать потоки обычных запросов, а лишние выгрузки отклоняются
+    _export_pool = IOExecutor(
+        name='export', max_workers=ExportConfig.THREADS, max_pending=ExportConfig.MAX_PENDING,
+        reject_when_full=True, initializer=_connect_thread
+    )
+
+    @classmethod
+    async def run(cls, func: Callable[..., R], *args, **kwargs) -> R:
+        return await cls._pool.run(_run_in_connection, func, *args, **kwargs)
+
+    @classmethod
+    async def run_export(cls, func: Callable[..., R], *args, **kwargs) -> R:
+        """ Выполняет выгрузку в отдельном пуле. Если он занят и очередь заполнена — PoolSaturatedError """
+        return await cls._export_pool.run(_run_in_connection, func, *args, **kwargs)
+
+
+def in_db_thread(func: Callable[P, R]) -> Callable[P, Awaitable[R]]:
+    """ Превращает синхронную функцию с запросами в корутину, выполняемую в пуле БД """
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await DatabaseExecutor.run(func, *args, **kwargs)
+    return wrapper
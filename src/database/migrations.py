@@ -0,0 +1,106 @@
+from typing import Callable
+
+from peewee import Field, ModelIndex
+from playhouse.migrate import SchemaMigrator, migrate
+
+from src.utils import logger
+from . import sales, sheets_outbox
+from .models import (
+    db, _BaseModel, User, Channel, ChannelWriter, Sale, SheetOperation, SheetTombstone, SchemaMigration
+)
+
+
+def _create_index(*fields: Field, unique: bool = False) -> None:
+    """ Создаёт индекс с тем же именем, что и peewee при создании таблицы (IF NOT EXISTS) """
+    model: type[_BaseModel] = fields[0].model
+    db.execute(ModelIndex(model, fields, unique=unique))
+
+
+def _add_column(field: Field) -> None:
+    """ Добавляет столбец, если его ещё нет (в новой базе он создан вместе с таблицей) """
+    table_name = field.model._meta.table_name
+    if field.column_name not in {column.name for column in db.get_columns(table_name)}:
+        migrate(SchemaMigrator.from_database(db).add_column(table_name, field.column_name, field))
+
+
+def _add_lookup_indexes() -> None:
+    """ Индексы для календаря, отчётов по каналам и статистики пользователей """
+    # Перед уникальным индексом убираем повторные записи редакторов
+    db.execute_sql(
+        'DELETE FROM users_channels WHERE id NOT IN '
+        '(SELECT MIN(id) FROM users_channels GROUP BY user_id, channel_id)'
+    )
+    _create_index(ChannelWriter.user, ChannelWriter.channel, unique=True)
+    _create_index(Sale.channel, Sale.timestamp)
+    _create_index(Channel.title)
+    _create_index(Channel.secret_code)
+    _create_index(User.last_activity)
+    _create_index(User.registration_timestamp)
+
+
+def _fill_month_stats() -> None:
+    """ Заполняет месячные сводки каналов по уже существующим продажам """
+    # Миграции выполняются при запуске вне пула БД, поэтому вызываем синхронную функцию
+    sales.rebuild_month_stats.__wrapped__()
+
+
+def _add_sales_rows_in_table() -> None:
+    """ Сохраняет номер строки каждой продажи в таблице канала """
+    _add_column(Sale.row_in_table)
+    db.execute_sql(
+        'UPDATE sales SET row_in_table = numbered.row_number '
+        'FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY channel_id ORDER BY id) AS row_number FROM sales) '
+        'AS numbered WHERE sales.id = numbered.id'
+    )
+    _create_index(Sale.channel, Sale.row_in_table)
+
+
+def _shard_sheets_by_month() -> None:
+    """ Переводит таблицы каналов на листы по месяцам: продажи нумеруются заново на листе своего месяца,
+    а таблицы каналов перестраиваются целиком при следующей отправке очереди """
+    _add_column(SheetOperation.sheet)
+    # Операции и пометки ссылаются на строки единственного листа, перестройка таблицы их заменяет.
+    # Канал, таблица которого ещё не создана, но уже ждала операций, тоже перестраивается: таблица создастся
+    pending_channel_ids = {operation.channel_id for operation in SheetOperation.select(SheetOperation.channel)}
+    SheetOperation.delete().execute()
+    SheetTombstone.drop_table()
+    SheetTombstone.create_table()
+
+    for channel in Channel.select(Channel.id, Channel.table_id):
+        channel_sales = list(
+            Sale.select(Sale.id, Sale.timestamp, Sale.row_in_table)
+            .where(Sale.channel == channel.id)
+            .order_by(Sale.row_in_table.asc(nulls='LAST'), Sale.id)
+        )
+        sheets_outbox.number_sales_by_sheets(channel_sales)
+        if channel.table_id or channel.id in pending_channel_ids:
+            sheets_outbox.enqueue_sheet_resync(channel_id=channel.id)
+
+
+def _add_channels_sheet_synced_at() -> None:
+    """ Время, с которого переносятся ручные правки таблиц каналов """
+    _add_column(Channel.sheet_synced_at)
+
+
+# Номер версии и функция миграции. Новые миграции добавляются только в конец
+MIGRATIONS: tuple[tuple[int, Callable[[], None]], ...] = (
+    (1, _add_lookup_indexes),
+    (2, _fill_month_stats),
+    (3, _add_sales_rows_in_table),
+    (4, _shard_sheets_by_month),
+    (5, _add_channels_sheet_synced_at),
+)
+
+
+def run_migrations() -> None:
+    """ Применяет к базе данных ещё не применённые миграции """
+    applied_versions = {migration.version for migration in SchemaMigration.select()}
+
+    for version, migration in MIGRATIONS:
+        if version in applied_versions:
+            continue
+
+        with db.atomic():
+            migration()
+            SchemaMigration.create(version=version)
+        logger.info(f'Применена миграция базы данных №{version}: {migration.__name__}')
@@ -1,18 +1,41 @@
 from datetime import datetime
 from peewee import (
-    Model, PostgresqlDatabase, SqliteDatabase, AutoField,
+    Model, Database, SqliteDatabase, AutoField, BigAutoField,
     SmallIntegerField, BigIntegerField, IntegerField,
     DateTimeField, CharField, DecimalField, BooleanField,
-    ForeignKeyField
+    ForeignKeyField, TextField
 )
+from playhouse.pool import PooledPostgresqlDatabase
 
+from config import DatabaseConfig
 
-db = SqliteDatabase(
-    database='data.db'
-    # DatabaseConfig.NAME,
-    # user=DatabaseConfig.USER, password=DatabaseConfig.PASSWORD,
-    # host=DatabaseConfig.HOST, port=DatabaseConfig.PORT
-)
+
+def _create_database() -> Database:
+    if DatabaseConfig.BACKEND == 'postgres':
+        return PooledPostgresqlDatabase(
+            DatabaseConfig.NAME,
+            user=DatabaseConfig.USER, password=DatabaseConfig.PASSWORD,
+            host=DatabaseConfig.HOST, port=DatabaseConfig.PORT,
+            max_connections=DatabaseConfig.MAX_CONNECTIONS, stale_timeout=DatabaseConfig.STALE_TIMEOUT,
+            timeout=DatabaseConfig.BUSY_TIMEOUT
+        )
+
+    return SqliteDatabase(
+        database=DatabaseConfig.NAME,
+        timeout=DatabaseConfig.BUSY_TIMEOUT,
+        pragmas={
+            # Читатели не блокируют запись, fsync только на контрольных точках
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'cache_size': -64 * 1024,  # 64 МБ
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': DatabaseConfig.BUSY_TIMEOUT * 1000,
+            'temp_store': 'memory',
+        }
+    )
+
+
+db = _create_database()
 
 
 class _BaseModel(Model):
@@ -28,9 +51,9 @@ class User(_BaseModel):
     telegram_id = BigIntegerField(primary_key=True, unique=True, null=False)
     name = CharField(default='Пользователь')
     username = CharField(null=True, default='Пользователь')
-    last_activity = DateTimeField(null=True)
+    last_activity = DateTimeField(null=True, index=True)
     bot_blocked = BooleanField(default=False)
-    registration_timestamp = DateTimeField()
+    registration_timestamp = DateTimeField(index=True)
 
     def __str__(self):
         return f"@{self.username}" if self.username else f"tg://user?id={self.telegram_id}"
@@ -40,11 +63,13 @@ class Channel(_BaseModel):
     class Meta:
         db_table = 'channels'
 
-    id = BigIntegerField(primary_key=True)
+    id = BigAutoField()
     creator = ForeignKeyField(User)
-    title = CharField(max_length=350)
-    secret_code = CharField(max_length=50)
+    title = CharField(max_length=350, index=True)
+    secret_code = CharField(max_length=50, index=True)
     table_id = CharField(null=True)
+    # Время изменения таблицы (по Drive API), до которого ручные правки в ней уже перенесены в базу
+    sheet_synced_at = DateTimeField(default=datetime.utcnow)
 
     def __str__(self):
         return self.title
@@ -53,6 +78,9 @@ class Channel(_BaseModel):
 class ChannelWriter(_BaseModel):
     class Meta:
         db_table = 'users_channels'
+        indexes = (
+            (('user', 'channel'), True),
+        )
 
     user = ForeignKeyField(User)
     channel = ForeignKeyField(Channel)
@@ -61,6 +89,10 @@ class ChannelWriter(_BaseModel):
 class Sale(_BaseModel):
     class Meta:
         db_table = 'sales'
+        indexes = (
+            (('channel', 'timestamp'), False),
+            (('channel', 'row_in_table'), False),
+        )
 
     id = AutoField()
 
@@ -75,6 +107,70 @@ class Sale(_BaseModel):
     publication_format = CharField(max_length=50)
     timestamp = DateTimeField(default=datetime.utcnow)
 
+    # Номер продажи на листе её месяца в таблице канала (строка без учёта шапки)
+    row_in_table = IntegerField(null=True)
+
+
+class ChannelMonthStats(_BaseModel):
+    """ Сводка продаж канала за месяц. Обновляется вместе с продажами """
+    class Meta:
+        db_table = 'channels_month_stats'
+        indexes = (
+            (('channel', 'year', 'month'), True),
+        )
+
+    channel = ForeignKeyField(Channel)
+    year = SmallIntegerField()
+    month = SmallIntegerField()
+
+    sales_count = IntegerField(default=0)
+    cost_sum = DecimalField(max_digits=17, decimal_places=2, default=0)
+    manager_sum = DecimalField(max_digits=17, decimal_places=4, default=0)
+
+
+class SheetOperation(_BaseModel):
+    """ Ожидающая отправки операция со строкой Google таблицы канала """
+    class Meta:
+        db_table = 'sheets_outbox'
+
+    id = AutoField()
+    channel = ForeignKeyField(Channel)
+    action = CharField(max_length=20)
+    # Лист месяца продажи, для пересинхронизации всей таблицы не заполняется
+    sheet = CharField(max_length=20, null=True)
+    # Номер продажи на листе (строка без учёта шапки) на момент операции
+    row = IntegerField()
+    # Значения ячеек строки в JSON, для удаления не заполняются
+    values = TextField(null=True)
+
+    attempts = IntegerField(default=0)
+    next_attempt_at = DateTimeField(default=datetime.utcnow, index=True)
+    last_error = TextField(null=True)
+
+
+class SheetTombstone(_BaseModel):
+    """ Строка удалённой продажи: помечена в таблице канала и ждёт сжатия листа """
+    class Meta:
+        db_table = 'sheets_tombstones'
+        indexes = (
+            (('channel', 'sheet', 'row'), True),
+        )
+
+    id = AutoField()
+    channel = ForeignKeyField(Channel)
+    sheet = CharField(max_length=20)
+    # Номер строки на листе без учёта шапки, как row_in_table у продаж
+    row = IntegerField()
+
+
+class SpareTable(_BaseModel):
+    """ Заранее созданная Google таблица с открытым доступом, ещё не выданная каналу """
+    class Meta:
+        db_table = 'spare_tables'
+
+    table_id = CharField(primary_key=True, max_length=100)
+    created_at = DateTimeField(default=datetime.utcnow)
+
 
 class Admin(_BaseModel):
     """ Администратор бота """
@@ -85,6 +181,17 @@ class Admin(_BaseModel):
     name = CharField()
 
 
+class SchemaMigration(_BaseModel):
+    """ Применённая миграция схемы базы данных """
+    class Meta:
+        db_table = 'schema_migrations'
+
+    version = IntegerField(primary_key=True)
+    applied_at = DateTimeField(default=datetime.utcnow)
+
+
 def register_models() -> None:
+    """ Создаёт недостающие таблицы. Изменения существующих таблиц вносятся миграциями """
     for model in _BaseModel.__subclasses__():
-        model.create_table()
+        if not model.table_exists():
+            model.create_table()
@@ -1,135 +1,343 @@
-import calendar
-from datetime import datetime, date
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Generator
 
-from peewee import fn
+from peewee import fn, chunked, EXCLUDED, SqliteDatabase
 
-from src.database.models import Sale, Channel, User
-from src.misc.enums import SalePaymentStatusEnum
+from config import GoogleSheetsConfig
+from src.database.executor import in_db_thread
+from src.database.models import db, Sale, Channel, User, ChannelMonthStats
+from src.database.sheets_outbox import (
+    enqueue_sheet_operation, enqueue_sheet_tombstone, get_next_sheet_row, get_sheet_title, shift_sheet_rows_after,
+    get_sale_table_row, channel_rows_transaction
+)
+from src.misc.enums import SalePaymentStatusEnum, SheetActionEnum
 
 
+@dataclass
+class ChannelMonthReport:
+    """ Отчёт канала за месяц: итоги и количество продаж по дням """
+    year: int
+    month: int
+    sales_sum: float = 0.0
+    manager_sum: float = 0.0
+    sales_counts_by_days: dict[int, int] = field(default_factory=dict)
+
+
+@dataclass
+class SaleSheetEdit:
+    """ Строка продажи, изменённая в таблице вручную """
+    sale_id: int
+    # Строка по данным базы на момент сравнения с таблицей
+    expected_row: list[str]
+    sheet_row: list[str]
+    # Новые значения полей продажи, None — значения в таблице не разобрать
+    fields: dict[str, any] | None
+
+
+def _get_day_bounds(day: date) -> tuple[datetime, datetime]:
+    """ Полуинтервал [начало дня; начало следующего дня) """
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def _get_month_bounds(year: int, month: int) -> tuple[datetime, datetime]:
+    """ Полуинтервал [начало месяца; начало следующего месяца) """
+    start = datetime(year=year, month=month, day=1)
+    end = datetime(year=year + month // 12, month=month % 12 + 1, day=1)
+    return start, end
+
+
+def _get_sale_day():
+    """ День месяца продажи в запросе. В SQLite peewee извлекает его своей функцией на Python для каждой строки,
+    встроенная strftime в разы быстрее """
+    if isinstance(db, SqliteDatabase):
+        return fn.strftime('%d', Sale.timestamp)
+    return Sale.timestamp.day
+
+
+def _add_to_month_stats(sale: Sale, sign: int = 1) -> None:
+    """ Прибавляет продажу к сводке её месяца (sign=-1 — вычитает) """
+    cost = Decimal(str(sale.publication_cost))
+    manager_sum = cost * Decimal(str(sale.manager_percent)) / 100
+
+    (
+        ChannelMonthStats
+        .insert(
+            channel=sale.channel_id, year=sale.timestamp.year, month=sale.timestamp.month,
+            sales_count=sign, cost_sum=sign * cost, manager_sum=sign * manager_sum
+        )
+        .on_conflict(
+            conflict_target=[ChannelMonthStats.channel, ChannelMonthStats.year, ChannelMonthStats.month],
+            update={
+                ChannelMonthStats.sales_count: ChannelMonthStats.sales_count + EXCLUDED.sales_count,
+                ChannelMonthStats.cost_sum: ChannelMonthStats.cost_sum + EXCLUDED.cost_sum,
+                ChannelMonthStats.manager_sum: ChannelMonthStats.manager_sum + EXCLUDED.manager_sum,
+            }
+        )
+        .execute()
+    )
+
+
+def _select_sales(with_relations: bool = False):
+    """ Запрос продаж. with_relations — сразу подгрузить менеджера, канал и создателя канала """
+    if not with_relations:
+        return Sale.select()
+
+    Creator = User.alias()
+    return (
+        Sale
+        .select(Sale, User, Channel, Creator)
+        .join(User, on=(Sale.writer == User.telegram_id))
+        .switch(Sale)
+        .join(Channel)
+        .join(Creator, on=(Channel.creator == Creator.telegram_id))
+    )
+
+
+def _get_month_stats(channel: Channel, year: int, month: int) -> ChannelMonthStats | None:
+    return ChannelMonthStats.get_or_none(
+        (ChannelMonthStats.channel == channel)
+        & (ChannelMonthStats.year == year)
+        & (ChannelMonthStats.month == month)
+    )
+
+
+@in_db_thread
 def create_sale(
         user: User, channel: Channel, buyer: str, timestamp: datetime,
         publication_cost: float, manager_percent: float, publication_format: str,
         payment_status: str = SalePaymentStatusEnum.PAID.value, row_in_table: int = None
 ) -> Sale:
-    purchase = Sale.create(
-        writer=user, channel=channel, timestamp=timestamp, buyer=buyer,
-        publication_cost=publication_cost, manager_percent=manager_percent,
-        publication_format=publication_format, row_in_table=row_in_table,
-        payment_status=payment_status
-    )
+    with channel_rows_transaction(channel.id):
+        if row_in_table is None:
+            row_in_table = get_next_sheet_row(channel_id=channel.id, sheet=get_sheet_title(timestamp))
+
+        purchase = Sale.create(
+            writer=user, channel=channel, timestamp=timestamp, buyer=buyer,
+            publication_cost=publication_cost, manager_percent=manager_percent,
+            publication_format=publication_format, row_in_table=row_in_table,
+            payment_status=payment_status
+        )
+        _add_to_month_stats(purchase)
+        enqueue_sheet_operation(purchase, SheetActionEnum.INSERT)
     return purchase
 
 
-def get_sale_by_id(sale_id: int) -> Sale | None:
-    return Sale.get_or_none(Sale.id == sale_id)
+@in_db_thread
+def update_sale(sale: Sale) -> Sale | None:
+    """ Сохраняет изменённые поля продажи. Остальные поля, в том числе номер строки, который мог сдвинуться
+    после загрузки продажи, берутся из базы. Возвращает сохранённую продажу или None, если её уже удалили """
+    edited_fields = sale.dirty_fields
+    # save(only=[]) записал бы все поля
+    if not edited_fields:
+        return sale
 
+    with channel_rows_transaction(sale.channel_id):
+        current_sale = Sale.get_or_none(Sale.id == sale.id)
+        if not current_sale:
+            return None
 
-def get_sales_by_day(channel_id: int, purchase_date: date) -> list[Sale]:
-    return (
-        Sale
-        .select()
+        _add_to_month_stats(current_sale, sign=-1)
+        for edited_field in edited_fields:
+            setattr(current_sale, edited_field.name, getattr(sale, edited_field.name))
+        current_sale.save(only=edited_fields)
+        _add_to_month_stats(current_sale)
+        enqueue_sheet_operation(current_sale, SheetActionEnum.UPDATE)
+    return current_sale
+
+
+@in_db_thread
+def get_sale_by_id(sale_id: int, with_relations: bool = False) -> Sale | None:
+    return _select_sales(with_relations).where(Sale.id == sale_id).get_or_none()
+
+
+@in_db_thread
+def get_sales_by_day(channel_id: int, purchase_date: date, with_relations: bool = False) -> list[Sale]:
+    day_start, day_end = _get_day_bounds(purchase_date)
+    query = (
+        _select_sales(with_relations)
         .where(
-            (Sale.timestamp.day == purchase_date.day) &
-            (Sale.timestamp.month == purchase_date.month) &
-            (Sale.timestamp.year == purchase_date.year) &
-            (Sale.channel == channel_id)
+            (Sale.channel == channel_id) &
+            (Sale.timestamp >= day_start) &
+            (Sale.timestamp < day_end)
         )
         .order_by(Sale.timestamp)
     )
+    return list(query)
 
 
+@in_db_thread
 def get_sales_counts_by_days(channel: Channel, year: int, month: int) -> dict[int, int]:
     """ Возвращает словарь формата {день месяца: количество закупок} """
-    last_day = calendar.monthrange(year, month)[1]
-    start_date = date(year, month, 1)
-    end_date = date(year, month, last_day)
+    month_start, month_end = _get_month_bounds(year, month)
+    sale_day = _get_sale_day()
 
     events_count_by_date = (
         Sale
-        .select(fn.DATE(Sale.timestamp).alias('date'), fn.Count(Sale.id).alias('event_count'))
+        .select(sale_day.alias('day'), fn.Count(Sale.id).alias('event_count'))
         .where(
-            (fn.DATE(Sale.timestamp) >= start_date) &
-            (fn.DATE(Sale.timestamp) <= end_date) &
-            (Sale.channel == channel)
+            (Sale.channel == channel) &
+            (Sale.timestamp >= month_start) &
+            (Sale.timestamp < month_end)
         )
-        .group_by(fn.DATE(Sale.timestamp))
+        .group_by(sale_day)
         .dicts()
     )
 
-    result_dict = {event['date'].day: event['event_count'] for event in events_count_by_date}
+    result_dict = {int(event['day']): event['event_count'] for event in events_count_by_date}
     return result_dict
 
 
+@in_db_thread
+def get_channel_month_report(channel: Channel, year: int, month: int) -> ChannelMonthReport:
+    """ Возвращает итоги месяца из сводки и продажи по дням за один переход в поток БД """
+    report = ChannelMonthReport(
+        year=year, month=month, sales_counts_by_days=get_sales_counts_by_days.__wrapped__(channel, year, month)
+    )
+    month_stats = _get_month_stats(channel=channel, year=year, month=month)
+    if month_stats:
+        report.sales_sum = float(month_stats.cost_sum)
+        report.manager_sum = float(month_stats.manager_sum)
+    return report
+
+
+@in_db_thread
 def get_total_sales_sum(channel: Channel) -> float:
     result = (
-        Sale
-        .select(fn.SUM(Sale.publication_cost))
-        .where(Sale.channel == channel)
+        ChannelMonthStats
+        .select(fn.SUM(ChannelMonthStats.cost_sum))
+        .where(ChannelMonthStats.channel == channel)
     )
     total = result.scalar() or 0.0
     return total
 
 
+@in_db_thread
 def get_purchases_sum_for_month(channel: Channel, year: int, month: int) -> float:
-    first_date = date(year=year, month=month, day=1)
-    end_date = date(year=year, month=month, day=calendar.monthrange(year=year, month=month)[1])
-
-    result = (
-        Sale
-        .select(fn.SUM(Sale.publication_cost))
-        .where(
-            (Sale.channel == channel)
-            & (Sale.timestamp >= first_date)
-            & (Sale.timestamp <= end_date)
-        )
-    )
-
-    total = result.scalar() or 0.0
-    return total
+    month_stats = _get_month_stats(channel=channel, year=year, month=month)
+    return month_stats.cost_sum if month_stats else 0.0
 
 
+@in_db_thread
 def get_total_manager_sum(channel: Channel) -> float:
     result = (
-        Sale
-        .select(fn.SUM(Sale.publication_cost * Sale.manager_percent / 100))
-        .where(Sale.channel == channel)
+        ChannelMonthStats
+        .select(fn.SUM(ChannelMonthStats.manager_sum))
+        .where(ChannelMonthStats.channel == channel)
     )
     total = result.scalar() or 0.0
     return total
 
 
+@in_db_thread
 def get_manager_sum_for_month(channel: Channel, year: int, month: int) -> float:
-    first_date = date(year=year, month=month, day=1)
-    end_date = date(year=year, month=month, day=calendar.monthrange(year=year, month=month)[1])
-
-    result = (
-        Sale
-        .select(fn.SUM(Sale.publication_cost * Sale.manager_percent / 100))
-        .where(
-            (Sale.channel == channel)
-            & (Sale.timestamp >= first_date)
-            & (Sale.timestamp <= end_date)
-        )
-    )
-    total = result.scalar() or 0.0
-    return total
+    month_stats = _get_month_stats(channel=channel, year=year, month=month)
+    return month_stats.manager_sum if month_stats else 0.0
 
 
+@in_db_thread
 def get_sales_count_in_channel(channel: Channel) -> int:
     return Sale.select().where(Sale.channel == channel).count()
 
 
-def get_sales_in_channel(channel: Channel):
-    return Sale.select().where(Sale.channel == channel)
+@in_db_thread
+def get_sales_in_channel(channel: Channel) -> list[Sale]:
+    query = Sale.select().where(Sale.channel == channel).order_by(Sale.timestamp, Sale.id)
+    return list(query)
 
 
-def get_record_number_in_channel(sale: Sale):
-    """ Возвращает номер продажи в канале по счёту """
-    query = Sale.select(Sale.id).where(Sale.channel == sale.channel).order_by(Sale.id)
-    record_number = query.where(Sale.id < sale.id).count()
-    return record_number + 1
+def iterate_channel_sales(channel_id: int, batch_size: int = 5000) -> Generator[Sale, any, any]:
+    """ Возвращает генератор с продажами канала в порядке создания. Итерировать нужно в потоке БД.
+    Продажи читаются страницами по первичному ключу, поэтому в памяти не больше batch_size строк """
+    last_id = 0
+    while True:
+        query = (
+            Sale.select()
+            .where((Sale.channel == channel_id) & (Sale.id > last_id))
+            .order_by(Sale.id)
+            .limit(batch_size)
+        )
+        sales_count = 0
+        for sale in query.iterator():
+            sales_count += 1
+            last_id = sale.id
+            yield sale
+
+        if sales_count < batch_size:
+            return
 
 
+@in_db_thread
 def delete_sale(sale_id: int) -> None:
-    Sale.delete_by_id(sale_id)
+    sale = Sale.get_or_none(Sale.id == sale_id)
+    if not sale:
+        return
+
+    with channel_rows_transaction(sale.channel_id):
+        # Номер строки мог сдвинуться, пока ждали блокировку
+        sale = Sale.get_or_none(Sale.id == sale_id)
+        if not sale:
+            return
+        _add_to_month_stats(sale, sign=-1)
+        if GoogleSheetsConfig.TOMBSTONE_DELETES:
+            # Строка остаётся в таблице помеченной до сжатия листа, номера остальных продаж не меняются
+            enqueue_sheet_tombstone(sale)
+            sale.delete_instance()
+            return
+
+        enqueue_sheet_operation(sale, SheetActionEnum.DELETE)
+        sale.delete_instance()
+        shift_sheet_rows_after(sale)
+
+
+@in_db_thread
+def import_sheet_edits(channel_id: int, edits: list[SaleSheetEdit]) -> int:
+    """ Переносит в продажи правки из таблицы. Продажа, изменённая в боте после сравнения, не трогается:
+    её строка уже стоит в очереди и перезапишет правку. Неразборчивая правка заменяется строкой из базы.
+    Возвращает количество обновлённых продаж """
+    imported_count = 0
+    with channel_rows_transaction(channel_id):
+        for edit in edits:
+            sale = Sale.get_or_none(Sale.id == edit.sale_id)
+            if not sale or get_sale_table_row(sale) != edit.expected_row:
+                continue
+
+            if edit.fields:
+                _add_to_month_stats(sale, sign=-1)
+                for name, value in edit.fields.items():
+                    setattr(sale, name, value)
+                sale.save(only=sale.dirty_fields)
+                _add_to_month_stats(sale)
+                imported_count += 1
+
+            # Например, «1 000,50» записывается в таблицу как «1000.5»
+            if get_sale_table_row(sale) != edit.sheet_row:
+                enqueue_sheet_operation(sale, SheetActionEnum.UPDATE)
+    return imported_count
+
+
+@in_db_thread
+def rebuild_month_stats() -> int:
+    """ Пересчитывает месячные сводки всех каналов по таблице продаж. Возвращает количество сводок.
+    Суммы считаются в Decimal так же, как в _add_to_month_stats: в SQLite деление целых в запросе целочисленное """
+    months_stats: dict[tuple[int, int, int], dict[str, any]] = {}
+    query = Sale.select(Sale.channel, Sale.timestamp, Sale.publication_cost, Sale.manager_percent)
+
+    with db.atomic():
+        for sale in query.iterator():
+            key = (sale.channel_id, sale.timestamp.year, sale.timestamp.month)
+            month_stats = months_stats.setdefault(key, {
+                'channel': key[0], 'year': key[1], 'month': key[2],
+                'sales_count': 0, 'cost_sum': Decimal(0), 'manager_sum': Decimal(0),
+            })
+            cost = Decimal(str(sale.publication_cost))
+            month_stats['sales_count'] += 1
+            month_stats['cost_sum'] += cost
+            month_stats['manager_sum'] += cost * Decimal(str(sale.manager_percent)) / 100
+
+        ChannelMonthStats.delete().execute()
+        for batch in chunked(months_stats.values(), 500):
+            ChannelMonthStats.insert_many(batch).execute()
+    return len(months_stats)
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from peewee import fn
+
+from .cache import channels_cache
+from .executor import in_db_thread
+from .models import Channel, Sale, SheetOperation, SheetTombstone
+from .sheets_outbox import enqueue_sheet_resync, get_sheet_title
+
+
+@in_db_thread
+def get_sync_watermark() -> datetime | None:
+    """ Время, после которого могли появиться ещё не перенесённые правки хотя бы в одной таблице """
+    return Channel.select(fn.MIN(Channel.sheet_synced_at)).where(Channel.table_id.is_null(False)).scalar()
+
+
+@in_db_thread
+def get_channels_to_import(modified_times: dict[str, datetime]) -> list[tuple[int, str, datetime]]:
+    """ Каналы, таблицы которых изменились после последнего переноса правок: (id канала, id таблицы, время) """
+    if not modified_times:
+        return []
+
+    query = Channel.select(Channel.id, Channel.table_id, Channel.sheet_synced_at).where(
+        Channel.table_id.in_(list(modified_times))
+    )
+    return [
+        (channel.id, channel.table_id, modified_times[channel.table_id])
+        for channel in query
+        if modified_times[channel.table_id] > channel.sheet_synced_at
+    ]
+
+
+@in_db_thread
+def get_channel_sheets_sales(channel_id: int) -> tuple[dict[str, list[Sale | None]], bool]:
+    """ Продажи канала по строкам листов (None — помеченная строка удалённой продажи)
+    и есть ли у канала неотправленные операции """
+    sheets_sales: dict[str, dict[int, Sale | None]] = {}
+    for sale in Sale.select().where(Sale.channel == channel_id):
+        sheets_sales.setdefault(get_sheet_title(sale.timestamp), {})[sale.row_in_table] = sale
+    for tombstone in SheetTombstone.select().where(SheetTombstone.channel == channel_id):
+        sheets_sales.setdefault(tombstone.sheet, {})[tombstone.row] = None
+
+    has_operations = SheetOperation.select().where(SheetOperation.channel == channel_id).exists()
+    return {
+        sheet: [rows_sales.get(row) for row in range(1, max(rows_sales) + 1)]
+        for sheet, rows_sales in sheets_sales.items()
+    }, has_operations
+
+
+@in_db_thread
+def set_channel_synced_at(channel_id: int, synced_at: datetime) -> None:
+    Channel.update(sheet_synced_at=synced_at).where(Channel.id == channel_id).execute()
+    channels_cache.invalidate(channel_id)
+
+
+@in_db_thread
+def request_channel_resync(channel_id: int) -> None:
+    enqueue_sheet_resync(channel_id=channel_id)
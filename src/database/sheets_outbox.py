@@ -0,0 +1,263 @@
+import bisect
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Generator
+
+from peewee import fn, chunked, Case, SqliteDatabase
+
+from src.misc.enums import SheetActionEnum
+from .executor import in_db_thread
+from .models import db, Sale, Channel, SheetOperation, SheetTombstone
+
+
+SALES_TABLE_TITLE = [
+    "Дата", "Время", "Покупатель",
+    "Стоимость", "Процент менеджеру",
+    "Формат публикации", "Статус оплаты"
+]
+
+
+def get_sale_table_row(sale: Sale) -> list[str]:
+    """ Значения ячеек строки продажи в порядке SALES_TABLE_TITLE """
+    return [
+        sale.timestamp.strftime("%d.%m.%Y"), sale.timestamp.strftime("%H:%M"), sale.buyer,
+        f'{float(sale.publication_cost):g}', f'{float(sale.manager_percent):g}',
+        sale.publication_format, sale.payment_status
+    ]
+
+
+# Так выглядит строка удалённой продажи до сжатия листа
+TOMBSTONE_TABLE_ROW = ["❌ Удалено", "", "", "", "", "", ""]
+
+# Продажи каждого месяца хранятся на своём листе таблицы канала, например «10.2026»
+SHEET_TITLE_FORMAT = '%m.%Y'
+
+
+def get_sheet_title(timestamp: datetime) -> str:
+    """ Название листа месяца, на котором хранится продажа с этим временем """
+    return timestamp.strftime(SHEET_TITLE_FORMAT)
+
+
+def _get_sheet_month_start(sheet: str) -> datetime:
+    return datetime.strptime(sheet, SHEET_TITLE_FORMAT)
+
+
+def _is_sheet_sale(channel_id: int, sheet: str):
+    """ Условие выборки продаж канала, хранящихся на листе sheet """
+    month_start = _get_sheet_month_start(sheet)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return (Sale.channel == channel_id) & (Sale.timestamp >= month_start) & (Sale.timestamp < next_month_start)
+
+
+def _enqueue(
+        channel_id: int, action: SheetActionEnum, sheet: str = None, row: int = 0, values: list[str] = None
+) -> None:
+    values = json.dumps(values, ensure_ascii=False) if values is not None else None
+    SheetOperation.create(channel=channel_id, action=action.value, sheet=sheet, row=row, values=values)
+
+
+def enqueue_sheet_operation(sale: Sale, action: SheetActionEnum) -> None:
+    """ Ставит операцию в очередь. Вызывается в той же транзакции, что и изменение продажи """
+    values = None if action == SheetActionEnum.DELETE else get_sale_table_row(sale)
+    _enqueue(
+        channel_id=sale.channel_id, action=action, sheet=get_sheet_title(sale.timestamp),
+        row=sale.row_in_table, values=values
+    )
+
+
+def enqueue_sheet_resync(channel_id: int) -> None:
+    """ Просит перестроить таблицу канала целиком при следующей отправке очереди """
+    _enqueue(channel_id=channel_id, action=SheetActionEnum.RESYNC)
+
+
+def enqueue_sheet_tombstone(sale: Sale) -> None:
+    """ Помечает строку удаляемой продажи вместо удаления: номера следующих строк не меняются.
+    Вызывается в той же транзакции, что и удаление продажи """
+    sheet = get_sheet_title(sale.timestamp)
+    SheetTombstone.create(channel=sale.channel_id, sheet=sheet, row=sale.row_in_table)
+    _enqueue(
+        channel_id=sale.channel_id, action=SheetActionEnum.UPDATE, sheet=sheet,
+        row=sale.row_in_table, values=TOMBSTONE_TABLE_ROW
+    )
+
+
+def shift_sheet_rows_after(sale: Sale) -> None:
+    """ Сдвигает номера следующих продаж листа так же, как сдвигаются строки после удаления строки продажи """
+    (
+        Sale
+        .update(row_in_table=Sale.row_in_table - 1)
+        .where(
+            _is_sheet_sale(channel_id=sale.channel_id, sheet=get_sheet_title(sale.timestamp))
+            & (Sale.row_in_table > sale.row_in_table)
+        )
+        .execute()
+    )
+
+
+@contextmanager
+def channel_rows_transaction(channel_id: int) -> Generator[None, None, None]:
+    """ Транзакция, которая читает номера строк листов канала и затем пишет продажи или очередь.
+    SQLite сразу берёт блокировку записи (BEGIN IMMEDIATE): отложенная транзакция, начавшая с чтения,
+    при записи получает «database is locked» без ожидания busy_timeout, если другой поток уже записал.
+    PostgreSQL блокирует строку канала (SELECT ... FOR UPDATE), и транзакции одного канала идут по очереди """
+    if isinstance(db, SqliteDatabase):
+        with db.atomic('IMMEDIATE'):
+            yield
+        return
+
+    with db.atomic():
+        Channel.select(Channel.id).where(Channel.id == channel_id).for_update().execute()
+        yield
+
+
+def get_next_sheet_row(channel_id: int, sheet: str) -> int:
+    """ Номер строки для новой продажи на листе месяца: после последней продажи и последнего надгробия листа.
+    Вызывается внутри channel_rows_transaction, иначе две продажи получат один номер """
+    last_sale_row = Sale.select(fn.MAX(Sale.row_in_table)).where(_is_sheet_sale(channel_id, sheet)).scalar()
+    last_tombstone_row = (
+        SheetTombstone.select(fn.MAX(SheetTombstone.row))
+        .where((SheetTombstone.channel == channel_id) & (SheetTombstone.sheet == sheet))
+        .scalar()
+    )
+    return max(last_sale_row or 0, last_tombstone_row or 0) + 1
+
+
+def _set_sales_rows(new_rows: list[tuple[int, int]]) -> None:
+    """ Записывает номера строк продаж: [(id продажи, номер строки)] """
+    # Размер пакета ограничен числом параметров в одном запросе SQLite
+    for batch in chunked(new_rows, 300):
+        (
+            Sale
+            .update(row_in_table=Case(Sale.id, batch))
+            .where(Sale.id.in_([sale_id for sale_id, _ in batch]))
+            .execute()
+        )
+
+
+@in_db_thread
+def get_ready_channel_ids() -> list[int]:
+    """ Каналы, все операции которых готовы к отправке (отложенные после ошибки ждут своей попытки) """
+    query = (
+        SheetOperation
+        .select(SheetOperation.channel)
+        .group_by(SheetOperation.channel)
+        .having(fn.MAX(SheetOperation.next_attempt_at) <= datetime.utcnow())
+    )
+    return [operation.channel_id for operation in query]
+
+
+@in_db_thread
+def get_channel_operations(channel_id: int) -> list[SheetOperation]:
+    """ Все операции канала в порядке постановки в очередь """
+    query = SheetOperation.select().where(SheetOperation.channel == channel_id).order_by(SheetOperation.id)
+    return list(query)
+
+
+@in_db_thread
+def delete_operations(operation_ids: list[int]) -> None:
+    SheetOperation.delete().where(SheetOperation.id.in_(operation_ids)).execute()
+
+
+@in_db_thread
+def postpone_operations(operation_ids: list[int], delay_seconds: float, error: str) -> None:
+    (
+        SheetOperation
+        .update(
+            attempts=SheetOperation.attempts + 1,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+            last_error=error
+        )
+        .where(SheetOperation.id.in_(operation_ids))
+        .execute()
+    )
+
+
+@in_db_thread
+def replace_operations_with_resync(channel_id: int, operation_ids: list[int]) -> None:
+    """ Заменяет операции канала, которые не удаётся отправить, перестройкой его таблицы целиком """
+    with db.atomic():
+        SheetOperation.delete().where(SheetOperation.id.in_(operation_ids)).execute()
+        enqueue_sheet_resync(channel_id=channel_id)
+
+
+@in_db_thread
+def get_pending_operations_count() -> int:
+    return SheetOperation.select().count()
+
+
+def number_sales_by_sheets(sales: list[Sale]) -> dict[str, list[Sale]]:
+    """ Раскладывает продажи по листам месяцев в порядке месяцев и нумерует их на каждом листе с единицы.
+    Продажи должны быть упорядочены по номеру строки """
+    sheets_sales: dict[str, list[Sale]] = defaultdict(list)
+    for sale in sorted(sales, key=lambda sale: (sale.timestamp.year, sale.timestamp.month)):
+        sheets_sales[get_sheet_title(sale.timestamp)].append(sale)
+
+    _set_sales_rows([
+        (sale.id, number)
+        for sheet_sales in sheets_sales.values()
+        for number, sale in enumerate(sheet_sales, start=1) if sale.row_in_table != number
+    ])
+    return dict(sheets_sales)
+
+
+@in_db_thread
+def get_channel_sheet_snapshot(channel_id: int) -> tuple[dict[str, list[list[str]]], list[int]]:
+    """ Строки листов таблицы канала по данным базы (по месяцам) и операции очереди, которые в них уже учтены.
+    Номера строк продаж заодно приводятся к 1..N на каждом листе без пропусков и повторов """
+    with channel_rows_transaction(channel_id):
+        sales = list(
+            Sale.select()
+            .where(Sale.channel == channel_id)
+            .order_by(Sale.row_in_table.asc(nulls='LAST'), Sale.id)
+        )
+        sheets_sales = number_sales_by_sheets(sales)
+        # Листы строятся заново без помеченных строк
+        SheetTombstone.delete().where(SheetTombstone.channel == channel_id).execute()
+
+        operations = SheetOperation.select(SheetOperation.id).where(SheetOperation.channel == channel_id)
+        operation_ids = [operation.id for operation in operations]
+
+    sheets_rows = {
+        sheet: [get_sale_table_row(sale) for sale in sheet_sales] for sheet, sheet_sales in sheets_sales.items()
+    }
+    return sheets_rows, operation_ids
+
+
+@in_db_thread
+def get_tombstoned_channel_ids() -> list[int]:
+    query = SheetTombstone.select(SheetTombstone.channel).distinct()
+    return [tombstone.channel_id for tombstone in query]
+
+
+@in_db_thread
+def compact_channel_tombstones(channel_id: int) -> int:
+    """ Ставит в очередь удаление помеченных строк канала и сдвигает номера строк продаж за ними на их листах.
+    Возвращает количество удаляемых строк """
+    with channel_rows_transaction(channel_id):
+        tombstones = (
+            SheetTombstone.select(SheetTombstone.sheet, SheetTombstone.row)
+            .where(SheetTombstone.channel == channel_id)
+            .order_by(SheetTombstone.sheet, SheetTombstone.row)
+        )
+        sheets_tombstone_rows: dict[str, list[int]] = defaultdict(list)
+        for tombstone in tombstones:
+            sheets_tombstone_rows[tombstone.sheet].append(tombstone.row)
+
+        for sheet, tombstone_rows in sheets_tombstone_rows.items():
+            # Снизу вверх: удаление строки не сдвигает строки выше, соседние удаления объединяются в одно
+            for row in reversed(tombstone_rows):
+                _enqueue(channel_id=channel_id, action=SheetActionEnum.DELETE, sheet=sheet, row=row)
+
+            sales = (
+                Sale.select(Sale.id, Sale.row_in_table)
+                .where(_is_sheet_sale(channel_id, sheet) & (Sale.row_in_table > tombstone_rows[0]))
+            )
+            _set_sales_rows([
+                (sale.id, sale.row_in_table - bisect.bisect_left(tombstone_rows, sale.row_in_table))
+                for sale in sales
+            ])
+        SheetTombstone.delete().where(SheetTombstone.channel == channel_id).execute()
+
+    return sum(len(tombstone_rows) for tombstone_rows in sheets_tombstone_rows.values())
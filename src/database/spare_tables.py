@@ -0,0 +1,24 @@
+from .executor import in_db_thread
+from .models import SpareTable
+
+
+@in_db_thread
+def add_spare_table(table_id: str) -> None:
+    SpareTable.create(table_id=table_id)
+
+
+@in_db_thread
+def take_spare_table() -> str | None:
+    """ Забирает самую старую запасную таблицу из пула """
+    while True:
+        spare_table = SpareTable.select().order_by(SpareTable.created_at).first()
+        if not spare_table:
+            return None
+        # Таблицу могли забрать из другого потока между выборкой и удалением
+        if SpareTable.delete().where(SpareTable.table_id == spare_table.table_id).execute():
+            return spare_table.table_id
+
+
+@in_db_thread
+def get_spare_tables_count() -> int:
+    return SpareTable.select().count()
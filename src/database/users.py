@@ -1,21 +1,25 @@
 from datetime import datetime, timedelta
 from typing import Generator
 
-from peewee import DoesNotExist
+from peewee import DoesNotExist, Case, chunked
 
+from .cache import users_cache
+from .executor import in_db_thread
 from .models import User
 
 
 # region SQL Create
 
+@in_db_thread
 def create_user_if_not_exist(telegram_id: int, firstname: str, username: str = None, reflink: str = None) -> User:
-    user = get_user_or_none(telegram_id)
+    user = User.get_or_none(User.telegram_id == telegram_id)
 
     if user:
         user.name = firstname
         user.username = username
         user.bot_blocked = False
         user.save()
+        users_cache.invalidate(telegram_id)
         return user
 
     reg_time = datetime.now()
@@ -31,23 +35,33 @@ def create_user_if_not_exist(telegram_id: int, firstname: str, username: str = N
 
 # region SQL Select
 
+@in_db_thread
 def get_user_or_none(telegram_id: int) -> User | None:
+    user = users_cache.get(telegram_id)
+    if user is not None:
+        return user
+
     try:
         user = User.get(User.telegram_id == telegram_id)
-        return user
     except DoesNotExist:
         return None
 
+    users_cache.set(telegram_id, user)
+    return user
+
 
+@in_db_thread
 def get_users_total_count() -> int:
     return User.select().count()
 
 
+@in_db_thread
 def get_online_users_count(minutes_threshold=15) -> int:
     threshold_time = datetime.now() - timedelta(minutes=minutes_threshold)
     return User.select().where(User.last_activity >= threshold_time).count()
 
 
+@in_db_thread
 def get_users_registered_within_hours_count(hours: int) -> int:
     start_time = datetime.now() - timedelta(hours=hours)
     users_count = User.select().where(User.registration_timestamp >= start_time).count()
@@ -55,21 +69,24 @@ def get_users_registered_within_hours_count(hours: int) -> int:
     return users_count
 
 
+@in_db_thread
 def get_user_lang_code(telegram_id: int) -> str | None:
-    user = get_user_or_none(telegram_id)
+    user = User.get_or_none(User.telegram_id == telegram_id)
     lang_code = user.lang_code if user else None
     return lang_code
 
 
-def get_user_ids() -> Generator[int, any, any]:
-    yield from (user.telegram_id for user in User.select())
+@in_db_thread
+def get_user_ids() -> list[int]:
+    return [telegram_id for telegram_id, in User.select(User.telegram_id).tuples()]
 
 
 def get_all_users() -> Generator[User, any, any]:
-    """ Возвращает генератор с пользователями """
+    """ Возвращает генератор с пользователями. Итерировать нужно в потоке БД (DatabaseExecutor.run) """
     yield from (user for user in User.select())
 
 
+@in_db_thread
 def get_blocked_users_count() -> int:
     return User.select().where(User.bot_blocked == True).count()
 
@@ -77,22 +94,33 @@ def get_blocked_users_count() -> int:
 # endregion
 
 
-def update_last_activity(user_id: int, new_activity_timestamp: datetime):
-    user = User.get_or_none(User.telegram_id == user_id)
-    if user:
-        user.last_activity = new_activity_timestamp
-        user.save()
+@in_db_thread
+def update_last_activities(activities: dict[int, datetime]) -> None:
+    """ Записывает время активности пакетом: {telegram_id: время последней активности} """
+    # Размер пакета ограничен числом параметров в одном запросе SQLite
+    for batch in chunked(activities.items(), 300):
+        (
+            User
+            .update(last_activity=Case(User.telegram_id, batch))
+            .where(User.telegram_id.in_([user_id for user_id, _ in batch]))
+            .execute()
+        )
+    users_cache.invalidate(*activities)
 
 
+@in_db_thread
 def set_user_blocked_bot(user_id: int):
     user = User.get_or_none(User.telegram_id == user_id)
     if user:
         user.bot_blocked = True
         user.save()
+        users_cache.invalidate(user_id)
 
 
+@in_db_thread
 def set_user_unblocked_bot(user_id: int):
     user = User.get_or_none(User.telegram_id == user_id)
     if user:
         user.bot_blocked = False
         user.save()
+        users_cache.invalidate(user_id)
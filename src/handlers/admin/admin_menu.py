@@ -1,13 +1,64 @@
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
+from src.database import sales, channels
 from src.keyboards.admin import AdminKeyboards
+from src.utils import logger
+from src.utils.sheets_import_worker import SheetsImportWorker
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
 
 
 async def handle_admin_command(message: Message):
     await message.answer('Что вы хотите сделать?', reply_markup=AdminKeyboards.get_admin_menu())
 
 
+async def handle_rebuild_stats_command(message: Message):
+    month_stats_count = await sales.rebuild_month_stats()
+    await message.answer(f'✅ Сводки по месяцам пересчитаны: {month_stats_count}')
+
+
+async def handle_resync_command(message: Message, command: CommandObject):
+    args = (command.args or '').split()
+    if not args or not args[0].isdigit() or args[1:] not in ([], ['full']):
+        await message.answer('Использование: /resync <id канала> [full]')
+        return
+
+    channel = await channels.get_channel_by_id(channel_id=int(args[0]))
+    if not channel:
+        await message.answer('❗Канал не найден')
+        return
+
+    full = args[1:] == ['full']
+    await message.answer(f'⏳ Пересинхронизация таблицы канала {channel.title}...')
+    try:
+        rows_count = await SheetsOutboxWorker.resync_channel(channel_id=channel.id, full=full)
+    except Exception as e:
+        logger.exception(e)
+        await message.answer(f'❗Не удалось пересинхронизировать таблицу: {e!r}')
+        return
+    await message.answer(f'✅ Таблица канала {channel.title} пересинхронизирована, перезаписано строк: {rows_count}')
+
+
+async def handle_compact_sheets_command(message: Message):
+    rows_count = await SheetsOutboxWorker.compact()
+    SheetsOutboxWorker.notify()
+    await message.answer(f'✅ Помеченные строки поставлены в очередь на удаление из таблиц: {rows_count}')
+
+
+async def handle_import_sheets_command(message: Message):
+    try:
+        sales_count = await SheetsImportWorker.sync()
+    except Exception as e:
+        logger.exception(e)
+        await message.answer(f'❗Не удалось перенести правки из таблиц: {e!r}')
+        return
+    await message.answer(f'✅ Перенесены ручные правки из таблиц, обновлено продаж: {sales_count}')
+
+
 def register_admin_menu_handlers(router: Router):
     router.message.register(handle_admin_command, Command('admin'))
+    router.message.register(handle_rebuild_stats_command, Command('rebuild_stats'))
+    router.message.register(handle_resync_command, Command('resync'))
+    router.message.register(handle_compact_sheets_command, Command('compact_sheets'))
+    router.message.register(handle_import_sheets_command, Command('import_sheets'))
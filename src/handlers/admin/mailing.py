@@ -1,5 +1,6 @@
 import asyncio
-from typing import Generator
+import time
+from typing import Iterable, Iterator
 
 from aiogram import F, Router, Bot
 from aiogram.exceptions import TelegramRetryAfter
@@ -8,9 +9,11 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardMarkup
 
+from config import MailingConfig
 from src.database.users import get_user_ids
 from src.keyboards.admin import MailingKb
 from src.utils import logger
+from src.utils.sheets_rate_limiter import TokenBucket
 
 
 class MailingPostCreating(StatesGroup):
@@ -59,10 +62,14 @@ FAQ telegram.org/faq | Скачать telegram.org/apps'''
 
 
 class Mailer:
+    """ Рассылка копии сообщения пользователям. Сообщения отправляют несколько воркеров одновременно,
+    а общий бакет держит темп всей рассылки. RetryAfter приостанавливает сразу всех воркеров """
     def __init__(
-            self, bot: Bot, to_user_ids: Generator,
+            self, bot: Bot, to_user_ids: Iterable[int],
             message_to_copy_id: int, from_chat_id: int,
-            markup: InlineKeyboardMarkup = None
+            markup: InlineKeyboardMarkup = None,
+            messages_per_second: float = MailingConfig.MESSAGES_PER_SECOND,
+            workers_count: int = MailingConfig.WORKERS
     ):
         self.bot = bot
         self.user_ids = to_user_ids
@@ -70,27 +77,57 @@ class Mailer:
         self.from_chat_id = from_chat_id
         self.markup = markup
 
+        self.workers_count = workers_count
+        # Без запаса токенов: сообщения уходят равномерно, а не пачкой в начале каждой секунды
+        self._bucket = TokenBucket(rate_per_minute=messages_per_second * 60, capacity=1)
+        self._bucket_lock = asyncio.Lock()
+
+        self.successful_count = 0
+        self.failed_count = 0
+        self.retry_after_count = 0
+
+    async def _wait_for_turn(self) -> None:
+        """ Ждёт токена общего бакета. Воркеры берут токены по одному, поэтому темп не превышается """
+        async with self._bucket_lock:
+            while (delay := self._bucket.get_delay(time.monotonic())) > 0:
+                await asyncio.sleep(delay)
+            self._bucket.take(time.monotonic())
+
     async def _send_message_to_user(self, user_id: int) -> bool:
-        try:  # пробуем скопировать сообщение с постом в чат пользователю
-            await self.bot.copy_message(user_id, self.from_chat_id, self.message_id, reply_markup=self.markup)
-        except TelegramRetryAfter as e:  # обрабатываем ошибку слишком частой отправки
-            await asyncio.sleep(e.retry_after)
-            return await self._send_message_to_user(user_id)
-        except Exception:
-            return False
-        else:  # возвращаем True, если прошло успешно
-            return True
+        for _ in range(MailingConfig.MAX_RETRIES + 1):
+            await self._wait_for_turn()
+            try:  # пробуем скопировать сообщение с постом в чат пользователю
+                await self.bot.copy_message(user_id, self.from_chat_id, self.message_id, reply_markup=self.markup)
+            except TelegramRetryAfter as e:
+                # Лимит общий для бота: пауза нужна всем воркерам, а не только получившему ответ
+                self.retry_after_count += 1
+                self._bucket.block(e.retry_after, now=time.monotonic())
+            except Exception:
+                return False
+            else:  # возвращаем True, если прошло успешно
+                return True
+        return False
+
+    async def _run_worker(self, user_ids: Iterator[int]) -> None:
+        # Итератор общий для всех воркеров: каждый берёт следующего ещё не обработанного пользователя
+        for user_id in user_ids:
+            if await self._send_message_to_user(user_id):
+                self.successful_count += 1
+            else:
+                self.failed_count += 1
 
     async def start_mailing(self) -> int:
-        successful_count = 0
+        started_at = time.monotonic()
+        user_ids = iter(self.user_ids)
         try:
-            for user_id in self.user_ids:
-                if await self._send_message_to_user(user_id):
-                    successful_count += 1
-                await asyncio.sleep(0.05)
+            await asyncio.gather(*(self._run_worker(user_ids) for _ in range(self.workers_count)))
         finally:
-            logger.info(f'Рассылка закончилась, {successful_count} юзеров получили сообщения.')
-            return successful_count
+            logger.info(
+                f'Рассылка закончилась за {time.monotonic() - started_at:.0f} с, '
+                f'{self.successful_count} юзеров получили сообщения, ошибок {self.failed_count}, '
+                f'ответов RetryAfter {self.retry_after_count}.'
+            )
+        return self.successful_count
 
 
 # Handlers
@@ -158,7 +195,7 @@ async def handle_confirm_mailing_callback(callback: CallbackQuery, state: FSMCon
     data = await state.get_data()
     mailer = Mailer(
         bot=callback.message.bot,
-        to_user_ids=get_user_ids(),
+        to_user_ids=await get_user_ids(),
         message_to_copy_id=data.get('message_id'),
         from_chat_id=callback.from_user.id,
         markup=data.get('markup')
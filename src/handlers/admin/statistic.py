@@ -6,11 +6,16 @@ from tempfile import NamedTemporaryFile
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
 
 from src.database import users
+from src.database.cache import get_caches_stats
+from src.database.executor import DatabaseExecutor
 from src.database.users import get_all_users
 from src.keyboards.admin import AdminKeyboards, StatisticCallback
+from src.utils import GoogleSheetsAPI
+from src.utils.executors import IOExecutor, PoolSaturatedError
+from src.utils.sheets_tracing import SheetsTracer
 
 
 # region Utils
@@ -63,36 +68,65 @@ class Utils:
             temp_file_path = temp_file.name
         return temp_file_path
 
+    @staticmethod
+    def write_users_export() -> tuple[str, str]:
+        """ Таблица пользователей и временный файл с их id. Одна задача пула выгрузки на оба файла """
+        return Utils.write_users_to_xl(), Utils.write_user_ids_to_txt()
+
 
 class Messages:
     @staticmethod
-    def get_statistic_info(key: str) -> str:
-        return {
-            'all_time': f'Всего пользовалось ботом: <b>{users.get_users_total_count()} юзеров</b>',
-            'month': Messages.get_count_per_hours('месяц', 30 * 24),
-            'week': Messages.get_count_per_hours('неделю', 7 * 24),
-            'day': Messages.get_count_per_hours('сутки', 24),
-            'hour': Messages.get_count_per_hours('час', 1),
-            'other': '🔘 Введите количество часов, за которое хотите получить статистику: ',
-        }.get(key)
+    async def get_statistic_info(key: str) -> str | None:
+        match key:
+            case 'all_time': return f'Всего пользовалось ботом: <b>{await users.get_users_total_count()} юзеров</b>'
+            case 'month': return await Messages.get_count_per_hours('месяц', 30 * 24)
+            case 'week': return await Messages.get_count_per_hours('неделю', 7 * 24)
+            case 'day': return await Messages.get_count_per_hours('сутки', 24)
+            case 'hour': return await Messages.get_count_per_hours('час', 1)
+            case 'other': return '🔘 Введите количество часов, за которое хотите получить статистику: '
 
     @staticmethod
-    def get_menu():
-        users_total_count = users.get_users_total_count()
-        blocked_users_count = users.get_blocked_users_count()
+    async def get_menu():
+        users_total_count = await users.get_users_total_count()
+        blocked_users_count = await users.get_blocked_users_count()
+        online_users_count = await users.get_online_users_count()
+        caches_stats = ', '.join(
+            f"{stats['name']} {stats['hits']}/{stats['misses']}" for stats in get_caches_stats()
+        )
+        sheets_stats = GoogleSheetsAPI.get_scheduler_stats()
+        saved_api_calls = sorted(GoogleSheetsAPI.get_saved_api_calls().items(), key=lambda item: -item[1])
+        sheet_ids_cache_stats = GoogleSheetsAPI.get_sheet_ids_cache_stats()
+        saved_api_calls_stats = str(sum(count for _, count in saved_api_calls))
+        if saved_api_calls:
+            saved_api_calls_stats += f' ({", ".join(f"{operation} {count}" for operation, count in saved_api_calls)})'
         text = (
             f'📊 Статистика \n\n'
             f'👥 Всего в базе: {users_total_count} \n'
-            f'🌐 Онлайн: {users.get_online_users_count()} \n'
+            f'🌐 Онлайн: {online_users_count} \n'
             f'🚫 Блокировали бота: {blocked_users_count} \n'
             f'🟢 Живых: {users_total_count - blocked_users_count}\n'
+            f'🗄 Кэш БД (попадания/промахи): {caches_stats}\n'
+            f'💾 Кэш листов Google Sheets (таблиц {sheet_ids_cache_stats["size"]}), '
+            f'сэкономлено запросов: {saved_api_calls_stats}\n'
+            f'📑 Google Sheets: в очереди {sheets_stats["queue_depth"]} (макс. {sheets_stats["max_queue_depth"]}), '
+            f'ожидание {sheets_stats["average_wait"]:.1f}/{sheets_stats["max_wait"]:.1f} с, '
+            f'ответов 429: {sheets_stats["throttled"]}\n'
         )
+        pools_stats = ', '.join(
+            f"{stats['name']} {stats['active']}/{stats['threads']} "
+            f"(очередь {stats['queued'] + stats['waiting']}, загрузка {stats['utilization']:.0%}, "
+            f"отклонено {stats['rejected']})"
+            for stats in IOExecutor.get_all_stats()
+        )
+        text += f'🧵 Потоки (заняты/всего): {pools_stats}\n'
+        if sheets_calls := SheetsTracer.get_summary():
+            text += '⏱ Вызовы Google API (p50/p95): \n' + '\n'.join(f'• {line}' for line in sheets_calls) + '\n'
         return text + f' \n📊 Выберите, за какой промежуток времени просмотреть статистику:'
 
     @staticmethod
-    def get_count_per_hours(time_word: str, hours: int):
+    async def get_count_per_hours(time_word: str, hours: int):
         return f'За {time_word} в бота пришли: \n' \
-               f'<b>{users.get_users_registered_within_hours_count(hours)} юзера(ов)</b>'
+               f'<b>{await users.get_users_registered_within_hours_count(hours)} юзера(ов)</b>'
 
 
 class StatsGettingStates(StatesGroup):
@@ -104,18 +138,18 @@ class StatsGettingStates(StatesGroup):
 # region Handlers
 
 async def handle_admin_statistic_button(message: Message):
-    await message.answer(text=Messages.get_menu(), reply_markup=AdminKeyboards.get_statistics())
+    await message.answer(text=await Messages.get_menu(), reply_markup=AdminKeyboards.get_statistics())
 
 
 async def handle_show_stats_callback(callback: CallbackQuery, state: FSMContext, callback_data: StatisticCallback):
     message = callback.message
 
     if callback_data.action == 'back':
-        await message.edit_text(text=Messages.get_menu(), reply_markup=AdminKeyboards.get_statistics())
+        await message.edit_text(text=await Messages.get_menu(), reply_markup=AdminKeyboards.get_statistics())
         await state.clear()
         return
 
-    response = Messages.get_statistic_info(callback_data.action)
+    response = await Messages.get_statistic_info(callback_data.action)
     if response:
         await message.edit_text(text=response, reply_markup=AdminKeyboards.get_back_from_stats())
 
@@ -131,25 +165,34 @@ async def handle_get_hours_message(message: Message, state: FSMContext):
         )
         return
 
-    users_count = users.get_users_registered_within_hours_count(int(message.text))
     await message.answer(
-        text=Messages.get_count_per_hours(f'{message.text} часов', users_count),
+        text=await Messages.get_count_per_hours(f'{message.text} часов', int(message.text)),
         reply_markup=AdminKeyboards.get_back_from_stats()
     )
     await state.clear()
 
 
 async def handle_export_callback(callback: CallbackQuery):
-    file_name = Utils.write_users_to_xl()
+    try:
+        file_name, txt_temp_file_path = await DatabaseExecutor.run_export(Utils.write_users_export)
+    except PoolSaturatedError:
+        await callback.answer('⏳ Сейчас готовится много файлов, попробуйте через пару минут', show_alert=True)
+        return
     await callback.message.answer_document(document=FSInputFile(path=file_name))
 
     # Отправляем временный файл как документ
-    txt_temp_file_path = Utils.write_user_ids_to_txt()
     await callback.message.answer_document(document=FSInputFile(path=txt_temp_file_path, filename='user_ids.txt'))
     os.remove(txt_temp_file_path)
     await callback.answer()
 
 
+async def handle_sheets_metrics_callback(callback: CallbackQuery):
+    date = datetime.now().strftime("%Y.%m.%d %H-%M")
+    metrics = BufferedInputFile(SheetsTracer.get_text_dump().encode('utf-8'), filename=f'Метрики Google API {date}.txt')
+    await callback.message.answer_document(document=metrics)
+    await callback.answer()
+
+
 # endregion
 
 
@@ -159,6 +202,9 @@ def register_admin_statistic_handlers(router: Router):
 
     # Кнопка экспорт
     router.callback_query.register(handle_export_callback, StatisticCallback.filter(F.action == 'export'))
+    router.callback_query.register(
+        handle_sheets_metrics_callback, StatisticCallback.filter(F.action == 'sheets_metrics')
+    )
 
     # Показать статистику за период
     router.callback_query.register(handle_show_stats_callback, StatisticCallback.filter())
@@ -8,11 +8,11 @@ from src.database.users import set_user_blocked_bot, set_user_unblocked_bot
 
 # Блокировка бота
 async def handle_bot_blocked(event: ChatMemberUpdated):
-    set_user_blocked_bot(user_id=event.from_user.id)
+    await set_user_blocked_bot(user_id=event.from_user.id)
 
 
 async def handle_bot_unblocked(event: ChatMemberUpdated):
-    set_user_unblocked_bot(user_id=event.from_user.id)
+    await set_user_unblocked_bot(user_id=event.from_user.id)
 
 
 # Пустой callback
@@ -1,32 +1,37 @@
+import os
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, FSInputFile
 
 from src.database import channels
+from src.database.executor import DatabaseExecutor
 from src.keyboards.user import UserKeyboards
 from src.messages.user import UserMessages
 from src.misc.callbacks_data import NavigationCallback, ChannelCallback
+from src.utils.executors import PoolSaturatedError
+from src.utils.sales_export import SalesExport
 
 
-def __get_settings_message_data(user_id: int) -> dict:
-    user_channels = channels.get_user_channels(user=user_id)
+async def __get_settings_message_data(user_id: int) -> dict:
+    user_channels = await channels.get_user_channels(user=user_id)
     markup = UserKeyboards.get_channels_for_settings(channels=user_channels)
     return {'text': '🔍 Выберите канал:', 'reply_markup': markup}
 
 
 async def handle_settings_button_message(message: Message):
-    if not channels.get_user_channels(user=message.from_user.id):
+    if not await channels.get_user_channels(user=message.from_user.id):
         await message.answer(UserMessages.get_add_channels_first())
         return
 
-    await message.answer(**__get_settings_message_data(user_id=message.from_user.id))
+    await message.answer(**await __get_settings_message_data(user_id=message.from_user.id))
 
 
 async def handle_back_to_settings_callback(callback: CallbackQuery):
-    await callback.message.edit_text(**__get_settings_message_data(user_id=callback.from_user.id))
+    await callback.message.edit_text(**await __get_settings_message_data(user_id=callback.from_user.id))
 
 
 async def handle_channel_to_settings_callback(callback: CallbackQuery, callback_data: ChannelCallback):
-    channel = channels.get_channel_by_id(channel_id=callback_data.channel_id)
+    channel = await channels.get_channel_by_id(channel_id=callback_data.channel_id)
     bot_username = (await callback.bot.get_me()).username
     await callback.message.edit_text(
         text=f'⚙ Настройки канала {channel}',
@@ -34,6 +39,28 @@ async def handle_channel_to_settings_callback(callback: CallbackQuery, callback_
     )
 
 
+async def handle_export_sales_callback(callback: CallbackQuery, callback_data: ChannelCallback):
+    channel = await channels.get_channel_by_id(channel_id=callback_data.channel_id)
+    if not channel or not await channels.is_user_channel_writer(user=callback.from_user.id, channel=channel):
+        await callback.answer('❗Канал недоступен', show_alert=True)
+        return
+
+    await callback.answer('⏳ Готовлю файл с продажами...')
+    file_format = callback_data.action.removeprefix('export_')
+    try:
+        file_path = await DatabaseExecutor.run_export(
+            SalesExport.write_channel_sales, channel_id=channel.id, file_format=file_format
+        )
+    except PoolSaturatedError:
+        await callback.message.answer('⏳ Сейчас готовится много файлов, попробуйте через пару минут')
+        return
+    try:
+        file_name = SalesExport.get_file_name(channel_title=channel.title, file_format=file_format)
+        await callback.message.answer_document(document=FSInputFile(path=file_path, filename=file_name))
+    finally:
+        os.remove(file_path)
+
+
 def register_channels_handlers(router: Router):
     router.message.register(handle_settings_button_message, F.text.lower().contains('каналы'))
 
@@ -42,3 +69,7 @@ def register_channels_handlers(router: Router):
     )
 
     router.callback_query.register(handle_channel_to_settings_callback, ChannelCallback.filter(F.action == 'channels'))
+    router.callback_query.register(
+        handle_export_sales_callback,
+        ChannelCallback.filter(F.action.in_({f'export_{file_format}' for file_format in SalesExport.formats}))
+    )
@@ -16,23 +16,7 @@ from src.misc.callbacks_data import ChannelCallback, DateCallback, CalendarNavig
 from src.misc.enums import SalePaymentStatusEnum
 from src.misc.states.user import PurchaseAddingStates
 from src.utils import GoogleSheetsAPI
-
-
-# region Utils
-
-
-def __get_table_name(channel_name: str) -> str:
-    return f"Продажи {channel_name}"
-
-
-def get_table_title() -> list[str]:
-    return [
-        "Дата", "Время", "Покупатель",
-        "Стоимость", "Процент менеджеру",
-        "Формат публикации", "Статус оплаты"
-    ]
-
-# endregion
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
 
 
 async def handle_create_purchase_callback(message: Message, state: FSMContext):
@@ -41,8 +25,8 @@ async def handle_create_purchase_callback(message: Message, state: FSMContext):
         reply_markup=UserKeyboards.get_cancel_reply()
     )
 
-    user = get_user_or_none(telegram_id=message.from_user.id)
-    user_channels = channels.get_user_channels(user=user)
+    user = await get_user_or_none(telegram_id=message.from_user.id)
+    user_channels = await channels.get_user_channels(user=user)
     markup = UserKeyboards.get_channels_to_create_purchase(user_channels)
 
     if len(user_channels) == 0:
@@ -73,8 +57,8 @@ async def handle_channel_callback(callback: CallbackQuery, callback_data: Channe
 
 
 async def handle_new_channel_title_message(message: Message, state: FSMContext):
-    user = get_user_or_none(telegram_id=message.from_user.id)
-    channel = channels.create_channel(creator=user, channel_title=message.text)
+    user = await get_user_or_none(telegram_id=message.from_user.id)
+    channel = await channels.create_channel(creator=user, channel_title=message.text)
     await state.update_data(channel_id=channel.id)
 
     current_date = datetime.date.today()
@@ -186,42 +170,22 @@ async def __finish_creation(user_id: int, bot: Bot, created_sale: Sale):
         f"<tg-spoiler>Процент менеджеру: {created_sale.manager_percent}% <b>({manager_profit:.2f}₽)</b></tg-spoiler>",
         reply_markup=ReplyKeyboardRemove()
     )
-    msg = await bot.send_animation(
-        chat_id=user_id,
-        animation=UserMessages.get_loading_animation(), caption='Загрузка таблицы...'
-    )
 
-    # Занесение данных в таблицу
-    table_name = __get_table_name(channel_name=created_sale.channel.title)
-
-    if not created_sale.channel.table_id:
-        table_id = await GoogleSheetsAPI.create_table(table_name=table_name, title_data=get_table_title())
-        created_sale.channel.table_id = table_id
-        created_sale.channel.save()
-
-    data = [
-        date_str, time_str, created_sale.buyer, created_sale.publication_cost,
-        created_sale.manager_percent, created_sale.publication_format,
-        created_sale.payment_status
-    ]
-    record_number = sales.get_sales_count_in_channel(channel=created_sale.channel)
-    table_url = await GoogleSheetsAPI.insert_row_data(
-        table_id=created_sale.channel.table_id, data=data, position=record_number
-    )
+    # Строка уже в очереди на отправку в таблицу, она будет записана в фоне
+    SheetsOutboxWorker.notify()
 
-    month_profit = sales.get_purchases_sum_for_month(
-        year=created_sale.timestamp.year, month=created_sale.timestamp.month, channel=created_sale.channel
-    )
-    manager_month_profit = sales.get_manager_sum_for_month(
+    month_report = await sales.get_channel_month_report(
         year=created_sale.timestamp.year, month=created_sale.timestamp.month, channel=created_sale.channel
     )
     text = (
         f'<b>Общий итог продаж за {UserMessages.get_month_name(month_num=created_sale.timestamp.month)}</b> \n\n'
-        f'Доход: {month_profit:.2f} ₽ \n'
-        f'Доход менеджера за месяц: {manager_month_profit:.2f} ₽'
+        f'Доход: {month_report.sales_sum:.2f} ₽ \n'
+        f'Доход менеджера за месяц: {month_report.manager_sum:.2f} ₽'
     )
-    await msg.delete()
-    await bot.send_message(chat_id=user_id, text=text, reply_markup=UserKeyboards.get_table(table_url=table_url))
+    # Таблица нового канала ещё создаётся, ссылка на неё появится в настройках канала
+    table_id = created_sale.channel.table_id
+    markup = UserKeyboards.get_table(table_url=GoogleSheetsAPI.get_table_url(table_id)) if table_id else None
+    await bot.send_message(chat_id=user_id, text=text, reply_markup=markup)
     await bot.send_message(chat_id=user_id, text=UserMessages.get_main_menu(), reply_markup=UserKeyboards.get_main_menu())
 
 
@@ -262,10 +226,10 @@ async def handle_payment_status(message: Message, state: FSMContext):
     # Вывод результатов
     publication_cost = data.get("publication_cost")
 
-    user = get_user_or_none(telegram_id=message.from_user.id)
-    channel = channels.get_channel_by_id(channel_id=data.get("channel_id"))
+    user = await get_user_or_none(telegram_id=message.from_user.id)
+    channel = await channels.get_channel_by_id(channel_id=data.get("channel_id"))
     timestamp = datetime.datetime.combine(data.get("date"), data.get("time"))
-    new_purchase = sales.create_sale(
+    new_purchase = await sales.create_sale(
         user=user,
         buyer=data.get("buyer"),
         channel=channel,
@@ -278,9 +242,9 @@ async def handle_payment_status(message: Message, state: FSMContext):
 
     await __finish_creation(bot=message.bot, user_id=message.from_user.id, created_sale=new_purchase)
 
-    if user.telegram_id != channel.creator.telegram_id:
+    if user.telegram_id != channel.creator_id:
         await message.bot.send_message(
-            chat_id=channel.creator.telegram_id,
+            chat_id=channel.creator_id,
             text=UserMessages.get_purchase_notification_for_owner(user, new_purchase)
         )
 
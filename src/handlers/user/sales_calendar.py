@@ -16,7 +16,7 @@ from src.keyboards.user import UserKeyboards
 from src.misc.callbacks_data import NavigationCallback, DateCallback, ChannelCallback, CalendarNavigationCallback, \
     SaleCallback, EditSaleCallback
 from src.misc.enums import SalePaymentStatusEnum
-from src.utils import GoogleSheetsAPI
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
 
 
 class SaleEditingStates(StatesGroup):
@@ -36,22 +36,22 @@ class SaleEditingStates(StatesGroup):
             case 'format': return cls.enter_new_format
 
 
-def __get_message_data(user_id: int) -> dict:
-    user_channels = channels.get_user_channels(user=user_id)
+async def __get_message_data(user_id: int) -> dict:
+    user_channels = await channels.get_user_channels(user=user_id)
     markup = UserKeyboards.get_channels_to_show_calendar(channels=user_channels)
     return {'text': 'Выберите канал:', 'reply_markup': markup}
 
 
 async def handle_sales_calendar_button_message(message: Message):
-    if not channels.get_user_channels(user=message.from_user.id):
+    if not await channels.get_user_channels(user=message.from_user.id):
         await message.answer(UserMessages.get_add_channels_first())
         return
 
-    await message.answer(**__get_message_data(user_id=message.from_user.id))
+    await message.answer(**await __get_message_data(user_id=message.from_user.id))
 
 
 async def handle_back_from_calendar_callback(callback: CallbackQuery):
-    await callback.message.edit_text(**__get_message_data(user_id=callback.from_user.id))
+    await callback.message.edit_text(**await __get_message_data(user_id=callback.from_user.id))
 
 
 async def handle_show_channel_calendar_callback(
@@ -67,22 +67,20 @@ async def handle_show_channel_calendar_callback(
     if not 2015 < year < 2100:
         return
 
-    channel = channels.get_channel_by_id(callback_data.channel_id)
+    channel = await channels.get_channel_by_id(callback_data.channel_id)
 
     if not channel:
         return
 
-    month_profit = sales.get_purchases_sum_for_month(channel=channel, year=year, month=month)
-    manager_profit = sales.get_manager_sum_for_month(channel=channel, year=year, month=month)
+    month_report = await sales.get_channel_month_report(channel=channel, year=year, month=month)
 
     text = UserMessages.get_channel_profit(
-        manager_profit=manager_profit, month_profit=month_profit, channel_title=channel.title,
+        manager_profit=month_report.manager_sum, month_profit=month_report.sales_sum, channel_title=channel.title,
         month_num=month
     )
 
-    days_purchases_count = sales.get_sales_counts_by_days(channel=channel, year=year, month=month)
     markup = UserKeyboards.get_channel_purchases_calendar(
-        days_purchases_count=days_purchases_count,
+        days_purchases_count=month_report.sales_counts_by_days,
         year=year, month_num=month, channel_id=channel.id
     )
     await callback.message.edit_text(text=text, reply_markup=markup)
@@ -91,8 +89,8 @@ async def handle_show_channel_calendar_callback(
 async def handle_show_day_purchases_callback(callback: CallbackQuery, callback_data: DateCallback):
     await callback.answer()
 
-    channel = channels.get_channel_by_id(callback_data.channel_id)
-    sales_in_day = sales.get_sales_by_day(channel_id=channel, purchase_date=callback_data.date)
+    channel = await channels.get_channel_by_id(callback_data.channel_id)
+    sales_in_day = await sales.get_sales_by_day(channel_id=channel, purchase_date=callback_data.date)
 
     if not sales_in_day:
         try:
@@ -107,7 +105,7 @@ async def handle_show_day_purchases_callback(callback: CallbackQuery, callback_d
 
 
 async def handle_show_sale_callback(callback: CallbackQuery, callback_data: SaleCallback):
-    sale = sales.get_sale_by_id(sale_id=callback_data.sale_id)
+    sale = await sales.get_sale_by_id(sale_id=callback_data.sale_id, with_relations=True)
     if not sale:
         return
     await __show_sale(callback.bot, callback.from_user.id, sale, callback.message.message_id)
@@ -133,7 +131,7 @@ async def __show_sale(bot: Bot, user_id: int, sale: Sale, edit_msg_id: int = Non
 
 
 async def handle_delete_sale_callback(callback: CallbackQuery, callback_data: EditSaleCallback):
-    sale = sales.get_sale_by_id(sale_id=callback_data.sale_id)
+    sale = await sales.get_sale_by_id(sale_id=callback_data.sale_id, with_relations=True)
     if not sale:
         return
 
@@ -143,46 +141,39 @@ async def handle_delete_sale_callback(callback: CallbackQuery, callback_data: Ed
 
     await callback.answer(text="🗑 Продажа удалена")
 
-    sale_number = sales.get_record_number_in_channel(sale=sale)
-    sales.delete_sale(sale_id=callback_data.sale_id)
+    await sales.delete_sale(sale_id=callback_data.sale_id)
+    SheetsOutboxWorker.notify()
+
     callback_data = DateCallback(date=sale.timestamp.date(), channel_id=sale.channel.id)
     await handle_show_day_purchases_callback(callback, callback_data)
 
-    await GoogleSheetsAPI.delete_row(table_id=sale.channel.table_id, number=sale_number)
-
 
 async def handle_edit_sale_callback(callback: CallbackQuery, callback_data: EditSaleCallback, state: FSMContext):
     await state.update_data(sale_id=callback_data.sale_id, option=callback_data.option)
     await state.set_state(SaleEditingStates.get_state(callback_data.option))
     await callback.message.edit_reply_markup(reply_markup=None)
 
-    text, markup, col_number = None, UserKeyboards.get_cancel_reply(), None
+    text, markup = None, UserKeyboards.get_cancel_reply()
     match callback_data.option:
         case "buyer":
             text = "Введите нового продавца:"
-            col_number = 3
         case "cost":
             text = "Введите новую цену:"
-            col_number = 4
         case "manager_percent":
             text = "Введите новый процент менеджеру:"
-            col_number = 5
         case "format":
             text = "Выберите новый формат:"
             markup = UserKeyboards.get_publication_formats()
-            col_number = 6
         case "payment_status":
             text = "Выберите статус оплаты:"
             markup = UserKeyboards.get_payment_statuses()
-            col_number = 7
 
-    await state.update_data(col_number=col_number)
     await callback.message.answer(text=text, reply_markup=markup)
 
 
 async def handle_sale_new_data_message(message: Message, state: FSMContext):
     data = await state.get_data()
-    sale = sales.get_sale_by_id(sale_id=data.get("sale_id"))
+    sale = await sales.get_sale_by_id(sale_id=data.get("sale_id"), with_relations=True)
 
     if data.get("option") in ("cost", "manager_percent"):
         try:
@@ -203,24 +194,19 @@ async def handle_sale_new_data_message(message: Message, state: FSMContext):
         case "buyer": sale.buyer = message.text
         case "format": sale.publication_format = message.text
         case "manager_percent": sale.manager_percent = float(message.text)
-    sale.save()
+    if not await sales.update_sale(sale=sale):
+        await message.answer('Продажа уже удалена', reply_markup=UserKeyboards.get_main_menu())
+        return
+    SheetsOutboxWorker.notify()
 
     await message.answer('✅ Изменения сохранены', reply_markup=UserKeyboards.get_main_menu())
     await __show_sale(bot=message.bot, user_id=message.from_user.id, sale=sale)
 
-    sale_number_in_channel = sales.get_record_number_in_channel(sale=sale)
-    sale_row_number = sale_number_in_channel + 1  # +1 из-за шапки таблицы
-    await GoogleSheetsAPI.edit_cell(
-        table_id=sale.channel.table_id,
-        data=message.text,
-        xy=(sale_row_number, data.get('col_number'))
-    )
-
 
 async def handle_cancel_editing(message: Message, state: FSMContext):
     await message.answer(text='Изменение отменено', reply_markup=UserKeyboards.get_main_menu())
     data = await state.get_data()
-    sale = sales.get_sale_by_id(sale_id=data.get('sale_id'))
+    sale = await sales.get_sale_by_id(sale_id=data.get('sale_id'), with_relations=True)
     await __show_sale(bot=message.bot, user_id=message.from_user.id, sale=sale)
     await state.clear()
 
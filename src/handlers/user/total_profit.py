@@ -9,12 +9,12 @@ from src.misc.callbacks_data import NavigationCallback, ChannelCallback
 
 
 async def handle_total_profit_button_message(message: Message):
-    if not channels.get_user_channels(user=message.from_user.id):
+    if not await channels.get_user_channels(user=message.from_user.id):
         await message.answer(UserMessages.get_add_channels_first())
         return
 
-    user = get_user_or_none(telegram_id=message.from_user.id)
-    user_channels = channels.get_user_channels(user=user)
+    user = await get_user_or_none(telegram_id=message.from_user.id)
+    user_channels = await channels.get_user_channels(user=user)
 
     await message.answer(
         text='Выберите канал для показа общего дохода:',
@@ -23,8 +23,8 @@ async def handle_total_profit_button_message(message: Message):
 
 
 async def handle_back_to_total_profit_callback(callback: CallbackQuery):
-    user = get_user_or_none(telegram_id=callback.from_user.id)
-    user_channels = channels.get_user_channels(user=user)
+    user = await get_user_or_none(telegram_id=callback.from_user.id)
+    user_channels = await channels.get_user_channels(user=user)
 
     await callback.message.edit_text(
         text='Выберите канал для показа общего дохода:',
@@ -34,10 +34,10 @@ async def handle_back_to_total_profit_callback(callback: CallbackQuery):
 
 async def handle_show_channel_total_profit(callback: CallbackQuery, callback_data: ChannelCallback):
     await callback.answer()
-    channel = channels.get_channel_by_id(channel_id=callback_data.channel_id)
+    channel = await channels.get_channel_by_id(channel_id=callback_data.channel_id)
 
-    total_profit = sales.get_total_sales_sum(channel=channel)
-    total_manager_profit = sales.get_total_manager_sum(channel=channel)
+    total_profit = await sales.get_total_sales_sum(channel=channel)
+    total_manager_profit = await sales.get_total_manager_sum(channel=channel)
     await callback.message.edit_text(
         f'<b>{channel.title}</b> \n\n'
         f'Общий доход с канала: {total_profit:.2f} ₽ \n'
@@ -29,8 +29,9 @@ class AdminKeyboards:
         builder.button(text='Месяц', callback_data=StatisticCallback(action='month'))
         builder.button(text='⌨ Другое количество', callback_data=StatisticCallback(action='other'))
         builder.button(text='⏬ Экспорт пользователей ⏬', callback_data=StatisticCallback(action='export'))
+        builder.button(text='⏱ Метрики Google API', callback_data=StatisticCallback(action='sheets_metrics'))
 
-        builder.adjust(2, 2, 1, 1)
+        builder.adjust(2, 2, 1, 1, 1)
         return builder.as_markup()
 
     @staticmethod
@@ -67,6 +67,8 @@ class UserKeyboards:
             channel_table_url = GoogleSheetsAPI.get_table_url(table_id=channel.table_id)
             builder.button(text='Таблица продаж', url=channel_table_url)
 
+        builder.button(text='📥 Продажи в Excel', callback_data=ChannelCallback(channel_id=channel.id, action='export_xlsx'))
+        builder.button(text='📥 Продажи в CSV', callback_data=ChannelCallback(channel_id=channel.id, action='export_csv'))
         builder.button(text='🔙 Назад', callback_data=NavigationCallback(branch='channels'))
 
         builder.adjust(1)
@@ -237,7 +239,7 @@ class UserKeyboards:
         sale = sales[0]
         builder.button(
             text='🔙 Назад', callback_data=CalendarNavigationCallback(
-                year=sale.timestamp.year, month=sale.timestamp.month, channel_id=sale.channel.id
+                year=sale.timestamp.year, month=sale.timestamp.month, channel_id=sale.channel_id
             )
         )
         builder.adjust(1)
@@ -253,7 +255,7 @@ class UserKeyboards:
         builder.button(text='Изменить покупателя', callback_data=EditSaleCallback(sale_id=sale.id, option='buyer'))
         if has_rights_on_delete:
             builder.button(text='❌ Удалить', callback_data=EditSaleCallback(sale_id=sale.id, option='delete'))
-        builder.button(text='🔙 Назад', callback_data=DateCallback(date=sale.timestamp.date(), channel_id=sale.channel.id))
+        builder.button(text='🔙 Назад', callback_data=DateCallback(date=sale.timestamp.date(), channel_id=sale.channel_id))
 
         builder.adjust(1)
         return builder.as_markup()
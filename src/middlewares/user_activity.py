@@ -1,13 +1,19 @@
+import asyncio
+from contextlib import suppress
 from datetime import datetime
 from typing import Callable, Dict, Any, Awaitable
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from src.database.users import update_last_activity
+from src.database.users import update_last_activities
+from src.utils import logger
 
 
 class UserActivityMiddleware(BaseMiddleware):
+    # Время активности, ещё не записанное в базу. Общее для всех экземпляров middleware
+    _pending_activities: dict[int, datetime] = {}
+    _flushing_task: asyncio.Task | None = None
 
     async def __call__(
         self,
@@ -15,12 +21,51 @@ class UserActivityMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        if hasattr(event, 'from_user'):
-            try:
-                user_id = event.from_user.id
-                current_time = datetime.now()
-                update_last_activity(user_id=user_id, new_activity_timestamp=current_time)
-            except Exception:
-                pass
+        # У части событий from_user есть, но он None, например у сообщений из каналов
+        user = getattr(event, 'from_user', None)
+        if user:
+            self._pending_activities[user.id] = datetime.now()
 
         await handler(event, data)
+
+    @classmethod
+    async def flush(cls) -> None:
+        """ Записывает накопленное время активности одним пакетом """
+        if not cls._pending_activities:
+            return
+
+        activities, cls._pending_activities = cls._pending_activities, {}
+        try:
+            await update_last_activities(activities=activities)
+        except asyncio.CancelledError:
+            # Остановка бота во время записи: пакет запишет последний flush
+            cls._requeue(activities)
+            raise
+        except Exception as e:
+            logger.error(f'Не удалось записать активность пользователей: {e}')
+            cls._requeue(activities)
+
+    @classmethod
+    def _requeue(cls, activities: dict[int, datetime]) -> None:
+        # Возвращаем в очередь, не затирая более свежие значения
+        cls._pending_activities = activities | cls._pending_activities
+
+    @classmethod
+    async def __flush_periodically(cls, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await cls.flush()
+
+    @classmethod
+    def start_flushing(cls, interval: int) -> None:
+        if not cls._flushing_task:
+            cls._flushing_task = asyncio.create_task(cls.__flush_periodically(interval))
+
+    @classmethod
+    async def stop_flushing(cls) -> None:
+        if cls._flushing_task:
+            cls._flushing_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cls._flushing_task
+            cls._flushing_task = None
+        await cls.flush()
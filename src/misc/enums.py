@@ -5,3 +5,11 @@ class SalePaymentStatusEnum(str, Enum):
     PAID = "Оплачено"
     BOOKED = "Забронировано"
     BY_SPM = "По СПМ"
+
+
+class SheetActionEnum(str, Enum):
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+    # Перестроить таблицу канала целиком по данным базы
+    RESYNC = "resync"
@@ -1,23 +1,44 @@
+from config import ACTIVITY_FLUSH_INTERVAL, GoogleSheetsConfig
 from src import bot, dp
 from src.handlers import register_all_handlers
 from src.database.models import register_models
+from src.database.migrations import run_migrations
+from src.middlewares.user_activity import UserActivityMiddleware
 from src.utils import logger, GoogleSheetsAPI
+from src.utils.executors import IOExecutor
+from src.utils.sheets_import_worker import SheetsImportWorker
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
+from src.utils.spare_tables_pool import SpareTablesPool
 
 
 async def on_startup():
     # Запуск базы данных
     register_models()
+    run_migrations()
 
     # Регистрация хэндлеров
     register_all_handlers(dp)
+    UserActivityMiddleware.start_flushing(interval=ACTIVITY_FLUSH_INTERVAL)
 
-    # Авторизация в Google Sheets
-    await GoogleSheetsAPI.make_auth()
+    # Авторизация в Google Sheets идёт в фоне, запросы к таблицам дождутся её завершения
+    GoogleSheetsAPI.start_auth()
+    SheetsOutboxWorker.start()
+    SpareTablesPool.start(size=GoogleSheetsConfig.SPARE_TABLES)
+    SheetsImportWorker.start(interval=GoogleSheetsConfig.IMPORT_INTERVAL)
 
     logger.info('Бот запущен!')
 
 
 async def on_shutdown():
+    await SheetsOutboxWorker.stop()
+    await SpareTablesPool.stop()
+    await SheetsImportWorker.stop()
+    await GoogleSheetsAPI.stop_auth()
+
+    # Записываем накопленную активность и дожидаемся завершения задач в пулах потоков (БД, Google API, выгрузка)
+    await UserActivityMiddleware.stop_flushing()
+    IOExecutor.shutdown_all()
+
     logger.info('Бот остановлен')
 
 
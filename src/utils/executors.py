@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from typing import Any, Callable, TypeVar
+
+
+R = TypeVar('R')
+
+
+class PoolSaturatedError(RuntimeError):
+    """ Пул занят, а очередь заполнена: задача отклонена без ожидания """
+
+
+class IOExecutor:
+    """ Именованный пул потоков одного вида ввода-вывода (Google API, база данных, выгрузка файлов).
+    Пул ограничен по числу потоков и очереди: сверх max_workers + max_pending задач новые ждут места
+    в event loop, а у пула с reject_when_full сразу получают PoolSaturatedError """
+    _pools: list['IOExecutor'] = []
+
+    def __init__(
+            self, name: str, max_workers: int, max_pending: int,
+            reject_when_full: bool = False, initializer: Callable[[], Any] | None = None
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.reject_when_full = reject_when_full
+        self._initializer = initializer
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._lock = threading.Lock()
+        IOExecutor._pools.append(self)
+
+        self._created_at = time.monotonic()
+        # Отправлены в пул, выполняются, ждут места в очереди
+        self._submitted = 0
+        self._active = 0
+        self._waiting = 0
+        self._max_active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name, initializer=self._initializer
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if not self._slots:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_pending)
+        return self._slots
+
+    def _run_tracked(self, func: Callable[[], R]) -> R:
+        started_at = time.monotonic()
+        with self._lock:
+            self._active += 1
+            self._max_active = max(self._max_active, self._active)
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._busy_seconds += time.monotonic() - started_at
+
+    def _release_slot(self, loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore, _: Future) -> None:
+        # Вызывается в потоке пула, а для отменённой до начала задачи — в потоке отмены
+        with self._lock:
+            self._submitted -= 1
+        # После остановки бота event loop уже закрыт, и место освобождать незачем
+        with suppress(RuntimeError):
+            loop.call_soon_threadsafe(slots.release)
+
+    async def run(self, func: Callable[..., R], *args, **kwargs) -> R:
+        """ Выполняет func в потоке пула. Место в очереди освобождается, когда задача завершится в потоке,
+        а не когда отменят ожидающую её корутину """
+        slots = self._get_slots()
+        if slots.locked() and self.reject_when_full:
+            self._rejected += 1
+            raise PoolSaturatedError(f'Пул потоков {self.name} занят')
+
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(self._run_tracked, functools.partial(func, *args, **kwargs))
+        except BaseException:
+            slots.release()
+            raise
+        with self._lock:
+            self._submitted += 1
+        future.add_done_callback(functools.partial(self._release_slot, loop, slots))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def get_stats(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self._created_at, 1e-9)
+        with self._lock:
+            return {
+                'name': self.name,
+                'threads': self.max_workers,
+                'active': self._active,
+                'max_active': self._max_active,
+                'queued': self._submitted - self._active,
+                'waiting': self._waiting,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                # Доля времени, которую потоки пула были заняты, с запуска
+                'utilization': self._busy_seconds / (elapsed * self.max_workers),
+            }
+
+    def shutdown(self) -> None:
+        """ Дожидается задач, уже отправленных в пул. Следующий run создаст пул заново """
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        # Семафор привязан к event loop, в котором его ждали
+        self._slots = None
+
+    @classmethod
+    def get_all_stats(cls) -> list[dict[str, Any]]:
+        return [pool.get_stats() for pool in cls._pools]
+
+    @classmethod
+    def shutdown_all(cls) -> None:
+        for pool in cls._pools:
+            pool.shutdown()
@@ -0,0 +1,380 @@
+""" Клиент gspread в памяти: для замеров и проверки GoogleSheetsAPI без сети и учётных данных """
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from http import HTTPStatus
+
+from gspread.exceptions import APIError
+from gspread.urls import SPREADSHEETS_API_V4_BASE_URL, DRIVE_FILES_API_V3_URL
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+
+
+def _format_drive_time(value: datetime) -> str:
+    """ Время в формате Drive API: UTC с миллисекундами """
+    return f'{value.isoformat(timespec="milliseconds")}Z'
+
+
+@dataclass
+class FakeCall:
+    method: str
+    args: tuple
+    latency: float
+
+
+class _FakeResponse:
+    """ Ответ API: данные запроса или ошибка в том виде, в котором её разбирает APIError """
+    def __init__(self, status_code: int, message: str = '', data: dict = None):
+        self.status_code = status_code
+        self.text = message
+        self.headers = {}
+        self._data = data
+
+    def json(self) -> dict:
+        if self._data is not None:
+            return self._data
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': HTTPStatus(self.status_code).phrase}}
+
+
+class FakeCallsRecorder:
+    """ Записывает каждый вызов API и имитирует его задержку """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: list[FakeCall] = []
+        self._lock = threading.Lock()
+
+    def record(self, method: str, *args) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append(FakeCall(method=method, args=args, latency=self.latency))
+
+    def get_counts(self) -> Counter:
+        with self._lock:
+            return Counter(call.method for call in self.calls)
+
+    def get_total_latency(self) -> float:
+        with self._lock:
+            return sum(call.latency for call in self.calls)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: 'FakeSpreadsheet', sheet_id: int, title: str, rows: int = 1000, cols: int = 26):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.frozen_row_count = 0
+        self.formats: list[tuple[str, dict]] = []
+        # Значения ячеек по строкам, строки за концом списка пусты
+        self.rows: list[list[str]] = []
+
+    def _record(self, method: str, *args) -> None:
+        self.spreadsheet.recorder.record(f'worksheet.{method}', *args)
+
+    def _check_grid(self, last_row: int) -> None:
+        if last_row > self.row_count:
+            raise APIError(_FakeResponse(
+                HTTPStatus.BAD_REQUEST, f'Range exceeds grid limits. Max rows: {self.row_count}'
+            ))
+
+    def _ensure_rows(self, rows_count: int) -> None:
+        self.rows.extend([] for _ in range(rows_count - len(self.rows)))
+        self.spreadsheet.touch()
+
+    def get_all_values(self) -> list[list[str]]:
+        """ Содержимое листа без записи вызова: для проверок """
+        rows = [list(row) for row in self.rows]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def set_values(self, first_row: int, values: list[list[str]]) -> None:
+        self._check_grid(first_row + len(values) - 1)
+        self._ensure_rows(first_row - 1 + len(values))
+        for index, row_values in enumerate(values):
+            self.rows[first_row - 1 + index] = [str(value) for value in row_values]
+
+    def insert_rows_at(self, index: int, values: list[list[str]]) -> None:
+        self._ensure_rows(index)
+        self.rows[index:index] = [[str(value) for value in row_values] for row_values in values]
+        self.row_count += len(values)
+
+    def remove_rows(self, start_index: int, end_index: int) -> None:
+        self._check_grid(end_index)
+        self.spreadsheet.touch()
+        del self.rows[start_index - 1:end_index]
+        self.row_count -= end_index - start_index + 1
+
+    def add_rows(self, rows: int) -> None:
+        self._record('add_rows', rows)
+        self.row_count += rows
+
+    def format(self, ranges, format: dict) -> dict:
+        self._record('format', ranges)
+        for range_name in [ranges] if isinstance(ranges, str) else ranges:
+            self.formats.append((range_name, format))
+        return {}
+
+    def freeze(self, rows: int = None, cols: int = None) -> dict:
+        self._record('freeze', rows, cols)
+        if rows is not None:
+            self.frozen_row_count = rows
+        return {}
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: 'FakeGspreadClient', title: str):
+        self.client = client
+        self.recorder = client.recorder
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.url = f'https://docs.google.com/spreadsheets/d/{self.id}'
+        self.permissions: list[tuple[str, str, str]] = []
+        self.worksheets = [FakeWorksheet(self, sheet_id=0, title='Лист1')]
+        self.touch()
+
+    def touch(self) -> None:
+        """ Обновляет время изменения, которое возвращает Drive API (с точностью до миллисекунд) """
+        now = datetime.utcnow()
+        self.modified_time = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    def _get_worksheet_by_range(self, range_name: str) -> tuple[FakeWorksheet, dict]:
+        title, _, cells = range_name.rpartition('!')
+        title = title.strip("'")
+        for worksheet in self.worksheets:
+            if not title or worksheet.title == title:
+                return worksheet, a1_range_to_grid_range(cells)
+        raise APIError(_FakeResponse(HTTPStatus.BAD_REQUEST, f'Unable to parse range: {range_name}'))
+
+    def _get_worksheet_by_id(self, sheet_id: int) -> FakeWorksheet:
+        for worksheet in self.worksheets:
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise APIError(_FakeResponse(HTTPStatus.BAD_REQUEST, f'No grid with id: {sheet_id}'))
+
+    def share(self, email_address, perm_type, role, notify=True, email_message=None, with_link=False) -> None:
+        self.recorder.record('spreadsheet.share', email_address, perm_type, role)
+        self.permissions.append((email_address, perm_type, role))
+
+    def fetch_sheet_metadata(self, params: dict = None) -> dict:
+        self.recorder.record('spreadsheet.fetch_sheet_metadata')
+        return self.get_metadata()
+
+    def get_worksheet_by_title(self, title: str) -> FakeWorksheet:
+        """ Лист по названию без записи вызова: для проверок """
+        return next(worksheet for worksheet in self.worksheets if worksheet.title == title)
+
+    def get_metadata(self) -> dict:
+        return {'sheets': [
+            {'properties': {
+                'sheetId': worksheet.id, 'title': worksheet.title,
+                'gridProperties': {'rowCount': worksheet.row_count, 'columnCount': worksheet.col_count}
+            }}
+            for worksheet in self.worksheets
+        ]}
+
+    def values_get(self, range_name: str, params: dict = None) -> dict:
+        self.recorder.record('spreadsheet.values_get', range_name)
+        return self.get_values(range_name)
+
+    def get_values(self, range_name: str) -> dict:
+        worksheet, grid = self._get_worksheet_by_range(range_name)
+        end_row = grid.get('endRowIndex', worksheet.row_count)
+        worksheet._check_grid(end_row)
+
+        start_column, end_column = grid.get('startColumnIndex', 0), grid.get('endColumnIndex')
+        values = [
+            row[start_column:end_column]
+            for row in worksheet.rows[grid.get('startRowIndex', 0):end_row]
+        ]
+        # Как и API, не возвращаем пустые строки и ячейки в конце
+        for row in values:
+            while row and row[-1] == '':
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return {'range': range_name, 'values': values} if values else {'range': range_name}
+
+    def values_batch_update(self, body: dict) -> dict:
+        self.recorder.record('spreadsheet.values_batch_update', len(body['data']))
+        return self.update_values(body)
+
+    def update_values(self, body: dict) -> dict:
+        for data in body['data']:
+            worksheet, grid = self._get_worksheet_by_range(data['range'])
+            worksheet.set_values(grid.get('startRowIndex', 0) + 1, data['values'])
+        return {}
+
+    def values_clear(self, range_name: str) -> dict:
+        self.recorder.record('spreadsheet.values_clear', range_name)
+        return self.clear_values(range_name)
+
+    def clear_values(self, range_name: str) -> dict:
+        worksheet, grid = self._get_worksheet_by_range(range_name)
+        end_row = grid.get('endRowIndex', worksheet.row_count)
+        worksheet._check_grid(end_row)
+        for row in worksheet.rows[grid.get('startRowIndex', 0):end_row]:
+            row.clear()
+        self.touch()
+        return {}
+
+    def batch_update(self, body: dict) -> dict:
+        self.recorder.record('spreadsheet.batch_update', [next(iter(request)) for request in body['requests']])
+        return self.apply_requests(body['requests'])
+
+    def apply_requests(self, requests: list[dict]) -> dict:
+        """ Поддерживаются запросы со строками, свойствами и форматом, остальные только записываются """
+        for request in requests:
+            kind, params = next(iter(request.items()))
+            match kind:
+                case 'insertDimension':
+                    rows_range = params['range']
+                    worksheet = self._get_worksheet_by_id(rows_range['sheetId'])
+                    count = rows_range['endIndex'] - rows_range['startIndex']
+                    worksheet.insert_rows_at(rows_range['startIndex'], [[] for _ in range(count)])
+                case 'deleteDimension':
+                    rows_range = params['range']
+                    worksheet = self._get_worksheet_by_id(rows_range['sheetId'])
+                    worksheet.remove_rows(rows_range['startIndex'] + 1, rows_range['endIndex'])
+                case 'appendDimension':
+                    self._get_worksheet_by_id(params['sheetId']).row_count += params['length']
+                case 'updateCells':
+                    worksheet = self._get_worksheet_by_id(params['start']['sheetId'])
+                    values = [
+                        [cell.get('userEnteredValue', {}).get('stringValue', '') for cell in row['values']]
+                        for row in params['rows']
+                    ]
+                    worksheet.set_values(params['start']['rowIndex'] + 1, values)
+                case 'repeatCell':
+                    grid = params['range']
+                    worksheet = self._get_worksheet_by_id(grid['sheetId'])
+                    range_name = (
+                        f"{rowcol_to_a1(grid['startRowIndex'] + 1, grid['startColumnIndex'] + 1)}:"
+                        f"{rowcol_to_a1(grid['endRowIndex'], grid['endColumnIndex'])}"
+                    )
+                    worksheet.formats.append((range_name, params['cell']['userEnteredFormat']))
+                case 'updateSpreadsheetProperties':
+                    self.title = params['properties'].get('title', self.title)
+                case 'updateSheetProperties':
+                    worksheet = self._get_worksheet_by_id(params['properties']['sheetId'])
+                    worksheet.title = params['properties'].get('title', worksheet.title)
+                    grid_properties = params['properties'].get('gridProperties', {})
+                    worksheet.frozen_row_count = grid_properties.get('frozenRowCount', worksheet.frozen_row_count)
+                case 'addSheet':
+                    self.add_worksheet(params['properties'])
+                case 'deleteSheet':
+                    if len(self.worksheets) == 1:
+                        raise APIError(_FakeResponse(
+                            HTTPStatus.BAD_REQUEST, "You can't remove all the sheets in a document"
+                        ))
+                    self.worksheets.remove(self._get_worksheet_by_id(params['sheetId']))
+        self.touch()
+        return {'replies': [{} for _ in requests]}
+
+    def add_worksheet(self, properties: dict) -> FakeWorksheet:
+        title = properties.get('title', f'Лист{len(self.worksheets) + 1}')
+        sheet_id = properties.get('sheetId')
+        if sheet_id is None:
+            sheet_id = max((worksheet.id for worksheet in self.worksheets), default=-1) + 1
+        if any(worksheet.title == title or worksheet.id == sheet_id for worksheet in self.worksheets):
+            raise APIError(_FakeResponse(HTTPStatus.BAD_REQUEST, f'A sheet with the name "{title}" already exists'))
+
+        grid_properties = properties.get('gridProperties', {})
+        worksheet = FakeWorksheet(
+            self, sheet_id=sheet_id, title=title,
+            rows=grid_properties.get('rowCount', 1000), cols=grid_properties.get('columnCount', 26)
+        )
+        worksheet.frozen_row_count = grid_properties.get('frozenRowCount', 0)
+        self.worksheets.append(worksheet)
+        return worksheet
+
+
+class FakeHTTPClient:
+    """ Низкоуровневые запросы клиента: создание таблицы через Sheets API, batchUpdate и доступ через Drive API """
+    def __init__(self, client: 'FakeGspreadClient'):
+        self.client = client
+        self.recorder = client.recorder
+
+    def request(self, method: str, endpoint: str, params: dict = None, data=None, json: dict = None, **kwargs):
+        self.recorder.record('http_client.request', method, endpoint)
+        if method == 'post' and endpoint == SPREADSHEETS_API_V4_BASE_URL:
+            spreadsheet = self.client.add_spreadsheet(title=json['properties']['title'])
+            if json.get('sheets'):
+                spreadsheet.worksheets.clear()
+                for sheet_body in json['sheets']:
+                    spreadsheet.add_worksheet(sheet_body['properties'])
+            return _FakeResponse(HTTPStatus.OK, data={'spreadsheetId': spreadsheet.id, 'spreadsheetUrl': spreadsheet.url})
+        if method == 'get' and endpoint == DRIVE_FILES_API_V3_URL:
+            # Из запроса поиска поддерживается только условие modifiedTime > '...'
+            since = re.search(r"modifiedTime > '([^']+)'", params['q'])
+            since = datetime.fromisoformat(since.group(1)) if since else datetime.min
+            files = [
+                {'id': spreadsheet.id, 'modifiedTime': _format_drive_time(spreadsheet.modified_time)}
+                for spreadsheet in self.client.spreadsheets.values() if spreadsheet.modified_time > since
+            ]
+            return _FakeResponse(HTTPStatus.OK, data={'files': files})
+        raise APIError(_FakeResponse(HTTPStatus.NOT_FOUND, f'{method.upper()} {endpoint} не поддерживается'))
+
+    def batch_update(self, id: str, body: dict) -> dict:
+        self.recorder.record('http_client.batch_update', [next(iter(request)) for request in body['requests']])
+        return self.client.get_spreadsheet(id).apply_requests(body['requests'])
+
+    def fetch_sheet_metadata(self, id: str, params: dict = None) -> dict:
+        self.recorder.record('http_client.fetch_sheet_metadata', id)
+        return self.client.get_spreadsheet(id).get_metadata()
+
+    def values_get(self, id: str, range: str, params: dict = None) -> dict:
+        self.recorder.record('http_client.values_get', id, range)
+        return self.client.get_spreadsheet(id).get_values(range)
+
+    def values_batch_get(self, id: str, ranges: list[str], params: dict = None) -> dict:
+        self.recorder.record('http_client.values_batch_get', id, len(ranges))
+        spreadsheet = self.client.get_spreadsheet(id)
+        return {'spreadsheetId': id, 'valueRanges': [spreadsheet.get_values(range_name) for range_name in ranges]}
+
+    def values_batch_update(self, id: str, body: dict = None) -> dict:
+        self.recorder.record('http_client.values_batch_update', id, len(body['data']))
+        return self.client.get_spreadsheet(id).update_values(body)
+
+    def values_batch_clear(self, id: str, params: dict = None, body: dict = None) -> dict:
+        self.recorder.record('http_client.values_batch_clear', id, len(body['ranges']))
+        spreadsheet = self.client.get_spreadsheet(id)
+        for range_name in body['ranges']:
+            spreadsheet.clear_values(range_name)
+        return {}
+
+    def insert_permission(self, file_id: str, email_address, perm_type, role, notify=True, email_message=None,
+                          with_link=False) -> None:
+        self.recorder.record('http_client.insert_permission', file_id, perm_type, role)
+        self.client.get_spreadsheet(file_id).permissions.append((email_address, perm_type, role))
+
+
+class FakeGspreadClient:
+    """ Подменяет клиент gspread.authorize: GoogleSheetsAPI.use_client(FakeGspreadClient(latency=0.2)) """
+    def __init__(self, latency: float = 0.0):
+        self.recorder = FakeCallsRecorder(latency=latency)
+        self.http_client = FakeHTTPClient(self)
+        self.spreadsheets: dict[str, FakeSpreadsheet] = {}
+
+    def add_spreadsheet(self, title: str) -> FakeSpreadsheet:
+        spreadsheet = FakeSpreadsheet(self, title=title)
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def get_spreadsheet(self, key: str) -> FakeSpreadsheet:
+        if key not in self.spreadsheets:
+            raise APIError(_FakeResponse(HTTPStatus.NOT_FOUND, f'Requested entity was not found: {key}'))
+        return self.spreadsheets[key]
+
+    def create(self, title: str, folder_id: str = None) -> FakeSpreadsheet:
+        self.recorder.record('client.create', title)
+        return self.add_spreadsheet(title=title)
@@ -1,23 +1,166 @@
 import asyncio
+import json
 import os
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import random
+from collections import defaultdict
+from datetime import datetime
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from http import HTTPStatus
 
 import gspread
-from gspread import SpreadsheetNotFound, Spreadsheet
-from gspread.worksheet import Worksheet
+from gspread import SpreadsheetNotFound
+from gspread.exceptions import APIError
+from gspread.utils import ValueInputOption, rowcol_to_a1, absolute_range_name
+from gspread.urls import SPREADSHEETS_API_V4_BASE_URL, DRIVE_FILES_API_V3_URL
+from google.auth.transport.requests import Request
 from oauth2client.service_account import ServiceAccountCredentials
 
+from config import GoogleSheetsConfig
+from .executors import IOExecutor
+from .logger import logger
+from .sheets_rate_limiter import SheetsRequestScheduler
+from .sheets_tracing import RequestTrace, traced
+from .ttl_cache import TTLCache
+
+
+@dataclass
+class SheetRowsOperation:
+    """ Операция со строками листа sheet. row — индекс первой строки с нуля (0 — шапка) """
+    action: str  # insert, update или delete
+    sheet: str
+    row: int
+    # Значения ячеек по строкам, для delete — пустые списки по числу удаляемых строк
+    values: list[list[str]]
+
+    @property
+    def rows_count(self) -> int:
+        return len(self.values)
+
 
 class GoogleSheetsAPI:
-    _executor = None
-    _loop = None
+    # Отдельный пул, чтобы медленные ответы API не занимали потоки остальных задач
+    _executor = IOExecutor(
+        name='sheets', max_workers=GoogleSheetsConfig.THREADS, max_pending=GoogleSheetsConfig.MAX_PENDING
+    )
     _client = None
 
+    # Авторизация идёт в фоне: запросы до её завершения ждут готовности клиента
+    _ready: asyncio.Future | None = None
+    _auth_task: asyncio.Task | None = None
+    # Токен доступа живёт около часа и обновляется заранее, чтобы запрос после истечения не ждал обновления
+    token_refresh_margin = 5 * 60
+
+    # Сколько запросов к API сэкономил кэш id листов, по операциям
+    _saved_api_calls: dict[str, int] = defaultdict(int)
+    # Id листов по названию, ключ — id таблицы. Запросы к листам по названию обходятся без чтения метаданных
+    _sheet_ids = TTLCache(name='spreadsheets', max_size=256, ttl=30 * 60)
+    # Лист, с которым создаётся таблица. Удаляется, когда в таблице появляются листы с данными
+    first_sheet_title = 'Лист1'
+    first_sheet_id = 0
+
+    # Все запросы к API проходят через очередь с учётом квот
+    _scheduler = SheetsRequestScheduler(
+        project_rate_per_minute=GoogleSheetsConfig.REQUESTS_PER_MINUTE,
+        spreadsheet_rate_per_minute=GoogleSheetsConfig.SPREADSHEET_REQUESTS_PER_MINUTE,
+        burst=GoogleSheetsConfig.BURST
+    )
+    max_retry_delay = 64
+
+    # Ограничения запросов к значениям листа: строк в одном чтении и примерный размер тела одной записи
+    read_chunk_rows = 10_000
+    max_write_request_bytes = 2_000_000
+
     @staticmethod
     def get_table_url(table_id: str) -> str:
         return f'https://docs.google.com/spreadsheets/d/{table_id}'
 
     @classmethod
+    def start_auth(cls, credentials_filename: str = 'google_sheets_credentials.json') -> None:
+        """ Запускает авторизацию и последующее обновление токена в фоне, не задерживая запуск бота """
+        if not cls._auth_task:
+            cls._get_ready_future()
+            cls._auth_task = asyncio.create_task(cls._run_auth(credentials_filename))
+
+    @classmethod
+    async def stop_auth(cls) -> None:
+        if cls._auth_task:
+            cls._auth_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cls._auth_task
+            cls._auth_task = None
+
+    @classmethod
+    def _get_ready_future(cls) -> asyncio.Future:
+        if not cls._ready:
+            cls._ready = asyncio.get_running_loop().create_future()
+        return cls._ready
+
+    @classmethod
+    async def _run_auth(cls, credentials_filename: str) -> None:
+        attempt = 0
+        while not cls._client:
+            try:
+                await cls.make_auth(credentials_filename)
+            except ValueError as e:
+                # Без файла учётных данных повторять бессмысленно: запросы к API завершатся этой ошибкой
+                logger.error(e)
+                cls._get_ready_future().set_exception(e)
+                return
+            except Exception as e:
+                delay = min(cls.max_retry_delay, 2 ** attempt)
+                logger.warning(f'Не удалось авторизоваться в Google Sheets, повтор через {delay} с: {e!r}')
+                await asyncio.sleep(delay)
+                attempt += 1
+        logger.info('Авторизация в Google Sheets выполнена')
+
+        while True:
+            await asyncio.sleep(cls._get_token_refresh_delay())
+            try:
+                await cls._refresh_token()
+            except Exception as e:
+                # До истечения токена остаётся запас, а при неудаче его обновит сам запрос
+                logger.warning(f'Не удалось обновить токен Google Sheets: {e!r}')
+                await asyncio.sleep(cls.max_retry_delay)
+
+    @classmethod
+    def _get_credentials(cls):
+        # У клиентов без авторизации, например FakeGspreadClient, учётных данных нет
+        return getattr(cls._client.http_client, 'auth', None) if cls._client else None
+
+    @classmethod
+    def _get_token_refresh_delay(cls) -> float:
+        credentials = cls._get_credentials()
+        if not credentials or not credentials.expiry:
+            return cls.token_refresh_margin
+        seconds_left = (credentials.expiry - datetime.utcnow()).total_seconds()
+        return max(0.0, seconds_left - cls.token_refresh_margin)
+
+    @classmethod
+    @traced
+    async def _refresh_token(cls, credentials=None) -> None:
+        """ Получает новый токен доступа. Обращается к серверу авторизации, а не к Sheets API, поэтому без квоты """
+        credentials = credentials or cls._get_credentials()
+        if credentials:
+            await cls._executor.run(credentials.refresh, Request())
+
+    @classmethod
+    async def _get_client(cls) -> gspread.Client:
+        """ Клиент API. До завершения авторизации ждёт её """
+        if not cls._client:
+            if not cls._ready:
+                raise RuntimeError('Авторизация в Google Sheets не запущена')
+            # Отмена одного ожидающего запроса не должна отменять общее ожидание
+            await asyncio.shield(cls._ready)
+        return cls._client
+
+    @classmethod
+    async def _get_http_client(cls) -> gspread.HTTPClient:
+        return (await cls._get_client()).http_client
+
+    @classmethod
+    @traced
     async def make_auth(cls, credentials_filename: str = 'google_sheets_credentials.json') -> None:
         if cls._client:
             return
@@ -25,84 +168,394 @@ class GoogleSheetsAPI:
         if not os.path.exists(credentials_filename):
             raise ValueError(f'Файл {os.path.join(os.getcwd(), credentials_filename)} не найден!')
 
-        cls._loop = asyncio.get_event_loop()
-        cls._executor = ThreadPoolExecutor()
-
         # Подключаемся к Google Sheets API с использованием учетных данных
         scopes = [
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/drive'
         ]
         credentials = ServiceAccountCredentials.from_json_keyfile_name(filename=credentials_filename, scopes=scopes)
-        client = await cls._loop.run_in_executor(cls._executor, gspread.authorize, credentials)
+        client = await cls._executor.run(gspread.authorize, credentials)
+        # Первый токен получаем сразу, а не в первом запросе к API
+        await cls._refresh_token(credentials=client.http_client.auth)
+        cls.use_client(client)
+
+    @classmethod
+    def use_client(cls, client) -> None:
+        """ Подключает готовый клиент, например FakeGspreadClient для замеров без сети """
         cls._client = client
+        # Id листов другого клиента могут не совпадать
+        cls._sheet_ids.clear()
+
+        ready = cls._get_ready_future()
+        if not ready.done():
+            ready.set_result(None)
 
     @classmethod
-    async def create_table(cls, table_name: str, title_data: list[str] = None) -> str:
-        # Создаем новую таблицу
-        spreadsheet: Spreadsheet = await cls._loop.run_in_executor(cls._executor, cls._client.create, table_name)
+    def get_saved_api_calls(cls) -> dict[str, int]:
+        return dict(cls._saved_api_calls)
+
+    @classmethod
+    def get_sheet_ids_cache_stats(cls) -> dict[str, int]:
+        return cls._sheet_ids.get_stats()
+
+    @classmethod
+    @contextmanager
+    def _forget_sheet_on_not_found(cls, table_id: str):
+        try:
+            yield
+        except SpreadsheetNotFound:
+            cls._sheet_ids.invalidate(table_id)
+            raise
+        except APIError as e:
+            # Таблицу или её лист удалили вручную: список листов перечитывается при следующем запросе
+            if e.response.status_code in (HTTPStatus.NOT_FOUND, HTTPStatus.BAD_REQUEST):
+                cls._sheet_ids.invalidate(table_id)
+            raise
+
+    @classmethod
+    def get_scheduler_stats(cls) -> dict[str, any]:
+        return cls._scheduler.get_stats()
+
+    @classmethod
+    def _get_retry_delay(cls, error: APIError, attempt: int) -> float:
+        retry_after = getattr(error.response, 'headers', {}).get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return min(cls.max_retry_delay, 2 ** attempt) + random.random()
+
+    @classmethod
+    async def _request(cls, table_id: str | None, func, *args):
+        """ Выполняет запрос к API, когда его разрешит планировщик квот. После ответа 429 повторяет с паузой.
+        Ожидание квоты, ожидание потока пула и выполнение записываются в статистику текущей операции """
+        for attempt in range(GoogleSheetsConfig.MAX_RETRIES + 1):
+            trace = RequestTrace()
+            await cls._scheduler.acquire(table_id)
+            trace.grant()
+            try:
+                with cls._forget_sheet_on_not_found(table_id), trace:
+                    return await cls._executor.run(trace.run, func, *args)
+            except APIError as e:
+                if e.response.status_code != HTTPStatus.TOO_MANY_REQUESTS or attempt == GoogleSheetsConfig.MAX_RETRIES:
+                    raise
+                delay = cls._get_retry_delay(e, attempt)
+                logger.warning(f'Квота Google Sheets API исчерпана, повтор через {delay:.1f} с')
+                cls._scheduler.throttle(delay)
+
+    @staticmethod
+    def _get_sheet_style_requests(sheet_id: int, title_data: list[str]) -> list[dict]:
+        """ Шапка и оформление листа запросами batchUpdate """
+        return [
+            {'updateSheetProperties': {
+                'properties': {'sheetId': sheet_id, 'gridProperties': {'frozenRowCount': 1}},
+                'fields': 'gridProperties.frozenRowCount'
+            }},
+            {'updateCells': {
+                'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+                'rows': [{'values': [{'userEnteredValue': {'stringValue': str(value)}} for value in title_data]}],
+                'fields': 'userEnteredValue'
+            }},
+            # Стили шапки
+            {'repeatCell': {
+                'range': {
+                    'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1, 'startColumnIndex': 0, 'endColumnIndex': 18
+                },
+                'cell': {'userEnteredFormat': {
+                    'backgroundColor': {'red': 0.6, 'green': 0.75, 'blue': 0.95},
+                    'borders': {'bottom': {'style': 'SOLID'}}
+                }},
+                'fields': 'userEnteredFormat(backgroundColor,borders)'
+            }},
+            # Текст (шрифт)
+            {'repeatCell': {
+                'range': {
+                    'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1000, 'startColumnIndex': 0, 'endColumnIndex': 11
+                },
+                'cell': {'userEnteredFormat': {'textFormat': {'fontFamily': 'Comfortaa'}}},
+                'fields': 'userEnteredFormat.textFormat.fontFamily'
+            }},
+        ]
 
-        if title_data:
-            await cls._loop.run_in_executor(cls._executor, spreadsheet.sheet1.insert_row, title_data, 1)
+    @classmethod
+    @traced
+    async def create_table(cls, table_name: str) -> str:
+        """ Создаёт таблицу и открывает доступ по ссылке. Листы с шапкой добавляются при первой записи в них.
+        Доступ выдаётся через Drive API, поэтому это отдельный запрос """
+        http_client = await cls._get_http_client()
 
-            await cls.set_sheet_styles(spreadsheet.sheet1)
+        # Создаем новую таблицу
+        body = {
+            'properties': {'title': table_name},
+            'sheets': [{'properties': {'sheetId': cls.first_sheet_id, 'title': cls.first_sheet_title}}]
+        }
+        create = functools.partial(http_client.request, 'post', SPREADSHEETS_API_V4_BASE_URL, json=body)
+        table_id = (await cls._request(None, create)).json()['spreadsheetId']
+        cls._sheet_ids.set(table_id, {cls.first_sheet_title: cls.first_sheet_id})
 
         # Делаем таблицу доступной для всех пользователей
-        await cls._loop.run_in_executor(cls._executor, spreadsheet.share, '', 'anyone', 'reader')
+        share = functools.partial(http_client.insert_permission, table_id, None, perm_type='anyone', role='reader')
+        await cls._request(table_id, share)
 
-        return spreadsheet.id
+        return table_id
 
     @classmethod
-    async def set_sheet_styles(cls, sheet: Worksheet):
-        await cls._loop.run_in_executor(cls._executor, sheet.freeze, 1)
-        # Стили шапки
-        await cls._loop.run_in_executor(cls._executor, sheet.format, 'A1:R1', {
-            "backgroundColor": {'red': 0.6, 'green': 0.75, 'blue': 0.95},
-            'borders': {'bottom': {'style': 'SOLID'}}
-        })
-        # Текст (шрифт)
-        await cls._loop.run_in_executor(cls._executor, sheet.format, 'A1:K1000', {
-            'textFormat': {"fontFamily": "Comfortaa"}
-        })
-        # Установка ширины столбцов
-        # await cls._loop.run_in_executor(cls._executor, sheet.dimension, 'A:J', 'auto')
+    @traced
+    async def rename_table(cls, table_id: str, table_name: str) -> None:
+        body = {'requests': [
+            {'updateSpreadsheetProperties': {'properties': {'title': table_name}, 'fields': 'title'}}
+        ]}
+        http_client = await cls._get_http_client()
+        await cls._request(table_id, http_client.batch_update, table_id, body)
 
     @classmethod
-    async def insert_row_data(cls, table_id: str, data: list[any], position: int = None):
-        spreadsheet = await cls._loop.run_in_executor(cls._executor, cls._client.open_by_key, table_id)
+    @traced
+    async def get_modified_tables(cls, since: datetime) -> dict[str, datetime]:
+        """ Таблицы, изменённые после since (UTC), и время их последнего изменения.
+        Один запрос к Drive API на каждую 1000 таблиц, содержимое таблиц не читается """
+        http_client = await cls._get_http_client()
+        params = {
+            'q': (
+                "mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false "
+                f"and modifiedTime > '{since.isoformat(timespec='milliseconds')}'"
+            ),
+            'fields': 'nextPageToken,files(id,modifiedTime)',
+            'pageSize': 1000,
+        }
 
-        # Получаем доступ к листу таблицы
-        sheet: Worksheet = spreadsheet.sheet1
+        modified_times = {}
+        while True:
+            list_files = functools.partial(http_client.request, 'get', DRIVE_FILES_API_V3_URL, params=params)
+            response = (await cls._request(None, list_files)).json()
+            for file in response.get('files', []):
+                # Время в формате RFC 3339 в UTC, например 2024-01-31T12:00:00.000Z
+                modified_time = datetime.fromisoformat(file['modifiedTime'])
+                modified_times[file['id']] = modified_time.replace(tzinfo=None)
 
-        # Определяем номер последней строки
-        if not position:
-            row_count = len(await cls._loop.run_in_executor(cls._executor, sheet.get_all_values))
-        else:
-            row_count = position
+            if 'nextPageToken' not in response:
+                return modified_times
+            params['pageToken'] = response['nextPageToken']
 
-        # Добавляем данные
-        data = [str(i) for i in data]
-        await cls._loop.run_in_executor(cls._executor, sheet.insert_row, data, row_count + 1)
+    @classmethod
+    async def _fetch_sheets_properties(cls, table_id: str) -> dict[str, dict]:
+        """ Свойства листов таблицы по названию: sheetId и размер сетки. Заодно обновляет известные id листов """
+        params = {'fields': 'sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))'}
+        http_client = await cls._get_http_client()
+        metadata = await cls._request(table_id, http_client.fetch_sheet_metadata, table_id, params)
 
-        return spreadsheet.url
+        sheets_properties = {sheet['properties']['title']: sheet['properties'] for sheet in metadata['sheets']}
+        sheet_ids = {title: properties['sheetId'] for title, properties in sheets_properties.items()}
+        cls._sheet_ids.set(table_id, sheet_ids)
+        return sheets_properties
 
     @classmethod
-    async def edit_cell(cls, table_id: str, data: any, xy: tuple[int, int]):
-        spreadsheet = await cls._loop.run_in_executor(cls._executor, cls._client.open_by_key, table_id)
-        sheet: Worksheet = spreadsheet.sheet1
-        await cls._loop.run_in_executor(cls._executor, cls._client.open_by_key, table_id)
-        await cls._loop.run_in_executor(cls._executor, sheet.update_cell, *xy, data)
+    async def _get_sheet_ids(cls, table_id: str, operation: str) -> dict[str, int]:
+        sheet_ids = cls._sheet_ids.get(table_id)
+        if sheet_ids is not None:
+            cls._saved_api_calls[operation] += 1
+            return sheet_ids
+        sheets_properties = await cls._fetch_sheets_properties(table_id)
+        return {title: properties['sheetId'] for title, properties in sheets_properties.items()}
 
     @classmethod
-    async def is_table_exists(cls, table_id: str) -> bool:
-        try:
-            await cls._loop.run_in_executor(cls._executor, cls._client.open_by_key, table_id)
-        except SpreadsheetNotFound:
-            return False
-        return True
+    def _get_add_sheets_requests(
+            cls, sheet_ids: dict[str, int], titles: list[str], title_data: list[str]
+    ) -> tuple[dict[str, int], list[dict]]:
+        """ Запросы batchUpdate, добавляющие недостающие листы с шапкой, и id листов после них.
+        Первый лист таблицы удаляется вместе с добавлением листов: данные в нём не хранятся """
+        sheet_ids = dict(sheet_ids)
+        requests = []
+        for title in titles:
+            if title in sheet_ids:
+                continue
+            # id листа задаётся заранее, чтобы в том же batchUpdate можно было записать строки
+            sheet_id = max(sheet_ids.values(), default=cls.first_sheet_id) + 1
+            sheet_ids[title] = sheet_id
+            requests.append({'addSheet': {'properties': {'sheetId': sheet_id, 'title': title}}})
+            requests.extend(cls._get_sheet_style_requests(sheet_id=sheet_id, title_data=title_data))
+
+        first_sheet_title = next(
+            (title for title, sheet_id in sheet_ids.items() if sheet_id == cls.first_sheet_id), None
+        )
+        if requests and first_sheet_title:
+            del sheet_ids[first_sheet_title]
+            requests.append({'deleteSheet': {'sheetId': cls.first_sheet_id}})
+        return sheet_ids, requests
+
+    @classmethod
+    @traced
+    async def ensure_sheets(cls, table_id: str, titles: list[str], title_data: list[str]) -> None:
+        """ Добавляет в таблицу недостающие листы titles с шапкой title_data одним запросом batchUpdate """
+        sheet_ids = await cls._get_sheet_ids(table_id, operation='ensure_sheets')
+        sheet_ids, requests = cls._get_add_sheets_requests(sheet_ids=sheet_ids, titles=titles, title_data=title_data)
+        if requests:
+            http_client = await cls._get_http_client()
+            await cls._request(table_id, http_client.batch_update, table_id, {'requests': requests})
+            cls._sheet_ids.set(table_id, sheet_ids)
 
     @classmethod
-    async def delete_row(cls, table_id: str, number: int):
-        spreadsheet = await cls._loop.run_in_executor(cls._executor, cls._client.open_by_key, table_id)
-        sheet: Worksheet = spreadsheet.sheet1
-        sheet.delete_rows(start_index=number+1)
+    @traced
+    async def get_sheet_titles(cls, table_id: str) -> list[str]:
+        return list(await cls._get_sheet_ids(table_id, operation='get_sheet_titles'))
+
+    @staticmethod
+    def _get_rows_operation_requests(sheet_id: int, operation: SheetRowsOperation) -> list[dict]:
+        rows_range = {
+            'sheetId': sheet_id, 'dimension': 'ROWS',
+            'startIndex': operation.row, 'endIndex': operation.row + operation.rows_count
+        }
+        if operation.action == 'delete':
+            return [{'deleteDimension': {'range': rows_range}}]
+
+        requests = []
+        if operation.action == 'insert':
+            # Первая строка после шапки не должна наследовать её оформление
+            requests.append({'insertDimension': {'range': rows_range, 'inheritFromBefore': operation.row > 1}})
+
+        rows_data = [
+            {'values': [{'userEnteredValue': {'stringValue': str(value)}} for value in row_values]}
+            for row_values in operation.values
+        ]
+        requests.append({'updateCells': {
+            'start': {'sheetId': sheet_id, 'rowIndex': operation.row, 'columnIndex': 0},
+            'rows': rows_data,
+            'fields': 'userEnteredValue'
+        }})
+        return requests
+
+    @classmethod
+    @traced
+    async def apply_rows_operations(
+            cls, table_id: str, operations: list[SheetRowsOperation], title_data: list[str]
+    ) -> None:
+        """ Применяет вставки, изменения и удаления строк листов одним запросом batch_update.
+        Недостающие листы добавляются с шапкой title_data в том же запросе """
+        if not operations:
+            return
+
+        sheet_ids = await cls._get_sheet_ids(table_id, operation='apply_rows_operations')
+        titles = list(dict.fromkeys(operation.sheet for operation in operations))
+        sheet_ids, requests = cls._get_add_sheets_requests(sheet_ids=sheet_ids, titles=titles, title_data=title_data)
+
+        for operation in operations:
+            requests.extend(cls._get_rows_operation_requests(sheet_id=sheet_ids[operation.sheet], operation=operation))
+
+        http_client = await cls._get_http_client()
+        await cls._request(table_id, http_client.batch_update, table_id, {'requests': requests})
+        cls._sheet_ids.set(table_id, sheet_ids)
+
+    @staticmethod
+    def _get_column_letter(column: int) -> str:
+        return rowcol_to_a1(1, column)[:-1]
+
+    @staticmethod
+    def _get_grid_rows_count(sheets_properties: dict[str, dict], title: str) -> int:
+        """ Строк в сетке листа. Чтение или очистка за пределами сетки завершается ошибкой """
+        if title not in sheets_properties:
+            return 0
+        return sheets_properties[title]['gridProperties']['rowCount']
+
+    @classmethod
+    @traced
+    async def get_rows_values(
+            cls, table_id: str, last_rows: dict[str, int], columns_count: int
+    ) -> dict[str, list[list[str]]]:
+        """ Значения строк листов с первой по last_rows[название листа] одним чтением values batchGet
+        на каждые read_chunk_rows строк. Пустые строки возвращаются пустыми списками,
+        пустые ячейки в конце строк отбрасываются, строки отсутствующих листов пусты """
+        http_client = await cls._get_http_client()
+        sheets_properties = await cls._fetch_sheets_properties(table_id)
+        last_column = cls._get_column_letter(columns_count)
+
+        # Диапазоны (лист, первая строка, последняя строка) в пределах сетки, не больше read_chunk_rows строк на запрос
+        batches: list[list[tuple[str, int, int]]] = []
+        batch_rows_count = cls.read_chunk_rows
+        for title, last_row in last_rows.items():
+            grid_last_row = min(last_row, cls._get_grid_rows_count(sheets_properties, title))
+            start = 1
+            while start <= grid_last_row:
+                if batch_rows_count == cls.read_chunk_rows:
+                    batches.append([])
+                    batch_rows_count = 0
+                end = min(grid_last_row, start + cls.read_chunk_rows - batch_rows_count - 1)
+                batches[-1].append((title, start, end))
+                batch_rows_count += end - start + 1
+                start = end + 1
+
+        sheets_rows: dict[str, list[list[str]]] = {title: [] for title in last_rows}
+        for batch in batches:
+            ranges = [absolute_range_name(title, f'A{start}:{last_column}{end}') for title, start, end in batch]
+            response = await cls._request(table_id, http_client.values_batch_get, table_id, ranges)
+            for (title, start, end), value_range in zip(batch, response['valueRanges']):
+                values = value_range.get('values', [])
+                sheets_rows[title].extend(values)
+                sheets_rows[title].extend([] for _ in range(end - start + 1 - len(values)))
+
+        # Строки за пределами сетки листа пусты
+        for title, last_row in last_rows.items():
+            sheets_rows[title].extend([] for _ in range(last_row - len(sheets_rows[title])))
+        return sheets_rows
+
+    @classmethod
+    @traced
+    async def update_rows_values(cls, table_id: str, blocks: list[tuple[str, int, list[list[str]]]]) -> int:
+        """ Записывает блоки строк (лист, номер первой строки с единицы, значения) запросами values batchUpdate,
+        каждый не больше max_write_request_bytes. Возвращает количество запросов """
+        http_client = await cls._get_http_client()
+
+        batches: list[list[dict]] = []
+        batch_size = cls.max_write_request_bytes
+        for title, first_row, rows in blocks:
+            data = None
+            for index, row in enumerate(rows):
+                row_size = len(json.dumps(row))
+                # Не влезающий блок продолжается в следующем запросе со своей строки
+                if batch_size + row_size > cls.max_write_request_bytes:
+                    batches.append([])
+                    batch_size = 0
+                    data = None
+                if data is None:
+                    range_name = absolute_range_name(title, rowcol_to_a1(first_row + index, 1))
+                    data = {'range': range_name, 'values': []}
+                    batches[-1].append(data)
+                data['values'].append([str(value) for value in row])
+                batch_size += row_size
+
+        if not batches:
+            return 0
+
+        # Запись за пределы сетки листа не расширяет её сама
+        sheets_properties = await cls._fetch_sheets_properties(table_id)
+        last_rows: dict[str, int] = defaultdict(int)
+        for title, first_row, rows in blocks:
+            last_rows[title] = max(last_rows[title], first_row + len(rows) - 1)
+        requests = [
+            {'appendDimension': {
+                'sheetId': sheets_properties[title]['sheetId'], 'dimension': 'ROWS',
+                'length': last_row - cls._get_grid_rows_count(sheets_properties, title)
+            }}
+            for title, last_row in last_rows.items() if last_row > cls._get_grid_rows_count(sheets_properties, title)
+        ]
+        if requests:
+            await cls._request(table_id, http_client.batch_update, table_id, {'requests': requests})
+
+        for batch in batches:
+            body = {'valueInputOption': ValueInputOption.raw, 'data': batch}
+            await cls._request(table_id, http_client.values_batch_update, table_id, body)
+        return len(batches)
+
+    @classmethod
+    @traced
+    async def clear_rows_from(cls, table_id: str, first_rows: dict[str, int]) -> None:
+        """ Очищает значения листов начиная со строки first_rows[название листа] (номер с единицы)
+        и до конца сетки одним запросом values batchClear """
+        sheets_properties = await cls._fetch_sheets_properties(table_id)
+
+        ranges = []
+        for title, first_row in first_rows.items():
+            grid_rows_count = cls._get_grid_rows_count(sheets_properties, title)
+            if first_row <= grid_rows_count:
+                last_cell = rowcol_to_a1(grid_rows_count, sheets_properties[title]['gridProperties']['columnCount'])
+                ranges.append(absolute_range_name(title, f'A{first_row}:{last_cell}'))
+
+        if ranges:
+            http_client = await cls._get_http_client()
+            await cls._request(table_id, http_client.values_batch_clear, table_id, None, {'ranges': ranges})
@@ -0,0 +1,68 @@
+import csv
+import os
+import re
+from tempfile import NamedTemporaryFile
+
+import xlsxwriter
+
+from src.database.models import Sale
+from src.database.sales import iterate_channel_sales
+from src.database.sheets_outbox import SALES_TABLE_TITLE, get_sale_table_row
+
+
+class SalesExport:
+    """ Выгрузка продаж канала в файл. Продажи читаются из базы страницами и сразу пишутся на диск,
+    поэтому память не растёт с количеством продаж. Методы записи выполняются в потоке БД """
+    formats = ('xlsx', 'csv')
+
+    @staticmethod
+    def get_file_name(channel_title: str, file_format: str) -> str:
+        title = re.sub(r'[\\/:*?"<>|]', '_', channel_title)
+        return f'Продажи {title}.{file_format}'
+
+    @staticmethod
+    def __get_xlsx_row(sale: Sale) -> list:
+        # Суммы записываются числами, чтобы их можно было складывать в Excel
+        row = get_sale_table_row(sale)
+        row[3], row[4] = float(sale.publication_cost), float(sale.manager_percent)
+        return row
+
+    @classmethod
+    def __write_xlsx(cls, file_path: str, channel_id: int) -> None:
+        # constant_memory: каждая строка сбрасывается на диск сразу после записи следующей
+        workbook = xlsxwriter.Workbook(file_path, {
+            'constant_memory': True,
+            'strings_to_formulas': False, 'strings_to_numbers': False, 'strings_to_urls': False,
+        })
+        worksheet = workbook.add_worksheet('Продажи')
+        worksheet.set_column(0, len(SALES_TABLE_TITLE) - 1, 18)
+        worksheet.freeze_panes(1, 0)
+        worksheet.write_row(0, 0, SALES_TABLE_TITLE, workbook.add_format({'bold': True}))
+
+        for row_number, sale in enumerate(iterate_channel_sales(channel_id=channel_id), start=1):
+            worksheet.write_row(row_number, 0, cls.__get_xlsx_row(sale))
+        workbook.close()
+
+    @staticmethod
+    def __write_csv(file_path: str, channel_id: int) -> None:
+        with open(file_path, 'w', newline='', encoding='utf-8-sig') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(SALES_TABLE_TITLE)
+            for sale in iterate_channel_sales(channel_id=channel_id):
+                writer.writerow(get_sale_table_row(sale))
+
+    @classmethod
+    def write_channel_sales(cls, channel_id: int, file_format: str) -> str:
+        """ Записывает продажи канала во временный файл и возвращает путь к нему. Файл удаляет вызывающий """
+        with NamedTemporaryFile(suffix=f'.{file_format}', delete=False) as temp_file:
+            file_path = temp_file.name
+
+        try:
+            if file_format == 'xlsx':
+                cls.__write_xlsx(file_path=file_path, channel_id=channel_id)
+            else:
+                cls.__write_csv(file_path=file_path, channel_id=channel_id)
+        except Exception:
+            os.remove(file_path)
+            raise
+        return file_path
@@ -0,0 +1,143 @@
+import asyncio
+from contextlib import suppress
+from decimal import Decimal, InvalidOperation
+
+from src.database import sales, sheets_import
+from src.database.sales import SaleSheetEdit
+from src.database.sheets_outbox import SALES_TABLE_TITLE, TOMBSTONE_TABLE_ROW, get_sale_table_row
+from src.misc.enums import SalePaymentStatusEnum
+from .google_sheets_api import GoogleSheetsAPI
+from .logger import logger
+from .sheets_outbox_worker import SheetsOutboxWorker, get_row_hash
+from .sheets_rate_limiter import SheetsPriority, sheets_priority
+
+
+def _parse_number(value: str) -> Decimal | None:
+    try:
+        number = Decimal(value.replace(' ', '').replace('\xa0', '').replace(',', '.'))
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+def parse_sheet_row(row: list[str]) -> dict[str, any] | None:
+    """ Поля продажи, которые можно править в таблице вручную. None — значения не разобрать.
+    Дата и время определяют лист и строку продажи, поэтому из таблицы не переносятся """
+    _, _, buyer, cost, percent, publication_format, payment_status = row
+    publication_cost, manager_percent = _parse_number(cost), _parse_number(percent)
+
+    if publication_cost is None or not 0 <= publication_cost < 10 ** 13:
+        return None
+    if manager_percent is None or not 0 <= manager_percent <= 100:
+        return None
+    if not buyer.strip() or not publication_format.strip():
+        return None
+    if payment_status not in {status.value for status in SalePaymentStatusEnum}:
+        return None
+
+    return {
+        'buyer': buyer.strip()[:500],
+        'publication_cost': round(publication_cost, 2),
+        'manager_percent': round(manager_percent, 2),
+        'publication_format': publication_format.strip()[:50],
+        'payment_status': payment_status,
+    }
+
+
+class SheetsImportWorker:
+    """ Перенос в базу правок, сделанных в таблицах каналов вручную.
+    Изменённые таблицы находятся одним запросом к Drive API, читаются только они """
+    _task: asyncio.Task | None = None
+
+    @classmethod
+    def start(cls, interval: int) -> None:
+        if interval > 0 and not cls._task:
+            cls._task = asyncio.create_task(cls._run(interval=interval))
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task:
+            cls._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cls._task
+            cls._task = None
+
+    @classmethod
+    async def _run(cls, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await cls.sync()
+            except Exception as e:
+                logger.warning(f'Не удалось перенести правки из таблиц: {e!r}')
+
+    @classmethod
+    async def sync(cls) -> int:
+        """ Переносит правки из таблиц, изменённых после прошлого переноса. Возвращает количество обновлённых продаж """
+        since = await sheets_import.get_sync_watermark()
+        if not since:
+            return 0
+
+        imported_count = 0
+        # Перенос правок не должен задерживать отправку новых продаж
+        with sheets_priority(SheetsPriority.LOW):
+            modified_times = await GoogleSheetsAPI.get_modified_tables(since=since)
+            for channel_id, table_id, modified_time in await sheets_import.get_channels_to_import(modified_times):
+                try:
+                    channel_imported_count = await cls._import_channel(channel_id=channel_id, table_id=table_id)
+                except Exception as e:
+                    logger.warning(f'Не удалось перенести правки из таблицы канала {channel_id}: {e!r}')
+                    continue
+                # Таблица не прочитана: правки в ней перенесутся, когда уйдут операции бота
+                if channel_imported_count is None:
+                    continue
+                imported_count += channel_imported_count
+                # Правки, сделанные после чтения, изменят время таблицы и будут перенесены в следующий раз
+                await sheets_import.set_channel_synced_at(channel_id=channel_id, synced_at=modified_time)
+
+        if imported_count:
+            logger.info(f'Перенесены правки из таблиц: {imported_count} продаж')
+        return imported_count
+
+    @classmethod
+    async def _import_channel(cls, channel_id: int, table_id: str) -> int | None:
+        """ Переносит правки из таблицы канала. Возвращает количество обновлённых продаж
+        или None, если таблица не прочитана из-за неотправленных операций """
+        async with SheetsOutboxWorker.get_channel_lock(channel_id):
+            sheets_sales, has_operations = await sheets_import.get_channel_sheets_sales(channel_id=channel_id)
+            # Правки из бота ещё не в таблице: при совпадении строк побеждают они, остальное перенесём после отправки
+            if has_operations:
+                return None
+
+            current_rows = await GoogleSheetsAPI.get_rows_values(
+                table_id=table_id, last_rows={sheet: len(rows) + 1 for sheet, rows in sheets_sales.items()},
+                columns_count=len(SALES_TABLE_TITLE)
+            )
+
+            edits = []
+            for sheet, sheet_sales in sheets_sales.items():
+                # Первая строка листа — шапка
+                for sale, sheet_row in zip(sheet_sales, current_rows[sheet][1:]):
+                    expected_row = get_sale_table_row(sale) if sale else TOMBSTONE_TABLE_ROW
+                    if get_row_hash(sheet_row) == get_row_hash(expected_row):
+                        continue
+
+                    sheet_row = sheet_row + [''] * (len(SALES_TABLE_TITLE) - len(sheet_row))
+                    # Строки вставлены, удалены или переставлены: правки не сопоставить с продажами
+                    if not sale or sheet_row[:2] != expected_row[:2]:
+                        logger.warning(f'Строки листа {sheet} таблицы канала {channel_id} сдвинуты вручную')
+                        await sheets_import.request_channel_resync(channel_id=channel_id)
+                        SheetsOutboxWorker.notify()
+                        return 0
+
+                    edits.append(SaleSheetEdit(
+                        sale_id=sale.id, expected_row=expected_row, sheet_row=sheet_row,
+                        fields=parse_sheet_row(sheet_row)
+                    ))
+
+            if not edits:
+                return 0
+            imported_count = await sales.import_sheet_edits(channel_id=channel_id, edits=edits)
+
+        SheetsOutboxWorker.notify()
+        return imported_count
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import suppress
+from http import HTTPStatus
+
+from gspread.exceptions import APIError
+
+from config import GoogleSheetsConfig
+from src.database import channels, sheets_outbox
+from src.database.models import SheetOperation
+from src.misc.enums import SheetActionEnum
+from .google_sheets_api import GoogleSheetsAPI, SheetRowsOperation
+from .logger import logger
+from .sheets_rate_limiter import SheetsPriority, sheets_priority
+from .spare_tables_pool import SpareTablesPool
+
+
+def merge_operations(operations: list[SheetOperation]) -> list[SheetRowsOperation]:
+    """ Объединяет очередь операций канала в минимальный набор операций над диапазонами строк каждого листа """
+    sheets_merged: dict[str, list[SheetRowsOperation]] = {}
+
+    for operation in operations:
+        action = SheetActionEnum(operation.action)
+        values = json.loads(operation.values) if operation.values else []
+        merged = sheets_merged.setdefault(operation.sheet, [])
+        last = merged[-1] if merged else None
+
+        # Изменение или удаление строки, которая ещё не отправлена
+        if last and last.action != SheetActionEnum.DELETE and last.row <= operation.row < last.row + last.rows_count:
+            index = operation.row - last.row
+            if action == SheetActionEnum.UPDATE:
+                last.values[index] = values
+                continue
+            if action == SheetActionEnum.DELETE and last.action == SheetActionEnum.INSERT:
+                del last.values[index]
+                if not last.values:
+                    merged.pop()
+                continue
+
+        # Соседние строки одного действия
+        if last and action == last.action:
+            if action != SheetActionEnum.DELETE and operation.row == last.row + last.rows_count:
+                last.values.append(values)
+                continue
+            if action == SheetActionEnum.DELETE and operation.row in (last.row, last.row - 1):
+                last.row = operation.row
+                last.values.append([])
+                continue
+
+        merged.append(SheetRowsOperation(
+            action=action.value, sheet=operation.sheet, row=operation.row, values=[values]
+        ))
+
+    return [merged_operation for merged in sheets_merged.values() for merged_operation in merged]
+
+
+def get_row_hash(row: list[str]) -> bytes:
+    # Пустые ячейки в конце строки API не возвращает
+    values = list(row)
+    while values and values[-1] == '':
+        values.pop()
+    return hashlib.blake2b(json.dumps(values, ensure_ascii=False).encode(), digest_size=16).digest()
+
+
+def get_changed_rows_blocks(
+        current_rows: list[list[str]], expected_rows: list[list[str]]
+) -> list[tuple[int, list[list[str]]]]:
+    """ Непрерывные блоки строк (номер первой строки с единицы, значения), отличающиеся от ожидаемых """
+    current_hashes = [get_row_hash(row) for row in current_rows]
+
+    blocks: list[tuple[int, list[list[str]]]] = []
+    for index, row in enumerate(expected_rows):
+        if index < len(current_hashes) and current_hashes[index] == get_row_hash(row):
+            continue
+        row_number = index + 1
+        if blocks and blocks[-1][0] + len(blocks[-1][1]) == row_number:
+            blocks[-1][1].append(row)
+        else:
+            blocks.append((row_number, [row]))
+    return blocks
+
+
+class SheetsOutboxWorker:
+    """ Фоновая отправка очереди операций в Google таблицы каналов """
+    poll_interval = 10
+    max_retry_delay = 15 * 60
+    # После стольких неудачных попыток операции канала заменяются перестройкой таблицы
+    max_attempts = 5
+
+    _task: asyncio.Task | None = None
+    _wakeup: asyncio.Event | None = None
+    # Отправка очереди, пересинхронизация и перенос ручных правок одной таблицы не должны идти одновременно
+    _channel_locks: dict[int, asyncio.Lock] = {}
+
+    @classmethod
+    def start(cls) -> None:
+        if not cls._task:
+            cls._wakeup = asyncio.Event()
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        # Неотправленные операции остаются в базе и будут отправлены после перезапуска
+        if cls._task:
+            cls._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cls._task
+            cls._task = None
+
+    @classmethod
+    def notify(cls) -> None:
+        """ Просит отправить очередь, не дожидаясь очередного опроса """
+        if cls._wakeup:
+            cls._wakeup.set()
+
+    @classmethod
+    async def _run(cls) -> None:
+        last_compaction = time.monotonic()
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.poll_interval)
+            cls._wakeup.clear()
+
+            try:
+                if time.monotonic() - last_compaction >= GoogleSheetsConfig.COMPACTION_INTERVAL:
+                    last_compaction = time.monotonic()
+                    await cls.compact()
+                await cls.drain()
+            except Exception as e:
+                logger.exception(e)
+
+    @classmethod
+    async def compact(cls) -> int:
+        """ Ставит в очередь удаление помеченных строк всех каналов. Строки канала удаляются одним batchUpdate
+        при следующей отправке очереди. Возвращает количество удаляемых строк """
+        rows_count = 0
+        for channel_id in await sheets_outbox.get_tombstoned_channel_ids():
+            rows_count += await sheets_outbox.compact_channel_tombstones(channel_id=channel_id)
+
+        if rows_count:
+            logger.info(f'Сжатие таблиц: удаляется строк {rows_count}')
+        return rows_count
+
+    @classmethod
+    async def drain(cls) -> None:
+        channel_ids = await sheets_outbox.get_ready_channel_ids()
+        await asyncio.gather(*(cls._flush_channel(channel_id) for channel_id in channel_ids))
+
+    @staticmethod
+    async def _get_table_id(channel_id: int) -> str:
+        channel = await channels.get_channel_by_id(channel_id=channel_id)
+        if not channel.table_id:
+            # Ссылку на таблицу нового канала ждёт пользователь
+            with sheets_priority(SheetsPriority.HIGH):
+                table_id = await SpareTablesPool.create_table(table_name=f"Продажи {channel.title}")
+            await channels.set_channel_table_id(channel=channel, table_id=table_id)
+        return channel.table_id
+
+    @classmethod
+    def get_channel_lock(cls, channel_id: int) -> asyncio.Lock:
+        return cls._channel_locks.setdefault(channel_id, asyncio.Lock())
+
+    @classmethod
+    async def _flush_channel(cls, channel_id: int) -> None:
+        async with cls.get_channel_lock(channel_id):
+            await cls._send_channel_operations(channel_id=channel_id)
+
+    @classmethod
+    async def _send_channel_operations(cls, channel_id: int) -> None:
+        operations = await sheets_outbox.get_channel_operations(channel_id=channel_id)
+        if not operations:
+            return
+
+        operation_ids = [operation.id for operation in operations]
+        # Перестройка таблицы учитывает и все остальные операции канала
+        is_resync = any(operation.action == SheetActionEnum.RESYNC for operation in operations)
+        try:
+            if is_resync:
+                await cls._resync_channel(channel_id=channel_id, full=True)
+                return
+
+            table_id = await cls._get_table_id(channel_id=channel_id)
+            await GoogleSheetsAPI.apply_rows_operations(
+                table_id=table_id, operations=merge_operations(operations), title_data=sheets_outbox.SALES_TABLE_TITLE
+            )
+        except Exception as e:
+            attempts = max(operation.attempts for operation in operations) + 1
+            # Операции не подходят к листам таблицы (например, строки удалили вручную) или повторы не помогли.
+            # Пока они в очереди, ручные правки этой таблицы тоже не переносятся
+            if not is_resync and (cls._is_client_error(e) or attempts >= cls.max_attempts):
+                logger.warning(
+                    f'Не удалось обновить таблицу канала {channel_id} (попытка {attempts}), '
+                    f'таблица будет перестроена: {e!r}'
+                )
+                await sheets_outbox.replace_operations_with_resync(channel_id=channel_id, operation_ids=operation_ids)
+                cls.notify()
+                return
+
+            delay = min(cls.max_retry_delay, cls.poll_interval * 2 ** operations[0].attempts)
+            logger.warning(f'Не удалось обновить таблицу канала {channel_id}, повтор через {delay} с: {e!r}')
+            await sheets_outbox.postpone_operations(operation_ids=operation_ids, delay_seconds=delay, error=repr(e))
+        else:
+            await sheets_outbox.delete_operations(operation_ids=operation_ids)
+
+    @staticmethod
+    def _is_client_error(error: Exception) -> bool:
+        """ Ответ 4xx, кроме 429: повтор тех же запросов получит такой же ответ """
+        if not isinstance(error, APIError):
+            return False
+        status_code = error.response.status_code
+        return 400 <= status_code < 500 and status_code != HTTPStatus.TOO_MANY_REQUESTS
+
+    @classmethod
+    async def resync_channel(cls, channel_id: int, full: bool = False) -> int:
+        """ Перестраивает таблицу канала по данным базы. Полностью — одной записью всех строк,
+        иначе — только строки, отличающиеся от листов. Возвращает количество перезаписанных строк """
+        async with cls.get_channel_lock(channel_id):
+            return await cls._resync_channel(channel_id=channel_id, full=full)
+
+    @classmethod
+    async def _resync_channel(cls, channel_id: int, full: bool) -> int:
+        # Пересинхронизация не должна задерживать отправку новых продаж
+        with sheets_priority(SheetsPriority.LOW):
+            table_id = await cls._get_table_id(channel_id=channel_id)
+            sheets_rows, operation_ids = await sheets_outbox.get_channel_sheet_snapshot(channel_id=channel_id)
+            expected_rows = {sheet: [sheets_outbox.SALES_TABLE_TITLE, *rows] for sheet, rows in sheets_rows.items()}
+            await GoogleSheetsAPI.ensure_sheets(
+                table_id=table_id, titles=list(expected_rows), title_data=sheets_outbox.SALES_TABLE_TITLE
+            )
+
+            if full:
+                blocks = [(sheet, 1, rows) for sheet, rows in expected_rows.items()]
+            else:
+                current_rows = await GoogleSheetsAPI.get_rows_values(
+                    table_id=table_id, last_rows={sheet: len(rows) for sheet, rows in expected_rows.items()},
+                    columns_count=len(sheets_outbox.SALES_TABLE_TITLE)
+                )
+                blocks = [
+                    (sheet, first_row, block_rows)
+                    for sheet, rows in expected_rows.items()
+                    for first_row, block_rows in get_changed_rows_blocks(current_rows[sheet], rows)
+                ]
+
+            await GoogleSheetsAPI.update_rows_values(table_id=table_id, blocks=blocks)
+            # Листы месяцев, продаж которых в базе больше нет, остаются с одной шапкой
+            first_rows = {sheet: 2 for sheet in await GoogleSheetsAPI.get_sheet_titles(table_id=table_id)}
+            first_rows.update({sheet: len(rows) + 1 for sheet, rows in expected_rows.items()})
+            await GoogleSheetsAPI.clear_rows_from(table_id=table_id, first_rows=first_rows)
+            # Операции, поставленные до снимка, в нём уже учтены
+            await sheets_outbox.delete_operations(operation_ids=operation_ids)
+
+        sales_count = sum(len(rows) for rows in sheets_rows.values())
+        logger.info(f'Таблица канала {channel_id} пересинхронизирована, {sales_count} продаж')
+        return sum(len(block_rows) for _, _, block_rows in blocks)
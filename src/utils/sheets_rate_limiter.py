@@ -0,0 +1,202 @@
+""" Планировщик запросов к Google Sheets API в пределах квот """
+import asyncio
+import bisect
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+
+class SheetsPriority(IntEnum):
+    # Ответа ждёт пользователь
+    HIGH = 0
+    # Отправка очереди продаж
+    NORMAL = 1
+    # Пересинхронизация и обслуживание таблиц
+    LOW = 2
+
+
+_current_priority: ContextVar[SheetsPriority] = ContextVar('sheets_priority', default=SheetsPriority.NORMAL)
+
+
+@contextmanager
+def sheets_priority(priority: SheetsPriority):
+    """ Приоритет запросов к API внутри блока, действует и на вложенные вызовы GoogleSheetsAPI """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        # После ответа 429 токены не выдаются до этого момента
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def get_delay(self, now: float) -> float:
+        """ Через сколько секунд можно будет взять токен """
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """ Полный бакет без блокировки ничем не отличается от нового """
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float) -> None:
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    table_id: str | None = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class SheetsRequestScheduler:
+    """ Выдаёт разрешения на запросы по общему бакету проекта и бакету каждой таблицы.
+    Ожидающие запросы обслуживаются по приоритету, внутри приоритета — по очереди """
+    # Как часто удалять бакеты таблиц, к которым давно не было запросов
+    buckets_eviction_interval = 60
+
+    def __init__(self, project_rate_per_minute: float, spreadsheet_rate_per_minute: float, burst: int):
+        self._spreadsheet_rate_per_minute = spreadsheet_rate_per_minute
+        self._burst = burst
+        self._project_bucket = TokenBucket(rate_per_minute=project_rate_per_minute, capacity=burst)
+        self._spreadsheet_buckets: dict[str, TokenBucket] = {}
+        self._buckets_evicted_at = time.monotonic()
+
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+
+        self._granted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._max_queue_depth = 0
+        self._throttled = 0
+
+    def _get_spreadsheet_bucket(self, table_id: str) -> TokenBucket:
+        bucket = self._spreadsheet_buckets.get(table_id)
+        if bucket is None:
+            bucket = TokenBucket(rate_per_minute=self._spreadsheet_rate_per_minute, capacity=self._burst)
+            self._spreadsheet_buckets[table_id] = bucket
+        return bucket
+
+    def _evict_full_buckets(self, now: float) -> None:
+        """ Удаляет заполненные бакеты таблиц: при следующем запросе к таблице бакет создастся заново таким же """
+        if now - self._buckets_evicted_at < self.buckets_eviction_interval:
+            return
+        self._buckets_evicted_at = now
+        waiting_table_ids = {waiter.table_id for waiter in self._waiters}
+        for table_id, bucket in list(self._spreadsheet_buckets.items()):
+            if table_id not in waiting_table_ids and bucket.is_full(now):
+                del self._spreadsheet_buckets[table_id]
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def acquire(self, table_id: str | None) -> None:
+        """ Ждёт разрешения на один запрос к таблице table_id (None — запрос без таблицы, например создание) """
+        self._ensure_dispatcher()
+        waiter = _Waiter(
+            priority=_current_priority.get(), sequence=next(self._sequence), table_id=table_id,
+            future=asyncio.get_running_loop().create_future(), enqueued_at=time.monotonic()
+        )
+        bisect.insort(self._waiters, waiter)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        self._wakeup.set()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+        wait = time.monotonic() - waiter.enqueued_at
+        self._granted += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+    def throttle(self, seconds: float) -> None:
+        """ API ответил 429: квота проекта исчерпана, новых запросов не выдаём seconds секунд """
+        self._throttled += 1
+        self._project_bucket.block(seconds, now=time.monotonic())
+
+    def _grant_ready(self) -> float | None:
+        """ Выдаёт разрешения всем, кому позволяют бакеты. Возвращает, через сколько секунд проверить снова """
+        now = time.monotonic()
+        next_check = None
+        self._evict_full_buckets(now)
+
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+
+            project_delay = self._project_bucket.get_delay(now)
+            bucket = self._get_spreadsheet_bucket(waiter.table_id) if waiter.table_id else None
+            delay = max(project_delay, bucket.get_delay(now) if bucket else 0)
+            if delay == 0:
+                self._project_bucket.take(now)
+                if bucket:
+                    bucket.take(now)
+                self._waiters.remove(waiter)
+                waiter.future.set_result(None)
+                continue
+
+            next_check = delay if next_check is None else min(next_check, delay)
+            # Без токена проекта не пройдёт никто, иначе запросы к другим таблицам могут идти дальше
+            if project_delay > 0:
+                break
+
+        return next_check
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            next_check = self._grant_ready()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_check)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            'queue_depth': len(self._waiters),
+            'max_queue_depth': self._max_queue_depth,
+            'granted': self._granted,
+            'average_wait': self._total_wait / self._granted if self._granted else 0.0,
+            'max_wait': self._max_wait,
+            'throttled': self._throttled,
+            'spreadsheet_buckets': len(self._spreadsheet_buckets),
+        }
@@ -0,0 +1,263 @@
+""" Трассировка вызовов Google API: длительность, ожидание квоты и потока пула, исход """
+import bisect
+import functools
+import inspect
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, ParamSpec, TypeVar
+
+from gspread import SpreadsheetNotFound
+from gspread.exceptions import APIError
+
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+
+class LatencyHistogram:
+    """ Гистограмма длительностей в секундах с фиксированными корзинами: память не зависит от числа вызовов """
+    bounds = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        # Последняя корзина — значения больше bounds[-1]
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def get_percentile(self, percentile: float) -> float:
+        """ Оценка перцентиля: линейная интерполяция внутри корзины, верхняя граница не больше максимума """
+        rank = percentile / 100 * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = min(self.bounds[index] if index < len(self.bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return 0.0
+
+
+@dataclass
+class OperationStats:
+    """ Статистика одной операции GoogleSheetsAPI, например apply_rows_operations """
+    # Вызовы операции целиком: со всеми запросами, повторами и ожиданием авторизации
+    calls: int = 0
+    outcomes: Counter = field(default_factory=Counter)
+    duration: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    # Отдельные запросы к API внутри операции
+    requests: int = 0
+    request_outcomes: Counter = field(default_factory=Counter)
+    quota_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    queue_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    execution: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def errors(self) -> int:
+        return self.calls - self.outcomes['ok']
+
+
+@dataclass
+class TableStats:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+def get_outcome(error: BaseException | None) -> str:
+    """ Исход вызова: ok, код ответа API или имя исключения """
+    if error is None:
+        return 'ok'
+    if isinstance(error, APIError):
+        return str(error.response.status_code)
+    if isinstance(error, SpreadsheetNotFound):
+        return '404'
+    return type(error).__name__
+
+
+# Операция GoogleSheetsAPI, внутри которой выполняются запросы. Вложенные операции считаются частью внешней
+_current_operation: ContextVar[str | None] = ContextVar('sheets_operation', default=None)
+
+
+class RequestTrace:
+    """ Один запрос к API: время постановки в очередь квот, выдачи разрешения, начала и конца выполнения.
+    Используется как контекстный менеджер вокруг выполнения запроса в пуле потоков """
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.granted_at: float | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def grant(self) -> None:
+        self.granted_at = time.monotonic()
+
+    def run(self, func: Callable[..., R], *args) -> R:
+        """ Выполняет запрос в потоке пула. Время до начала — ожидание свободного потока """
+        self.started_at = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def __enter__(self) -> 'RequestTrace':
+        return self
+
+    def __exit__(self, exc_type, error, traceback) -> None:
+        SheetsTracer.record_request(self, outcome=get_outcome(error))
+
+
+class SheetsTracer:
+    """ Гистограммы длительностей и счётчики исходов вызовов GoogleSheetsAPI по операциям и таблицам """
+    percentiles = (50, 95)
+
+    started_at = time.time()
+    _operations: dict[str, OperationStats] = defaultdict(OperationStats)
+    _tables: dict[str, TableStats] = defaultdict(TableStats)
+
+    @classmethod
+    def record_call(cls, operation: str, table_id: str | None, seconds: float, outcome: str) -> None:
+        stats = cls._operations[operation]
+        stats.calls += 1
+        stats.outcomes[outcome] += 1
+        stats.duration.observe(seconds)
+
+        if table_id:
+            table_stats = cls._tables[table_id]
+            table_stats.calls += 1
+            table_stats.errors += outcome != 'ok'
+            table_stats.seconds += seconds
+
+    @classmethod
+    def record_request(cls, trace: RequestTrace, outcome: str) -> None:
+        stats = cls._operations[_current_operation.get() or 'other']
+        stats.requests += 1
+        stats.request_outcomes[outcome] += 1
+        stats.quota_wait.observe(trace.granted_at - trace.created_at)
+        # Запрос, отменённый до начала выполнения в потоке, времени выполнения не имеет
+        if trace.started_at is not None and trace.finished_at is not None:
+            stats.queue_wait.observe(trace.started_at - trace.granted_at)
+            stats.execution.observe(trace.finished_at - trace.started_at)
+
+    @classmethod
+    def get_summary(cls, limit: int = 6) -> list[str]:
+        """ Строки для экрана статистики: операции с наибольшим суммарным временем и итог по запросам """
+        operations = sorted(cls._operations.items(), key=lambda item: item[1].duration.total, reverse=True)
+        lines = [
+            f'{name}: {stats.calls} выз., {cls._format_percentiles(stats.duration)} с, ошибок {stats.errors}'
+            for name, stats in operations[:limit] if stats.calls
+        ]
+
+        requests = [stats for stats in cls._operations.values() if stats.requests]
+        if requests:
+            lines.append(
+                f'запросы: {sum(stats.requests for stats in requests)}, '
+                f'ошибок {sum(stats.requests - stats.request_outcomes["ok"] for stats in requests)}, '
+                f'выполнение {cls._format_percentiles(cls._merge(stats.execution for stats in requests))} с, '
+                f'поток {cls._format_percentiles(cls._merge(stats.queue_wait for stats in requests))} с'
+            )
+        return lines
+
+    @classmethod
+    def _format_percentiles(cls, histogram: LatencyHistogram) -> str:
+        return '/'.join(f'{histogram.get_percentile(percentile):.2f}' for percentile in cls.percentiles)
+
+    @staticmethod
+    def _merge(histograms) -> LatencyHistogram:
+        merged = LatencyHistogram()
+        for histogram in histograms:
+            merged.buckets = [a + b for a, b in zip(merged.buckets, histogram.buckets)]
+            merged.count += histogram.count
+            merged.total += histogram.total
+            merged.max = max(merged.max, histogram.max)
+        return merged
+
+    @classmethod
+    def get_text_dump(cls, tables_limit: int = 20) -> str:
+        """ Все метрики в текстовом формате Prometheus """
+        lines = [f'# Метрики Google API с {time.strftime("%d.%m.%Y %H:%M:%S", time.localtime(cls.started_at))}']
+
+        histograms = (
+            ('sheets_call_seconds', 'Длительность вызова операции целиком', lambda stats: stats.duration),
+            ('sheets_request_quota_wait_seconds', 'Ожидание квоты запросом', lambda stats: stats.quota_wait),
+            ('sheets_request_queue_wait_seconds', 'Ожидание свободного потока', lambda stats: stats.queue_wait),
+            ('sheets_request_execution_seconds', 'Выполнение запроса', lambda stats: stats.execution),
+        )
+        for metric, description, get_histogram in histograms:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+            for operation, stats in sorted(cls._operations.items()):
+                lines += cls._dump_histogram(metric, {'operation': operation}, get_histogram(stats))
+
+        counters = (
+            ('sheets_calls_total', 'Вызовы операций по исходу', lambda stats: stats.outcomes),
+            ('sheets_requests_total', 'Запросы к API по исходу', lambda stats: stats.request_outcomes),
+        )
+        for metric, description, get_outcomes in counters:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+            for operation, stats in sorted(cls._operations.items()):
+                for outcome, count in sorted(get_outcomes(stats).items()):
+                    lines.append(f'{metric}{{operation="{operation}",outcome="{outcome}"}} {count}')
+
+        tables = sorted(cls._tables.items(), key=lambda item: item[1].seconds, reverse=True)[:tables_limit]
+        lines += [
+            f'# HELP sheets_table_seconds_total Суммарное время вызовов по таблицам (первые {tables_limit})',
+            '# TYPE sheets_table_seconds_total counter',
+        ]
+        for table_id, table_stats in tables:
+            lines.append(f'sheets_table_seconds_total{{table_id="{table_id}"}} {table_stats.seconds:.3f}')
+        lines += ['# TYPE sheets_table_calls_total counter', '# TYPE sheets_table_errors_total counter']
+        for table_id, table_stats in tables:
+            lines.append(f'sheets_table_calls_total{{table_id="{table_id}"}} {table_stats.calls}')
+            lines.append(f'sheets_table_errors_total{{table_id="{table_id}"}} {table_stats.errors}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _dump_histogram(metric: str, labels: dict[str, str], histogram: LatencyHistogram) -> list[str]:
+        if not histogram.count:
+            return []
+        labels = ','.join(f'{name}="{value}"' for name, value in labels.items())
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*histogram.bounds, '+Inf'), histogram.buckets):
+            cumulative += bucket_count
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{labels}}} {histogram.total:.6f}')
+        lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return lines
+
+
+def traced(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """ Записывает длительность и исход вызова операции GoogleSheetsAPI. Операция — имя функции,
+    таблица — аргумент table_id. Запросы внутри вызова, в том числе из вложенных операций, относятся к ней """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if _current_operation.get():
+            return await func(*args, **kwargs)
+
+        table_id = signature.bind_partial(*args, **kwargs).arguments.get('table_id')
+        token = _current_operation.set(func.__name__)
+        started_at = time.monotonic()
+        error = None
+        try:
+            return await func(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_operation.reset(token)
+            SheetsTracer.record_call(
+                operation=func.__name__, table_id=table_id,
+                seconds=time.monotonic() - started_at, outcome=get_outcome(error)
+            )
+    return wrapper
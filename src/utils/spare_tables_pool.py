@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import suppress
+from http import HTTPStatus
+
+from gspread import SpreadsheetNotFound
+from gspread.exceptions import APIError
+
+from src.database import spare_tables
+from .google_sheets_api import GoogleSheetsAPI
+from .logger import logger
+from .sheets_rate_limiter import SheetsPriority, sheets_priority
+
+
+class SpareTablesPool:
+    """ Запас заранее созданных таблиц продаж с открытым доступом.
+    Новый канал получает таблицу из запаса одним переименованием вместо создания с нуля """
+    spare_table_name = 'Резервная таблица продаж'
+    refill_interval = 5 * 60
+
+    _size = 0
+    _task: asyncio.Task | None = None
+    _wakeup: asyncio.Event | None = None
+
+    @classmethod
+    def start(cls, size: int) -> None:
+        if size > 0 and not cls._task:
+            cls._size = size
+            cls._wakeup = asyncio.Event()
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task:
+            cls._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cls._task
+            cls._task = None
+
+    @classmethod
+    async def _run(cls) -> None:
+        while True:
+            try:
+                await cls.fill(size=cls._size)
+            except Exception as e:
+                logger.warning(f'Не удалось пополнить запас таблиц: {e!r}')
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.refill_interval)
+            cls._wakeup.clear()
+
+    @classmethod
+    async def fill(cls, size: int) -> None:
+        """ Создаёт таблицы, пока в запасе их меньше size """
+        with sheets_priority(SheetsPriority.LOW):
+            while await spare_tables.get_spare_tables_count() < size:
+                table_id = await GoogleSheetsAPI.create_table(table_name=cls.spare_table_name)
+                await spare_tables.add_spare_table(table_id=table_id)
+
+    @classmethod
+    async def create_table(cls, table_name: str) -> str:
+        """ Выдаёт таблицу продаж: из запаса, если он не пуст, иначе создаёт новую """
+        while table_id := await spare_tables.take_spare_table():
+            try:
+                await GoogleSheetsAPI.rename_table(table_id=table_id, table_name=table_name)
+            except (SpreadsheetNotFound, APIError) as e:
+                # Таблицу из запаса удалили вручную — берём следующую
+                if isinstance(e, APIError) and e.response.status_code != HTTPStatus.NOT_FOUND:
+                    await spare_tables.add_spare_table(table_id=table_id)
+                    raise
+                logger.warning(f'Таблица {table_id} из запаса не найдена')
+                continue
+
+            if cls._wakeup:
+                cls._wakeup.set()
+            return table_id
+
+        return await GoogleSheetsAPI.create_table(table_name=table_name)
@@ -0,0 +1,66 @@
+""" Общие фикстуры тестов: временная база SQLite со всеми миграциями.
+
+Запуск: pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# Настройки должны быть заданы до импорта бота: рабочая база и токен не нужны
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='bot_tests_'), 'test.db')
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ.setdefault('BOT_TOKEN', '0:tests')
+os.environ.setdefault('BOT_OWNER_IDS', '0')
+# Квоты Google API в тестах с клиентом в памяти не нужны
+os.environ['SHEETS_BURST'] = '1000'
+
+from src.database.cache import users_cache, channels_cache, user_channels_cache  # noqa: E402
+from src.database.migrations import run_migrations  # noqa: E402
+from src.database.models import db, register_models, SchemaMigration, User, Channel, ChannelWriter  # noqa: E402
+from src.utils.executors import IOExecutor  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    register_models()
+    run_migrations()
+    yield db
+    IOExecutor.shutdown_all()
+    db.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_database(database):
+    yield
+    with db.atomic():
+        for table in db.get_tables():
+            if table != SchemaMigration._meta.table_name:
+                db.execute_sql(f'DELETE FROM "{table}"')
+    for cache in (users_cache, channels_cache, user_channels_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def run():
+    """ Выполняет корутину в новом event loop. Пулы потоков привязаны к loop, поэтому после неё закрываются """
+    def _run(coroutine):
+        try:
+            return asyncio.run(coroutine)
+        finally:
+            IOExecutor.shutdown_all()
+    return _run
+
+
+@pytest.fixture
+def user() -> User:
+    return User.create(telegram_id=100, name='Менеджер', username='manager', registration_timestamp=datetime.now())
+
+
+@pytest.fixture
+def channel(user) -> Channel:
+    channel = Channel.create(creator=user, title='Канал', secret_code='secret')
+    ChannelWriter.create(user=user, channel=channel)
+    return channel
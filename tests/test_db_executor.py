@@ -0,0 +1,25 @@
+""" Соединения потоков пула БД """
+from src.database import executor
+from src.database.executor import DatabaseExecutor
+from src.database.models import db
+
+
+def test_connection_is_released_after_each_call(run, monkeypatch):
+    """ Для PostgreSQL соединение берётся из пула peewee только на время задачи """
+    monkeypatch.setattr(executor, '_connection_per_call', True)
+
+    async def check_connections() -> tuple[bool, bool]:
+        closed_during_call = await DatabaseExecutor.run(db.is_closed)
+        # Минуя обёртку: после задачи у потока не остаётся открытого соединения
+        closed_after_call = await DatabaseExecutor._pool.run(db.is_closed)
+        return closed_during_call, closed_after_call
+
+    assert run(check_connections()) == (False, True)
+
+
+def test_thread_keeps_connection_for_sqlite(run):
+    async def check_connection() -> bool:
+        await DatabaseExecutor.run(db.is_closed)
+        return await DatabaseExecutor._pool.run(db.is_closed)
+
+    assert run(check_connection()) is False
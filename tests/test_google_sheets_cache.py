@@ -0,0 +1,51 @@
+""" Кэш id листов таблиц в GoogleSheetsAPI: ограничен по размеру и времени жизни, попадания экономят запросы """
+from collections import defaultdict
+
+import pytest
+
+from src.utils import GoogleSheetsAPI
+from src.utils.fake_gspread import FakeGspreadClient
+
+
+@pytest.fixture
+def client(monkeypatch) -> FakeGspreadClient:
+    monkeypatch.setattr(GoogleSheetsAPI, '_saved_api_calls', defaultdict(int))
+    yield FakeGspreadClient()
+    GoogleSheetsAPI._sheet_ids.clear()
+
+
+async def _create_table_and_get_titles(get_titles_count: int) -> str:
+    table_id = await GoogleSheetsAPI.create_table('Канал')
+    GoogleSheetsAPI._sheet_ids.invalidate(table_id)
+    for _ in range(get_titles_count):
+        await GoogleSheetsAPI.get_sheet_titles(table_id)
+    return table_id
+
+
+async def _create_tables(client: FakeGspreadClient, tables_count: int, get_titles_count: int) -> list[str]:
+    # Готовность клиента привязана к event loop, а у каждого теста он свой
+    GoogleSheetsAPI.use_client(client)
+    return [await _create_table_and_get_titles(get_titles_count) for _ in range(tables_count)]
+
+
+def test_cache_hits_are_counted_as_saved_calls(run, client):
+    run(_create_tables(client, tables_count=1, get_titles_count=3))
+    assert GoogleSheetsAPI.get_saved_api_calls() == {'get_sheet_titles': 2}
+
+
+def test_expired_sheet_ids_are_fetched_again(run, client, monkeypatch):
+    monkeypatch.setattr(GoogleSheetsAPI._sheet_ids, 'ttl', 0)
+    run(_create_tables(client, tables_count=1, get_titles_count=3))
+    assert GoogleSheetsAPI.get_saved_api_calls() == {}
+
+
+def test_cache_size_is_bounded(run, client, monkeypatch):
+    monkeypatch.setattr(GoogleSheetsAPI._sheet_ids, 'max_size', 2)
+    first_table_id, *_ = run(_create_tables(client, tables_count=3, get_titles_count=1))
+    assert GoogleSheetsAPI._sheet_ids.get_stats()['size'] == 2
+    assert GoogleSheetsAPI._sheet_ids.get(first_table_id) is None
+
+
+def test_cache_size_is_shown_in_stats(run, client):
+    run(_create_tables(client, tables_count=2, get_titles_count=1))
+    assert GoogleSheetsAPI.get_sheet_ids_cache_stats()['size'] == 2
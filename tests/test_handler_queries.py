@@ -0,0 +1,82 @@
+""" Число запросов к базе на одно действие с продажами: связанные записи не подгружаются по одной """
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.database import sales
+from src.database.models import db, Sale
+from src.handlers.user.sales_calendar import (
+    handle_show_sale_callback, handle_delete_sale_callback, handle_show_day_purchases_callback
+)
+from src.misc.callbacks_data import SaleCallback, EditSaleCallback, DateCallback
+
+
+class QueriesCounter:
+    """ Считает вызовы db.execute_sql, кроме управления транзакциями """
+    def __init__(self, execute_sql):
+        self._execute_sql = execute_sql
+        self.queries: list[str] = []
+
+    def __call__(self, sql: str, *args, **kwargs):
+        if not sql.lstrip().upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')):
+            self.queries.append(sql)
+        return self._execute_sql(sql, *args, **kwargs)
+
+
+@pytest.fixture
+def queries(monkeypatch) -> QueriesCounter:
+    counter = QueriesCounter(db.execute_sql)
+    monkeypatch.setattr(db, 'execute_sql', counter)
+    return counter
+
+
+@pytest.fixture
+def day_sales(user, channel) -> list[Sale]:
+    return [
+        sales.create_sale.__wrapped__(
+            user=user, channel=channel, buyer=f'@buyer{number}', timestamp=datetime(2026, 10, 5, 10 + number),
+            publication_cost=1000, manager_percent=10, publication_format='1/24'
+        )
+        for number in range(5)
+    ]
+
+
+def _make_callback(user_id: int) -> MagicMock:
+    callback = MagicMock()
+    callback.from_user.id = user_id
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    callback.message.message_id = 1
+    callback.bot = AsyncMock()
+    return callback
+
+
+def test_show_sale_queries(run, user, day_sales, queries):
+    callback = _make_callback(user.telegram_id)
+    run(handle_show_sale_callback(callback, SaleCallback(sale_id=day_sales[0].id)))
+
+    callback.bot.edit_message_text.assert_awaited_once()
+    # Продажа вместе с менеджером, каналом и создателем канала
+    assert len(queries.queries) == 1, queries.queries
+
+
+def test_show_day_sales_queries(run, user, channel, day_sales, queries):
+    callback = _make_callback(user.telegram_id)
+    run(handle_show_day_purchases_callback(callback, DateCallback(date=datetime(2026, 10, 5), channel_id=channel.id)))
+
+    callback.message.edit_text.assert_awaited_once()
+    # Канал и продажи дня, сколько бы их ни было
+    assert len(queries.queries) == 2, queries.queries
+
+
+def test_delete_sale_queries(run, user, channel, day_sales, queries):
+    callback = _make_callback(user.telegram_id)
+    run(handle_delete_sale_callback(callback, EditSaleCallback(sale_id=day_sales[0].id, option='delete')))
+
+    handler_queries = list(queries.queries)
+    callback.message.edit_text.assert_awaited_once()
+    assert not Sale.select().where(Sale.id == day_sales[0].id).exists()
+    # Продажа со связями; в удалении — продажа до и после блокировки, сводка, надгробие, очередь и само удаление;
+    # затем канал и продажи дня
+    assert len(handler_queries) == 9, handler_queries
@@ -0,0 +1,29 @@
+""" Миграции схемы на базе, где часть из них уже применена """
+from datetime import datetime
+
+from src.database import migrations
+from src.database.models import Channel, Sale, SheetOperation, SchemaMigration
+from src.misc.enums import SheetActionEnum
+
+
+def _run_migration_again(version: int) -> None:
+    SchemaMigration.delete().where(SchemaMigration.version == version).execute()
+    migrations.run_migrations()
+
+
+def test_shard_sheets_resyncs_channels_with_pending_operations(user, channel):
+    """ Таблица канала не создана, а очередь уже ждёт отправки: после миграции канал перестраивается целиком """
+    Sale.create(
+        writer=user, channel=channel, buyer='@buyer', timestamp=datetime(2026, 10, 5, 12), publication_cost=100,
+        manager_percent=10, publication_format='1/24', payment_status='Оплачено', row_in_table=1
+    )
+    SheetOperation.create(channel=channel, action=SheetActionEnum.INSERT.value, row=1, values='[]')
+    # Канал без таблицы и без операций перестраивать незачем
+    Channel.create(creator=user, title='Без продаж', secret_code='idle')
+
+    _run_migration_again(version=4)
+
+    operations = list(SheetOperation.select())
+    assert [(operation.channel_id, operation.action) for operation in operations] == [
+        (channel.id, SheetActionEnum.RESYNC.value)
+    ]
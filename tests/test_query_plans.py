@@ -0,0 +1,125 @@
+""" Планы запросов к продажам: каждая функция sales.py находит продажи по индексу, а не перебором таблицы """
+import re
+from datetime import datetime, date
+from unittest.mock import patch
+
+import pytest
+from peewee import fn
+
+from config import GoogleSheetsConfig
+from src.database import sales, sheets_outbox
+from src.database.models import db, Sale
+
+
+SALES_TABLE = Sale._meta.table_name
+
+
+class QueryPlans:
+    """ Запоминает запросы к базе и их планы (EXPLAIN QUERY PLAN) """
+    def __init__(self, execute_sql):
+        self._execute_sql = execute_sql
+        self.plans: list[tuple[str, list[str]]] = []
+
+    def __call__(self, sql: str, params=None, *args, **kwargs):
+        if sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            plan = self._execute_sql(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            self.plans.append((sql, [row[-1] for row in plan]))
+        return self._execute_sql(sql, params, *args, **kwargs)
+
+    def get_unindexed_sales_steps(self) -> list[str]:
+        """ Шаги планов, перебирающие всю таблицу продаж или весь её индекс, а для запросов с границами времени
+        продажи — ещё и поиск, который не ограничивает по индексу время """
+        steps = []
+        for sql, plan in self.plans:
+            sales_names = {SALES_TABLE, *re.findall(rf'"{SALES_TABLE}" AS "(\w+)"', sql)}
+            has_time_range = re.search(r'"timestamp"\)? (=|<|>|BETWEEN)', sql) is not None
+            for step in plan:
+                match = re.match(r'(SCAN|SEARCH) (\w+)', step)
+                if not match or match.group(2) not in sales_names:
+                    continue
+                if match.group(1) == 'SCAN' or (has_time_range and 'timestamp>' not in step):
+                    steps.append(f'{step}: {sql}')
+        return steps
+
+    def get_sales_queries_count(self) -> int:
+        return sum(f'"{SALES_TABLE}"' in sql for sql, _ in self.plans)
+
+
+@pytest.fixture
+def query_plans(monkeypatch) -> QueryPlans:
+    query_plans = QueryPlans(db.execute_sql)
+    monkeypatch.setattr(db, 'execute_sql', query_plans)
+    return query_plans
+
+
+@pytest.fixture
+def sale(user, channel) -> Sale:
+    return sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer='@buyer', timestamp=datetime(2026, 10, 5, 12),
+        publication_cost=1000, manager_percent=10, publication_format='1/24'
+    )
+
+
+def _delete_sale_shifting_rows(sale: Sale) -> None:
+    with patch.object(GoogleSheetsConfig, 'TOMBSTONE_DELETES', False):
+        sales.delete_sale.__wrapped__(sale_id=sale.id)
+
+
+# rebuild_month_stats перебирает все продажи намеренно и здесь не проверяется
+QUERY_FUNCTIONS = {
+    'create_sale': lambda sale: sales.create_sale.__wrapped__(
+        user=sale.writer_id, channel=sale.channel, buyer='@new', timestamp=datetime(2026, 10, 6, 12),
+        publication_cost=500, manager_percent=5, publication_format='1/24'
+    ),
+    'update_sale': lambda sale: (setattr(sale, 'buyer', '@edited'), sales.update_sale.__wrapped__(sale=sale)),
+    'delete_sale': lambda sale: sales.delete_sale.__wrapped__(sale_id=sale.id),
+    'delete_sale_shifting_rows': lambda sale: _delete_sale_shifting_rows(sale),
+    'compact_channel_tombstones': lambda sale: (
+        sales.delete_sale.__wrapped__(sale_id=sale.id),
+        sheets_outbox.compact_channel_tombstones.__wrapped__(channel_id=sale.channel_id)
+    ),
+    'get_sale_by_id': lambda sale: sales.get_sale_by_id.__wrapped__(sale_id=sale.id),
+    'get_sale_by_id_with_relations': lambda sale: sales.get_sale_by_id.__wrapped__(
+        sale_id=sale.id, with_relations=True
+    ),
+    'get_sales_by_day': lambda sale: sales.get_sales_by_day.__wrapped__(
+        channel_id=sale.channel_id, purchase_date=date(2026, 10, 5), with_relations=True
+    ),
+    'get_sales_counts_by_days': lambda sale: sales.get_sales_counts_by_days.__wrapped__(
+        channel=sale.channel_id, year=2026, month=10
+    ),
+    'get_channel_month_report': lambda sale: sales.get_channel_month_report.__wrapped__(
+        channel=sale.channel_id, year=2026, month=10
+    ),
+    'get_sales_count_in_channel': lambda sale: sales.get_sales_count_in_channel.__wrapped__(channel=sale.channel_id),
+    'get_sales_in_channel': lambda sale: sales.get_sales_in_channel.__wrapped__(channel=sale.channel_id),
+    'iterate_channel_sales': lambda sale: list(sales.iterate_channel_sales(channel_id=sale.channel_id)),
+    'get_next_sheet_row': lambda sale: sheets_outbox.get_next_sheet_row(channel_id=sale.channel_id, sheet='10.2026'),
+    'get_channel_sheet_snapshot': lambda sale: sheets_outbox.get_channel_sheet_snapshot.__wrapped__(
+        channel_id=sale.channel_id
+    ),
+}
+
+
+@pytest.mark.parametrize('function_name', QUERY_FUNCTIONS)
+def test_sales_queries_use_index(function_name, sale, query_plans):
+    QUERY_FUNCTIONS[function_name](sale)
+
+    assert query_plans.get_sales_queries_count(), 'Функция не обращалась к таблице продаж'
+    assert query_plans.get_unindexed_sales_steps() == []
+
+
+def test_unindexed_steps_are_detected(sale, query_plans):
+    """ Фильтр по дню, извлечённому из времени продажи, индекс не использует """
+    list(Sale.select().where(Sale.timestamp.day == 5))
+    assert query_plans.get_unindexed_sales_steps()
+
+
+@pytest.mark.parametrize('time_filter', (
+    (Sale.timestamp.year == 2026) & (Sale.timestamp.month == 10) & (Sale.timestamp.day == 5),
+    fn.DATE(Sale.timestamp).between('2026-10-01', '2026-10-31'),
+))
+def test_unindexed_time_range_is_detected(time_filter, sale, query_plans):
+    """ Продажи канала находятся по индексу, но время проверяется для каждой продажи канала """
+    list(Sale.select().where((Sale.channel == sale.channel_id) & time_filter))
+    assert query_plans.get_unindexed_sales_steps()
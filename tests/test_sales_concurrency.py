@@ -0,0 +1,57 @@
+""" Конкурентное создание продаж: номера строк листа не повторяются, запись не падает с «database is locked» """
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from src.database import sales
+from src.database.models import db, Sale, SheetOperation, ChannelMonthStats
+
+
+SALES_COUNT = 60
+
+
+def _create_sale(user, channel, number: int) -> Sale:
+    return sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer=f'@buyer{number}', timestamp=datetime(2026, 10, 1 + number % 28, 12),
+        publication_cost=15, manager_percent=7, publication_format='1/24'
+    )
+
+
+def _assert_sales_numbered(channel) -> None:
+    rows = sorted(sale.row_in_table for sale in Sale.select().where(Sale.channel == channel))
+    assert rows == list(range(1, SALES_COUNT + 1))
+    assert SheetOperation.select().where(SheetOperation.channel == channel).count() == SALES_COUNT
+    assert ChannelMonthStats.get(channel=channel, year=2026, month=10).sales_count == SALES_COUNT
+
+
+def test_create_sale_in_parallel_threads(user, channel):
+    """ Потоки начинают транзакции одновременно: отложенная транзакция падала бы на записи после чтения MAX """
+    start = threading.Barrier(8)
+
+    def create(number: int) -> Sale:
+        if number < start.parties:
+            start.wait()
+        try:
+            return _create_sale(user, channel, number)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=start.parties) as executor:
+        list(executor.map(create, range(SALES_COUNT)))
+
+    _assert_sales_numbered(channel)
+
+
+def test_create_sale_through_db_pool(run, user, channel):
+    async def create_all():
+        await asyncio.gather(*(
+            sales.create_sale(
+                user=user, channel=channel, buyer=f'@buyer{number}', timestamp=datetime(2026, 10, 5, 12),
+                publication_cost=15, manager_percent=7, publication_format='1/24'
+            )
+            for number in range(SALES_COUNT)
+        ))
+
+    run(create_all())
+    _assert_sales_numbered(channel)
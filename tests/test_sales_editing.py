@@ -0,0 +1,66 @@
+""" Изменение и удаление продаж: номера строк и месячные сводки """
+from datetime import datetime
+from decimal import Decimal
+
+from config import GoogleSheetsConfig
+from src.database import sales
+from src.database.models import Sale, SheetOperation, ChannelMonthStats
+from src.misc.enums import SheetActionEnum
+
+
+def _create_sale(user, channel, buyer: str, publication_cost: float = 15, manager_percent: float = 7) -> Sale:
+    return sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer=buyer, timestamp=datetime(2026, 10, 5, 12),
+        publication_cost=publication_cost, manager_percent=manager_percent, publication_format='1/24'
+    )
+
+
+def _get_month_stats(channel) -> tuple[int, Decimal, Decimal]:
+    month_stats = ChannelMonthStats.get(channel=channel, year=2026, month=10)
+    return month_stats.sales_count, month_stats.cost_sum, month_stats.manager_sum
+
+
+def test_update_sale_keeps_shifted_row(monkeypatch, user, channel):
+    """ Пока продажу редактировали, удаление продажи выше сдвинуло её строку: правка не возвращает старый номер """
+    monkeypatch.setattr(GoogleSheetsConfig, 'TOMBSTONE_DELETES', False)
+    first_sale = _create_sale(user, channel, buyer='@first')
+    _create_sale(user, channel, buyer='@second')
+    edited_sale = sales.get_sale_by_id.__wrapped__(sale_id=_create_sale(user, channel, buyer='@third').id)
+
+    sales.delete_sale.__wrapped__(sale_id=first_sale.id)
+    edited_sale.buyer = '@edited'
+    saved_sale = sales.update_sale.__wrapped__(sale=edited_sale)
+
+    stored_sale = Sale.get_by_id(edited_sale.id)
+    assert (stored_sale.buyer, stored_sale.row_in_table) == ('@edited', 2)
+    assert saved_sale.row_in_table == 2
+    last_operation = SheetOperation.select().order_by(SheetOperation.id.desc()).get()
+    assert (last_operation.action, last_operation.row) == (SheetActionEnum.UPDATE.value, 2)
+
+
+def test_update_deleted_sale(user, channel):
+    sale = _create_sale(user, channel, buyer='@buyer')
+    sales.delete_sale.__wrapped__(sale_id=sale.id)
+
+    sale.buyer = '@edited'
+    assert sales.update_sale.__wrapped__(sale=sale) is None
+    assert not Sale.select().exists()
+
+
+def test_update_sale_moves_month_stats(user, channel):
+    sale = _create_sale(user, channel, buyer='@buyer')
+    sale.publication_cost = 20
+    sales.update_sale.__wrapped__(sale=sale)
+
+    assert _get_month_stats(channel) == (1, Decimal('20'), Decimal('1.4'))
+
+
+def test_rebuild_month_stats_keeps_fractions(user, channel):
+    """ 15 ₽ × 7 % — 1.05 ₽, а не результат целочисленного деления """
+    _create_sale(user, channel, buyer='@first')
+    _create_sale(user, channel, buyer='@second', publication_cost=45.5, manager_percent=7.5)
+    expected_stats = (2, Decimal('60.5'), Decimal('1.05') + Decimal('3.4125'))
+    assert _get_month_stats(channel) == expected_stats
+
+    assert sales.rebuild_month_stats.__wrapped__() == 1
+    assert _get_month_stats(channel) == expected_stats
@@ -0,0 +1,50 @@
+""" Перенос ручных правок из таблиц каналов в базу """
+from datetime import datetime, timedelta
+
+from src.database import sales
+from src.database.models import Channel, Sale
+from src.utils import GoogleSheetsAPI
+from src.utils.fake_gspread import FakeGspreadClient
+from src.utils.sheets_import_worker import SheetsImportWorker
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
+
+
+def _create_sale(user, channel, buyer: str) -> None:
+    sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer=buyer, timestamp=datetime(2026, 10, 5, 12),
+        publication_cost=1000, manager_percent=10, publication_format='1/24'
+    )
+
+
+async def _drain_and_sync(client: FakeGspreadClient, drain: bool = True) -> int:
+    # Готовность клиента привязана к event loop, а у каждого теста он свой
+    GoogleSheetsAPI.use_client(client)
+    if drain:
+        await SheetsOutboxWorker.drain()
+    return await SheetsImportWorker.sync()
+
+
+def _edit_buyer_in_table(client: FakeGspreadClient, channel: Channel, row: int, buyer: str) -> None:
+    spreadsheet = client.get_spreadsheet(Channel.get_by_id(channel.id).table_id)
+    worksheet = spreadsheet.get_worksheet_by_title('10.2026')
+    sheet_row = worksheet.get_all_values()[row]
+    sheet_row[2] = buyer
+    worksheet.set_values(row + 1, [sheet_row])
+    spreadsheet.modified_time += timedelta(seconds=1)
+
+
+def test_table_with_pending_operations_is_imported_later(run, user, channel):
+    client = FakeGspreadClient()
+    _create_sale(user, channel, buyer='@first')
+    run(_drain_and_sync(client))
+
+    _edit_buyer_in_table(client, channel, row=1, buyer='@edited')
+    _create_sale(user, channel, buyer='@second')
+    synced_at = Channel.get_by_id(channel.id).sheet_synced_at
+
+    # Новая продажа ещё не в таблице: правка подождёт её отправки
+    assert run(_drain_and_sync(client, drain=False)) == 0
+    assert Channel.get_by_id(channel.id).sheet_synced_at == synced_at
+
+    assert run(_drain_and_sync(client)) == 1
+    assert [sale.buyer for sale in Sale.select().order_by(Sale.id)] == ['@edited', '@second']
@@ -0,0 +1,89 @@
+""" Отправка очереди операций в таблицы: операции, которые не удаётся отправить, заменяются перестройкой """
+from datetime import datetime
+
+import pytest
+from gspread.exceptions import APIError
+
+from src.database import sales, sheets_outbox
+from src.database.models import Channel, SheetOperation
+from src.misc.enums import SheetActionEnum
+from src.utils import GoogleSheetsAPI
+from src.utils.fake_gspread import FakeGspreadClient, _FakeResponse
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
+
+
+def _create_sale(user, channel, buyer: str) -> None:
+    sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer=buyer, timestamp=datetime(2026, 10, 5, 12),
+        publication_cost=1000, manager_percent=10, publication_format='1/24'
+    )
+
+
+def _get_queue() -> list[tuple[str, int]]:
+    return [(operation.action, operation.attempts) for operation in SheetOperation.select().order_by(SheetOperation.id)]
+
+
+async def _drain(client: FakeGspreadClient) -> None:
+    # Готовность клиента привязана к event loop, а у каждого теста он свой
+    GoogleSheetsAPI.use_client(client)
+    await SheetsOutboxWorker.drain()
+
+
+def _fail_apply_rows_operations(monkeypatch, error: Exception) -> None:
+    async def apply_rows_operations(*args, **kwargs):
+        raise error
+    monkeypatch.setattr(GoogleSheetsAPI, 'apply_rows_operations', apply_rows_operations)
+
+
+def test_client_error_replaces_operations_with_resync(run, monkeypatch, user, channel):
+    client = FakeGspreadClient()
+    _create_sale(user, channel, buyer='@first')
+    _create_sale(user, channel, buyer='@second')
+    _fail_apply_rows_operations(monkeypatch, APIError(_FakeResponse(400, 'Range exceeds grid limits')))
+
+    run(_drain(client))
+    assert _get_queue() == [(SheetActionEnum.RESYNC.value, 0)]
+
+    monkeypatch.undo()
+    run(_drain(client))
+    assert _get_queue() == []
+
+    sheets_rows, _ = sheets_outbox.get_channel_sheet_snapshot.__wrapped__(channel_id=channel.id)
+    worksheet = client.spreadsheets[Channel.get_by_id(channel.id).table_id].get_worksheet_by_title('10.2026')
+    assert worksheet.get_all_values() == [sheets_outbox.SALES_TABLE_TITLE, *sheets_rows['10.2026']]
+
+
+@pytest.mark.parametrize('error', (
+    APIError(_FakeResponse(429, 'Quota exceeded')),
+    APIError(_FakeResponse(503, 'Backend error')),
+    TimeoutError(),
+))
+def test_transient_error_postpones_operations(run, monkeypatch, user, channel, error):
+    _create_sale(user, channel, buyer='@first')
+    _fail_apply_rows_operations(monkeypatch, error)
+
+    run(_drain(FakeGspreadClient()))
+    assert _get_queue() == [(SheetActionEnum.INSERT.value, 1)]
+
+
+def test_resync_after_max_attempts(run, monkeypatch, user, channel):
+    _create_sale(user, channel, buyer='@first')
+    SheetOperation.update(attempts=SheetsOutboxWorker.max_attempts - 1).execute()
+    _fail_apply_rows_operations(monkeypatch, TimeoutError())
+
+    run(_drain(FakeGspreadClient()))
+    assert _get_queue() == [(SheetActionEnum.RESYNC.value, 0)]
+
+
+def test_failed_resync_is_postponed(run, monkeypatch, user, channel):
+    """ Перестройку нечем заменить: она повторяется с паузой, сколько бы попыток ни было """
+    _create_sale(user, channel, buyer='@first')
+    sheets_outbox.enqueue_sheet_resync(channel_id=channel.id)
+    SheetOperation.update(attempts=SheetsOutboxWorker.max_attempts).execute()
+
+    async def resync_channel(*args, **kwargs):
+        raise APIError(_FakeResponse(400, 'Invalid request'))
+    monkeypatch.setattr(SheetsOutboxWorker, '_resync_channel', resync_channel)
+
+    run(_drain(FakeGspreadClient()))
+    assert [action for action, _ in _get_queue()] == [SheetActionEnum.INSERT.value, SheetActionEnum.RESYNC.value]
@@ -0,0 +1,47 @@
+""" Планировщик запросов к Google Sheets API: приоритеты и бакеты таблиц """
+import time
+from datetime import datetime
+
+from src.database import sales
+from src.utils import GoogleSheetsAPI
+from src.utils.fake_gspread import FakeGspreadClient
+from src.utils.sheets_outbox_worker import SheetsOutboxWorker
+from src.utils.sheets_rate_limiter import SheetsPriority, SheetsRequestScheduler, _current_priority
+from src.utils.spare_tables_pool import SpareTablesPool
+
+
+def test_full_buckets_are_evicted(run):
+    scheduler = SheetsRequestScheduler(project_rate_per_minute=600, spreadsheet_rate_per_minute=60, burst=10)
+
+    async def acquire(table_ids: list[str]) -> None:
+        for table_id in table_ids:
+            await scheduler.acquire(table_id)
+
+    run(acquire(['first', 'second', 'second']))
+    scheduler._spreadsheet_buckets['second'].block(3600, now=time.monotonic())
+
+    scheduler._evict_full_buckets(now=time.monotonic() + scheduler.buckets_eviction_interval + 60)
+    assert list(scheduler._spreadsheet_buckets) == ['second']
+    assert scheduler.get_stats()['spreadsheet_buckets'] == 1
+
+
+def test_new_channel_table_is_created_with_high_priority(run, monkeypatch, user, channel):
+    priorities = []
+    create_table = SpareTablesPool.create_table
+
+    async def create_table_recording_priority(table_name: str) -> str:
+        priorities.append(_current_priority.get())
+        return await create_table(table_name=table_name)
+
+    monkeypatch.setattr(SpareTablesPool, 'create_table', create_table_recording_priority)
+    sales.create_sale.__wrapped__(
+        user=user, channel=channel, buyer='@buyer', timestamp=datetime(2026, 10, 5, 12),
+        publication_cost=1000, manager_percent=10, publication_format='1/24'
+    )
+
+    async def drain() -> None:
+        GoogleSheetsAPI.use_client(FakeGspreadClient())
+        await SheetsOutboxWorker.drain()
+
+    run(drain())
+    assert priorities == [SheetsPriority.HIGH]
@@ -0,0 +1,56 @@
+""" Запись времени активности пользователей """
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.middlewares import user_activity
+from src.middlewares.user_activity import UserActivityMiddleware
+
+
+@pytest.fixture
+def middleware():
+    yield UserActivityMiddleware()
+    UserActivityMiddleware._pending_activities.clear()
+
+
+@pytest.mark.parametrize('event', (
+    SimpleNamespace(),
+    SimpleNamespace(from_user=None),
+))
+def test_event_without_user(run, middleware, event):
+    handler = AsyncMock()
+    run(middleware(handler, event, {}))
+
+    handler.assert_awaited_once_with(event, {})
+    assert UserActivityMiddleware._pending_activities == {}
+
+
+def test_event_from_user(run, middleware):
+    run(middleware(AsyncMock(), SimpleNamespace(from_user=SimpleNamespace(id=42)), {}))
+    assert list(UserActivityMiddleware._pending_activities) == [42]
+
+
+def test_stop_during_flush_writes_pending_batch(run, middleware, monkeypatch):
+    written = []
+    flush_started = asyncio.Event()
+
+    async def update_last_activities(activities):
+        if not flush_started.is_set():
+            # Периодическая запись отменяется, пока ждёт базу
+            flush_started.set()
+            await asyncio.Event().wait()
+        written.append(activities)
+
+    monkeypatch.setattr(user_activity, 'update_last_activities', update_last_activities)
+
+    async def stop_during_flush():
+        await middleware(AsyncMock(), SimpleNamespace(from_user=SimpleNamespace(id=42)), {})
+        UserActivityMiddleware.start_flushing(interval=0)
+        await flush_started.wait()
+        await UserActivityMiddleware.stop_flushing()
+
+    run(stop_during_flush())
+    assert [list(activities) for activities in written] == [[42]]
+    assert UserActivityMiddleware._pending_activities == {}